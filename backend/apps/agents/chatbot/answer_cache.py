@@ -0,0 +1,119 @@
+"""
+Per-user semantic cache of chatbot answers.
+
+Answers written from retrieved content are stored with the embedding of the
+question. A later question from the same user whose embedding is close enough
+(cosine >= CHATBOT_ANSWER_CACHE_THRESHOLD) gets the stored answer back without
+retrieval or generation.
+
+Entries live under the user's RAG data version (`apps.agents.rag.cache`), so
+inserting or deleting any of the user's items invalidates every cached answer;
+CHATBOT_ANSWER_CACHE_TTL bounds how long an answer is reused otherwise. Like the
+RAG query cache, it is disabled on a process-local cache backend.
+"""
+
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.agents.rag.cache import get_user_version, normalize_query, versioned_cache_enabled
+
+logger = logging.getLogger(__name__)
+
+# Short follow-ups ("tell me more", "and on tiktok?") depend on the conversation, not only the text
+MIN_QUESTION_WORDS = 4
+
+
+def _cache():
+    from django.core.cache import cache
+
+    return cache
+
+
+def get_answer_cache_config() -> Dict[str, Any]:
+    return {
+        # Entries are invalidated through the RAG data version: off on a process-local cache
+        "ttl": getattr(settings, "CHATBOT_ANSWER_CACHE_TTL", 3600) if versioned_cache_enabled() else 0,
+        "threshold": getattr(settings, "CHATBOT_ANSWER_CACHE_THRESHOLD", 0.92),
+        "max_entries": getattr(settings, "CHATBOT_ANSWER_CACHE_MAX_ENTRIES", 50),
+    }
+
+
+def _entries_key(user_id: str, version: int) -> str:
+    return f"chat:answers:{user_id}:{version}"
+
+
+def is_cacheable(question: str) -> bool:
+    return len(normalize_query(question).split()) >= MIN_QUESTION_WORDS
+
+
+@lru_cache(maxsize=512)
+def _embed(question: str) -> Tuple[float, ...]:
+    from apps.agents.rag.utils import get_model
+
+    vector = get_model().encode(question, normalize_embeddings=True)
+    return tuple(float(x) for x in vector)
+
+
+def embed_question(question: str) -> np.ndarray:
+    return np.asarray(_embed(normalize_query(question)), dtype=np.float32)
+
+
+def lookup(user_id: str, question: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Best cached answer for a similar question, and the user's data version
+    read before the lookup (pass it to `store` for this turn's answer).
+    """
+    cfg = get_answer_cache_config()
+    version = get_user_version(user_id)
+    if cfg["ttl"] <= 0 or not is_cacheable(question):
+        return None, version
+
+    try:
+        entries: List[Dict[str, Any]] = _cache().get(_entries_key(user_id, version)) or []
+    except Exception as e:
+        logger.warning(f"Answer cache read failed: {e}")
+        return None, version
+
+    now = time.time()
+    entries = [e for e in entries if e["created"] + cfg["ttl"] > now]
+    if not entries:
+        return None, version
+
+    try:
+        query = embed_question(question)
+    except Exception as e:
+        logger.warning(f"Answer cache embedding failed: {e}")
+        return None, version
+    scores = np.asarray([e["embedding"] for e in entries], dtype=np.float32) @ query
+    best = int(np.argmax(scores))
+    if scores[best] < cfg["threshold"]:
+        return None, version
+
+    logger.info(f"Answer cache hit for user {user_id} (similarity {scores[best]:.3f})")
+    return {**entries[best], "similarity": float(scores[best])}, version
+
+
+def store(user_id: str, version: int, question: str, answer: str) -> None:
+    """Remember an answer under the data version it was retrieved with."""
+    cfg = get_answer_cache_config()
+    if cfg["ttl"] <= 0 or not is_cacheable(question) or not answer:
+        return
+
+    key = _entries_key(user_id, version)
+    try:
+        now = time.time()
+        entries = [e for e in (_cache().get(key) or []) if e["created"] + cfg["ttl"] > now]
+        entries.append({
+            "question": question,
+            "answer": answer,
+            "embedding": [round(x, 5) for x in embed_question(question).tolist()],
+            "created": now,
+        })
+        _cache().set(key, entries[-cfg["max_entries"]:], timeout=cfg["ttl"])
+    except Exception as e:
+        logger.warning(f"Answer cache write failed: {e}")
@@ -6,17 +6,27 @@ is implemented as a tool, and other responses are generated by the LLM
 using system prompts.
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+import uuid
+from typing import Dict, Any, Optional, List, AsyncIterator
 from datetime import datetime
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import connection, transaction
 import time
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from asgiref.sync import sync_to_async
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, MessagesState
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import tools_condition, ToolNode
 from django.contrib.auth.models import User
@@ -24,17 +34,182 @@ from django.contrib.auth.models import User
 from apps.chatbot.models import ChatSession, ChatMessage
 from ..kg_constructor.config import get_openai_llm
 # from ..kg_constructor.neo4j_client import Neo4jClient
+from . import answer_cache
+from .context import (
+    asummarize, build_context, current_turn_has_tool_results, get_context_config, messages_to_fold, split_turns,
+    summarize,
+)
 from .messages import MessageValidator
-from .system_prompts import MAIN_SYSTEM_PROMPT
+from .router import CHAT, RETRIEVE, get_router
+from .system_prompts import MAIN_SYSTEM_PROMPT, RAG_ANSWER_INSTRUCTIONS
 from .tools import retrieve_and_answer
 
 logger = logging.getLogger(__name__)
 
+# Process-wide checkpointers and chatbot, created on first use (after the server forks)
+_checkpointer = None
+# Async pools (and asyncio locks) belong to the event loop that created them: one per running loop
+_async_checkpointers: Dict[asyncio.AbstractEventLoop, Any] = {}
+_async_checkpointer_locks: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+# time.monotonic() of the last failed checkpointer setup, per kind ("sync" / "async")
+_checkpointer_failed_at: Dict[str, float] = {}
+_chatbot = None
+_lock = threading.Lock()
+
+# Connection settings required by PostgresSaver when it is given a pool
+POOL_CONNECTION_KWARGS = {"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row}
+
+
+def _get_db_url() -> str:
+    """PostgreSQL connection string from Django settings"""
+    db_settings = connection.settings_dict
+    return (
+        f"postgresql://{db_settings['USER']}:{db_settings['PASSWORD']}"
+        f"@{db_settings['HOST']}:{db_settings['PORT']}/{db_settings['NAME']}"
+    )
+
+
+def _pool_size() -> int:
+    return getattr(settings, "CHATBOT_CHECKPOINT_POOL_SIZE", 5)
+
+
+def _pool_kwargs() -> Dict[str, Any]:
+    """Pool sizing: psycopg_pool's default min_size (4) must not exceed max_size"""
+    max_size = max(_pool_size(), 1)
+    return {"min_size": min(4, max_size), "max_size": max_size}
+
+
+def _in_retry_cooldown(kind: str) -> bool:
+    """
+    True while a recent setup failure is being cached, so requests fall back to
+    MemorySaver at once instead of each waiting for the pool timeout.
+    """
+    failed_at = _checkpointer_failed_at.get(kind)
+    cooldown = getattr(settings, "CHATBOT_CHECKPOINT_RETRY_SECONDS", 60)
+    return failed_at is not None and time.monotonic() - failed_at < cooldown
+
+
+def get_checkpointer():
+    """
+    Process-wide PostgresSaver backed by a psycopg connection pool.
+    Tables are set up once, on first use. Falls back to a (non-cached) MemorySaver,
+    and skips new connection attempts for CHATBOT_CHECKPOINT_RETRY_SECONDS after a failure.
+    """
+    global _checkpointer
+    if _checkpointer is not None:
+        return _checkpointer
+    if _in_retry_cooldown("sync"):
+        return MemorySaver()
+    
+    with _lock:
+        if _checkpointer is None:
+            pool = None
+            try:
+                pool = ConnectionPool(
+                    conninfo=_get_db_url(),
+                    kwargs=POOL_CONNECTION_KWARGS,
+                    open=True,
+                    **_pool_kwargs(),
+                )
+                checkpointer = PostgresSaver(pool)
+                
+                # Setup tables if they don't exist
+                checkpointer.setup()
+                
+                logger.info("Using pooled PostgresSaver for persistent checkpoints")
+                _checkpointer = checkpointer
+                _checkpointer_failed_at.pop("sync", None)
+            except Exception as e:
+                logger.error(f"Failed to initialize PostgresSaver: {e}")
+                logger.info("Falling back to MemorySaver")
+                _checkpointer_failed_at["sync"] = time.monotonic()
+                if pool is not None:
+                    pool.close()
+                return MemorySaver()
+    return _checkpointer
+
+
+def _forget_closed_loops() -> None:
+    """Drop checkpointers of event loops that have been closed (their pools cannot be used again)"""
+    for loop in [loop for loop in _async_checkpointers if loop.is_closed()]:
+        _async_checkpointers.pop(loop, None)
+    for loop in [loop for loop in _async_checkpointer_locks if loop.is_closed()]:
+        _async_checkpointer_locks.pop(loop, None)
+
+
+async def aget_checkpointer():
+    """
+    Async counterpart of `get_checkpointer` (AsyncPostgresSaver on an async pool),
+    cached per running event loop. Only call it from a long-lived loop (the ASGI
+    server's): under WSGI every request runs in a new loop, so views use the sync
+    path there (see `apps.chatbot.views`).
+    """
+    loop = asyncio.get_running_loop()
+    checkpointer = _async_checkpointers.get(loop)
+    if checkpointer is not None:
+        return checkpointer
+    if _in_retry_cooldown("async"):
+        return MemorySaver()
+    
+    _forget_closed_loops()
+    lock = _async_checkpointer_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        if loop not in _async_checkpointers:
+            pool = None
+            try:
+                pool = AsyncConnectionPool(
+                    conninfo=_get_db_url(),
+                    kwargs=POOL_CONNECTION_KWARGS,
+                    open=False,
+                    **_pool_kwargs(),
+                )
+                await pool.open()
+                checkpointer = AsyncPostgresSaver(pool)
+                await checkpointer.setup()
+                
+                logger.info("Using pooled AsyncPostgresSaver for persistent checkpoints")
+                _async_checkpointers[loop] = checkpointer
+                _checkpointer_failed_at.pop("async", None)
+            except Exception as e:
+                logger.error(f"Failed to initialize AsyncPostgresSaver: {e}")
+                logger.info("Falling back to MemorySaver")
+                _checkpointer_failed_at["async"] = time.monotonic()
+                if pool is not None:
+                    await pool.close()
+                return MemorySaver()
+    return _async_checkpointers[loop]
+
+
+def get_chatbot() -> "Chatbot":
+    """
+    Process-wide Chatbot: the LLM client and compiled graph are built once and
+    shared by every request. Per-request data (user_id, session_id) travels in
+    the graph state and the `thread_id` config only.
+    """
+    global _chatbot
+    if _chatbot is not None:
+        return _chatbot
+    
+    with _lock:
+        if _chatbot is None:
+            chatbot = Chatbot()
+            if not chatbot.persistent:
+                # Database unavailable: do not pin a MemorySaver for the life of the process
+                return chatbot
+            _chatbot = chatbot
+    return _chatbot
+
 
 class ChatState(MessagesState):
     """Enhanced state for LangGraph chatbot with tool support"""
     user_id: str = ""
     session_id: str = ""
+    # Rolling summary of the turns folded out of `messages`
+    summary: str = ""
+    # Intent router decision for the current turn: "retrieve", "chat" or "" (LLM decides)
+    route: str = ""
+    # User's RAG data version read by the answer cache lookup (-1: not looked up this turn)
+    answer_cache_version: int = -1
 
 class ChatRequest:
     """Chat request data structure"""
@@ -82,38 +257,39 @@ class Chatbot:
         # self.neo4j_client = neo4j_client
         self.user = user
                 
+        self.llm_with_tools = self.llm.bind_tools([retrieve_and_answer])
+        
         # Build LangGraph workflow
+        self.graph = self._build_graph()
         self.workflow = self._build_workflow()
+        # Compiled with each event loop's async checkpointer
+        self.async_workflows: Dict[asyncio.AbstractEventLoop, CompiledStateGraph] = {}
         
         logger.info("LangGraphChatbot initialized with RAG tool")
     
-    def _get_checkpointer(self):
-        """Get the appropriate checkpointer based on availability"""
-        try:
-            # Get database connection string from Django settings
-            db_settings = connection.settings_dict
-            
-            # Construct PostgreSQL connection string
-            db_url = (
-                f"postgresql://{db_settings['USER']}:{db_settings['PASSWORD']}"
-                f"@{db_settings['HOST']}:{db_settings['PORT']}/{db_settings['NAME']}"
-            )
-            
-            # Create PostgresSaver with connection
-            checkpointer = PostgresSaver.from_conn_string(db_url)
-            
-            # Setup tables if they don't exist
-            checkpointer.setup()
-            
-            logger.info("Using PostgresSaver for persistent checkpoints")
-            return checkpointer
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize PostgresSaver: {e}")
-            logger.info("Falling back to MemorySaver")
-            return MemorySaver()
-    
     def _build_workflow(self) -> CompiledStateGraph:
+        """Compile the LangGraph workflow with persistent storage"""
+        checkpointer = get_checkpointer()
+        self.persistent = not isinstance(checkpointer, MemorySaver)
+        return self.graph.compile(checkpointer=checkpointer)
+    
+    async def _get_async_workflow(self) -> CompiledStateGraph:
+        """
+        Workflow compiled with the async checkpointer, for `ainvoke` and
+        `astream_events` (the sync PostgresSaver has no async methods).
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self.async_workflows:
+            checkpointer = await aget_checkpointer()
+            workflow = self.graph.compile(checkpointer=checkpointer)
+            if isinstance(checkpointer, MemorySaver):
+                return workflow
+            for closed in [closed for closed in self.async_workflows if closed.is_closed()]:
+                self.async_workflows.pop(closed, None)
+            self.async_workflows[loop] = workflow
+        return self.async_workflows[loop]
+    
+    def _build_graph(self) -> StateGraph:
         """Build the LangGraph workflow with tool integration"""
         
         # Create state graph
@@ -123,13 +299,34 @@ class Chatbot:
         tools = [retrieve_and_answer]
         tool_node = ToolNode(tools)
         
-        # Add nodes
-        workflow.add_node("agent", self._agent_node)
+        # Add nodes (sync + async implementations, so the graph runs with invoke and ainvoke)
+        workflow.add_node("summarize", RunnableLambda(self._summarize_node, afunc=self._asummarize_node))
+        workflow.add_node("router", RunnableLambda(self._router_node, afunc=self._arouter_node))
+        workflow.add_node("answer_cache", RunnableLambda(self._answer_cache_node, afunc=self._aanswer_cache_node))
+        workflow.add_node("retrieve", self._retrieve_node)
+        workflow.add_node("agent", RunnableLambda(self._agent_node, afunc=self._aagent_node))
         workflow.add_node("tools", tool_node)
-        workflow.add_node("save_to_database", self._save_to_database_node)
+        workflow.add_node("save_to_database", RunnableLambda(
+            self._save_to_database_node, afunc=self._asave_to_database_node
+        ))
+        
+        # Set entry point: fold old turns into the summary before answering
+        workflow.set_entry_point("summarize")
+        workflow.add_edge("summarize", "router")
+        
+        workflow.add_edge("router", "answer_cache")
         
-        # Set entry point
-        workflow.set_entry_point("agent")
+        # A cached answer ends the turn; routed retrieval skips the agent's tool-selection call
+        workflow.add_conditional_edges(
+            "answer_cache",
+            self._after_answer_cache,
+            {
+                "save_to_database": "save_to_database",
+                "retrieve": "retrieve",
+                "agent": "agent"
+            }
+        )
+        workflow.add_edge("retrieve", "tools")
         
         # Add conditional edges for tool usage
         workflow.add_conditional_edges(
@@ -145,53 +342,158 @@ class Chatbot:
         workflow.add_edge("tools", "agent")
         workflow.add_edge("save_to_database", "__end__")
         
-        # Compile with persistent storage
-        checkpointer = self._get_checkpointer()
-        return workflow.compile(checkpointer=checkpointer)
+        return workflow
+    
+    def _messages_to_fold(self, state: ChatState) -> List:
+        cfg = get_context_config()
+        return messages_to_fold(state["messages"], cfg["keep_turns"], cfg["summarize_after_turns"])
+    
+    def _fold_update(self, state: ChatState, folded: List, summary: str) -> Dict[str, Any]:
+        logger.info(f"Folded {len(folded)} messages into the summary of session {state.get('session_id')}")
+        return {
+            "summary": summary,
+            "messages": [RemoveMessage(id=msg.id) for msg in folded],
+        }
+    
+    def _summarize_node(self, state: ChatState) -> Dict[str, Any]:
+        """
+        Fold the oldest turns into the rolling summary once the history is long
+        enough, and remove them from the checkpointed messages.
+        """
+        folded = self._messages_to_fold(state)
+        if not folded:
+            return {}
+        
+        try:
+            summary = summarize(self.llm, state.get("summary", ""), folded)
+        except Exception as e:
+            # Keep the full history this turn; the agent still trims to the token budget
+            logger.error(f"Conversation summarization failed: {e}")
+            return {}
+        return self._fold_update(state, folded, summary)
+    
+    async def _asummarize_node(self, state: ChatState) -> Dict[str, Any]:
+        """Async version of `_summarize_node`"""
+        folded = self._messages_to_fold(state)
+        if not folded:
+            return {}
+        
+        try:
+            summary = await asummarize(self.llm, state.get("summary", ""), folded)
+        except Exception as e:
+            logger.error(f"Conversation summarization failed: {e}")
+            return {}
+        return self._fold_update(state, folded, summary)
+    
+    def _latest_user_message(self, state: ChatState) -> Optional[str]:
+        for msg in reversed(state["messages"]):
+            if msg.type == "human":
+                return msg.content
+        return None
+    
+    def _router_node(self, state: ChatState) -> Dict[str, Any]:
+        """Decide locally whether this turn needs retrieval ("" lets the LLM decide)"""
+        router = get_router()
+        user_message = self._latest_user_message(state)
+        if router is None or not user_message:
+            return {"route": ""}
+        
+        try:
+            return {"route": router(user_message) or ""}
+        except Exception as e:
+            logger.error(f"Intent router failed: {e}")
+            return {"route": ""}
+    
+    async def _arouter_node(self, state: ChatState) -> Dict[str, Any]:
+        """Async version of `_router_node` (the embedding classifier runs in a thread)"""
+        return await asyncio.to_thread(self._router_node, state)
+    
+    def _answer_cache_node(self, state: ChatState) -> Dict[str, Any]:
+        """Answer from the semantic answer cache when the user asked something similar before"""
+        if state.get("route") == CHAT:
+            return {"answer_cache_version": -1}
+        
+        try:
+            hit, version = answer_cache.lookup(state.get("user_id", ""), self._latest_user_message(state) or "")
+        except Exception as e:
+            logger.error(f"Answer cache lookup failed: {e}")
+            return {"answer_cache_version": -1}
+        
+        if hit is None:
+            return {"answer_cache_version": version}
+        return {
+            "answer_cache_version": version,
+            "messages": [AIMessage(
+                content=hit["answer"],
+                response_metadata={"answer_cache": True, "similarity": hit["similarity"]},
+            )],
+        }
+    
+    async def _aanswer_cache_node(self, state: ChatState) -> Dict[str, Any]:
+        """Async version of `_answer_cache_node` (cache read and embedding run in a thread)"""
+        return await asyncio.to_thread(self._answer_cache_node, state)
+    
+    def _after_answer_cache(self, state: ChatState) -> str:
+        last = state["messages"][-1]
+        if last.type == "ai" and last.response_metadata.get("answer_cache"):
+            return "save_to_database"
+        return "retrieve" if state.get("route") == RETRIEVE else "agent"
+    
+    def _store_answer(self, state: ChatState) -> None:
+        """Cache this turn's answer if it was written from retrieved content"""
+        version = state.get("answer_cache_version", -1)
+        turns = split_turns(state["messages"])
+        if version < 0 or not turns:
+            return
+        
+        turn = turns[-1]
+        answer = turn[-1]
+        if turn[0].type != "human" or answer.type != "ai" or answer.tool_calls:
+            return
+        if answer.response_metadata.get("answer_cache") or not any(msg.type == "tool" for msg in turn):
+            return
+        answer_cache.store(state.get("user_id", ""), version, turn[0].content, answer.content)
+    
+    def _retrieve_node(self, state: ChatState) -> Dict[str, Any]:
+        """Issue the RAG tool call directly, as the agent would have"""
+        return {
+            "messages": [AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": retrieve_and_answer.name,
+                    "args": {
+                        "query": self._latest_user_message(state),
+                        "user_id": state.get("user_id", ""),
+                    },
+                    "id": f"call_route_{uuid.uuid4().hex[:12]}",
+                    "type": "tool_call",
+                }]
+            )]
+        }
     
     def _agent_node(self, state: ChatState) -> Dict[str, Any]:
         """Main agent node that processes messages and decides whether to use tools"""
         
         try:
-            # Get the latest user message
-            user_message = None
-            for msg in reversed(state["messages"]):
-                if msg.type == "human":
-                    user_message = msg.content
-                    break
-            
-            if not user_message:
-                return {
-                    "messages": [AIMessage(content="I didn't receive a message. Could you please try again?")]
-                }
-            
-            # Use single comprehensive system prompt
-            system_message_content = MAIN_SYSTEM_PROMPT.format(
-                user_id=state.get("user_id", "unknown"),
-                session_id=state.get("session_id", "unknown")
-            )
+            llm, messages = self._prepare_agent_call(state)
+            if llm is None:
+                return {"messages": messages}
+            return {"messages": [llm.invoke(messages)]}
             
-            # Check if we already have tool results in recent messages
-            recent_tool_used = any(msg.type == "tool" for msg in state["messages"][-3:])
-            
-            if recent_tool_used:
-                # We have tool results, generate final response based on tool output
-                messages = [SystemMessage(content=system_message_content)] + state["messages"]
-                response = self.llm.invoke(messages)
-            else:
-                # Prepare messages for LLM
-                # Filter to only include human and AI messages (exclude tool messages for clean context)
-                conversation_messages = [
-                    msg for msg in state["messages"] 
-                    if msg.type in ("human", "ai") and not getattr(msg, 'tool_calls', None)
-                ]
-
-                # First pass - LLM can decide whether to use tools based on the query
-                llm_with_tools = self.llm.bind_tools([retrieve_and_answer])
-                messages = [SystemMessage(content=system_message_content)] + conversation_messages
-                response = llm_with_tools.invoke(messages)
-            
-            return {"messages": [response]}
+        except Exception as e:
+            logger.error(f"Agent node failed: {e}")
+            return {
+                "messages": [AIMessage(content="I'm sorry, I encountered an error. Please try again.")]
+            }
+    
+    async def _aagent_node(self, state: ChatState) -> Dict[str, Any]:
+        """Async version of `_agent_node` (awaits the LLM instead of blocking a thread)"""
+        
+        try:
+            llm, messages = self._prepare_agent_call(state)
+            if llm is None:
+                return {"messages": messages}
+            return {"messages": [await llm.ainvoke(messages)]}
             
         except Exception as e:
             logger.error(f"Agent node failed: {e}")
@@ -199,11 +501,58 @@ class Chatbot:
                 "messages": [AIMessage(content="I'm sorry, I encountered an error. Please try again.")]
             }
     
+    def _prepare_agent_call(self, state: ChatState):
+        """
+        Pick the model (with or without tools) and build its prompt.
+        Returns (llm, messages), or (None, [reply]) when there is nothing to send.
+        """
+        # Get the latest user message
+        user_message = self._latest_user_message(state)
+        
+        if not user_message:
+            return None, [AIMessage(content="I didn't receive a message. Could you please try again?")]
+        
+        # Use single comprehensive system prompt
+        system_message_content = MAIN_SYSTEM_PROMPT.format(
+            user_id=state.get("user_id", "unknown"),
+            session_id=state.get("session_id", "unknown")
+        )
+        
+        # Check if the RAG tool already ran in this turn (a previous turn's ToolMessage is stale context)
+        recent_tool_used = current_turn_has_tool_results(state["messages"])
+        max_tokens = get_context_config()["max_tokens"]
+        
+        if recent_tool_used:
+            # We have tool results (retrieved context), write the final answer from them
+            messages = build_context(
+                system_message_content + RAG_ANSWER_INSTRUCTIONS, state.get("summary", ""), state["messages"],
+                token_counter=self.llm, max_tokens=max_tokens
+            )
+            return self.llm, messages
+        
+        # Prepare messages for LLM
+        # Filter to only include human and AI messages (exclude tool messages for clean context)
+        conversation_messages = [
+            msg for msg in state["messages"] 
+            if msg.type in ("human", "ai") and not getattr(msg, 'tool_calls', None)
+        ]
+
+        # First pass - LLM can decide whether to use tools based on the query,
+        # unless the router already classified the message as plain chat
+        messages = build_context(
+            system_message_content, state.get("summary", ""), conversation_messages,
+            token_counter=self.llm, max_tokens=max_tokens
+        )
+        llm = self.llm if state.get("route") == CHAT else self.llm_with_tools
+        return llm, messages
+    
     def _save_to_database_node(self, state: ChatState) -> Dict[str, Any]:
         """
         Update UI metadata only - PostgresSaver handles conversation persistence.
         This maintains Django session info for UI features without duplicating messages.
         """
+        self._store_answer(state)
+        
         try:
             try:
                 user = User.objects.get(id=state.get("user_id"))
@@ -222,16 +571,11 @@ class Chatbot:
             
             # Update session metadata for UI analytics (no message duplication)
             if not created:
-                # Check if tools were used in this interaction
-                tool_used = any(msg.type == "tool" for msg in state["messages"])
-                                
-                # Increment message count for UI display (count user messages)
-                user_message_count = sum(1 for msg in state["messages"] if msg.type == "human")
-                session.message_count = user_message_count
-                session.save(update_fields=['message_count', 'updated_at'])
+                session.save(update_fields=['updated_at'])
                 
                 # Generate title if this is early in the conversation
-                if not session.title and session.message_count <= 2:
+                # (count stored messages: old turns are folded out of the state)
+                if not session.title and session.messages.filter(message_type='human').count() <= 2:
                     session.title = self._generate_session_title(state["messages"])
                     session.save(update_fields=['title'])
             
@@ -243,6 +587,10 @@ class Chatbot:
             # Don't fail the workflow if metadata update fails
             return {"messages": []}
     
+    async def _asave_to_database_node(self, state: ChatState) -> Dict[str, Any]:
+        """Async version of `_save_to_database_node` (Django ORM runs in a sync thread)"""
+        return await sync_to_async(self._save_to_database_node)(state)
+    
     def _generate_session_title(self, messages: List) -> str:
         """
         Generate a title for the chat session based on the first user message
@@ -259,6 +607,109 @@ class Chatbot:
         except Exception:
             return "Chat Session"
     
+    def _build_response(self, messages: List, session_id: str) -> ChatResponse:
+        """Extract the final assistant message and check for tool usage"""
+        assistant_message = None
+        tool_used = False
+        tool_calls_made = False
+        
+        for msg in reversed(messages):
+            if msg.type == "ai" and not getattr(msg, 'tool_calls', None) and not assistant_message:
+                assistant_message = msg
+            elif msg.type == "ai" and getattr(msg, 'tool_calls', None):
+                tool_calls_made = True
+            elif msg.type == "tool":
+                tool_used = True
+        
+        if not assistant_message:
+            raise ValueError("No assistant response generated")
+        
+        return ChatResponse(
+            success=True,
+            message=assistant_message.content,
+            data={
+                "used_rag_tool": tool_used,
+                "tool_calls_made": tool_calls_made,
+                "answer_cache_hit": bool(assistant_message.response_metadata.get("answer_cache")),
+                "workflow_type": "langgraph_tool"
+            },
+            session_id=session_id,
+            task="langgraph_rag_tool",
+            confidence=0.9 if tool_used else 0.7,
+            timestamp=datetime.now().isoformat()
+        )
+    
+    async def astream_message(self, request: ChatRequest) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the workflow with `astream_events` and yield events as they happen:
+        
+        - {"event": "token", "content": ...} for each token of the answer
+        - {"event": "tool_start", "name": ..., "query": ...} / {"event": "tool_end", "name": ...}
+        - {"event": "final", "response": ChatResponse} once, at the end
+        
+        Failures are reported as a final event with an unsuccessful ChatResponse.
+        """
+        session_id = request.session_id or f"session_{request.user_id}_{int(time.time())}"
+        try:
+            is_valid, error_message = MessageValidator.validate_user_message(request.user_message)
+            if not is_valid:
+                yield {"event": "final", "response": ChatResponse(
+                    success=False,
+                    message=f"Invalid input: {error_message}",
+                    session_id=session_id,
+                    task='error',
+                    timestamp=datetime.now().isoformat()
+                )}
+                return
+            
+            initial_state = {
+                "messages": [HumanMessage(content=request.user_message)],
+                "user_id": request.user_id,
+                "session_id": session_id,
+            }
+            config = {"configurable": {"thread_id": session_id}}
+            
+            final_state = None
+            workflow = await self._get_async_workflow()
+            async for event in workflow.astream_events(initial_state, config=config, version="v2"):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                
+                # Only the agent's answer is streamed (the summarize node also calls the chat model)
+                if kind == "on_chat_model_stream" and node == "agent":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield {"event": "token", "content": content}
+                elif kind == "on_tool_start":
+                    tool_input = event["data"].get("input") or {}
+                    yield {"event": "tool_start", "name": event["name"], "query": tool_input.get("query")}
+                elif kind == "on_tool_end":
+                    yield {"event": "tool_end", "name": event["name"]}
+                elif kind == "on_chain_end" and event["name"] == "answer_cache" and node == "answer_cache":
+                    # A cached answer arrives whole, as a single token event
+                    output = event["data"].get("output")
+                    for msg in (output.get("messages", []) if isinstance(output, dict) else []):
+                        yield {"event": "token", "content": msg.content}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    final_state = event["data"].get("output")
+            
+            if not final_state:
+                raise ValueError("Workflow finished without a final state")
+            
+            response = self._build_response(final_state["messages"], session_id)
+            logger.info(f"Streamed message for user {request.user_id}: tool_used={response.data['used_rag_tool']}")
+            yield {"event": "final", "response": response}
+            
+        except Exception as e:
+            logger.error(f"LangGraph streaming workflow failed: {e}")
+            yield {"event": "final", "response": ChatResponse(
+                success=False,
+                message=f"I'm sorry, I encountered an error: {e}",
+                session_id=session_id,
+                task='error',
+                timestamp=datetime.now().isoformat()
+            )}
+    
     def process_message(self, request: ChatRequest) -> ChatResponse:
         """
         Process a user message through the LangGraph workflow
@@ -298,44 +749,63 @@ class Chatbot:
             config = {"configurable": {"thread_id": session_id}}
             result = self.workflow.invoke(initial_state, config=config)
             
-            # Extract the final assistant message and check for tool usage
-            assistant_message = None
-            tool_used = False
-            tool_calls_made = False
-            
-            for msg in reversed(result["messages"]):
-                if msg.type == "ai" and not getattr(msg, 'tool_calls', None) and not assistant_message:
-                    assistant_message = msg
-                elif msg.type == "ai" and getattr(msg, 'tool_calls', None):
-                    tool_calls_made = True
-                elif msg.type == "tool":
-                    tool_used = True
-            
-            if not assistant_message:
-                raise ValueError("No assistant response generated")
+            response = self._build_response(result["messages"], session_id)
+            logger.info(f"Processed message for user {request.user_id}: tool_used={response.data['used_rag_tool']}")
+            return response
             
-            logger.info(f"Processed message for user {request.user_id}: tool_used={tool_used}")
+        except Exception as e:
+            logger.error(f"LangGraph workflow failed: {e}")
+            error_session_id = session_id or f"session_{request.user_id}_{int(time.time())}"
             return ChatResponse(
-                success=True,
-                message=assistant_message.content,
-                data={
-                    "used_rag_tool": tool_used,
-                    "tool_calls_made": tool_calls_made,
-                    "workflow_type": "langgraph_tool"
-                },
-                session_id=session_id,
-                task="langgraph_rag_tool",
-                confidence=0.9 if tool_used else 0.7,
+                success=False,
+                message=f"I'm sorry, I encountered an error: {e}",
+                session_id=error_session_id,
+                task='error',
                 timestamp=datetime.now().isoformat()
             )
+    
+    async def aprocess_message(self, request: ChatRequest) -> ChatResponse:
+        """
+        Async version of `process_message`.
+        
+        Runs the workflow with `ainvoke` on the async checkpointer: LLM calls are
+        awaited and blocking work (embedding, Milvus, Django ORM) runs in threads,
+        so the event loop can serve other chats while this one waits on the LLM.
+        """
+        session_id = request.session_id or f"session_{request.user_id}_{int(time.time())}"
+        try:
+            # Validate input
+            is_valid, error_message = MessageValidator.validate_user_message(request.user_message)
+            if not is_valid:
+                return ChatResponse(
+                    success=False,
+                    message=f"Invalid input: {error_message}",
+                    task='error',
+                    timestamp=datetime.now().isoformat()
+                )
+            
+            # Create initial state
+            initial_state = {
+                "messages": [HumanMessage(content=request.user_message)],
+                "user_id": request.user_id,
+                "session_id": session_id,
+            }
+            
+            # Process through workflow
+            config = {"configurable": {"thread_id": session_id}}
+            workflow = await self._get_async_workflow()
+            result = await workflow.ainvoke(initial_state, config=config)
+            
+            response = self._build_response(result["messages"], session_id)
+            logger.info(f"Processed message for user {request.user_id}: tool_used={response.data['used_rag_tool']}")
+            return response
             
         except Exception as e:
             logger.error(f"LangGraph workflow failed: {e}")
-            error_session_id = session_id or f"session_{request.user_id}_{int(time.time())}"
             return ChatResponse(
                 success=False,
                 message=f"I'm sorry, I encountered an error: {e}",
-                session_id=error_session_id,
+                session_id=session_id,
                 task='error',
                 timestamp=datetime.now().isoformat()
-            )
\ No newline at end of file
+            )
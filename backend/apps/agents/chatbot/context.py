@@ -0,0 +1,126 @@
+"""
+Conversation context window for the chatbot.
+
+The checkpointed history grows with every turn, so the agent does not send it
+as is: the last `CHATBOT_KEEP_TURNS` turns stay verbatim, older turns are
+folded into a rolling summary kept in the graph state, and the final prompt is
+capped at `CHATBOT_CONTEXT_MAX_TOKENS` with the model's tokenizer.
+
+A turn starts at a human message and runs until the next one, so an AI tool
+call and its tool result are never separated.
+"""
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+from django.conf import settings
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, trim_messages
+
+from .system_prompts import SUMMARY_PROMPT
+
+logger = logging.getLogger(__name__)
+
+
+def get_context_config() -> Dict[str, int]:
+    keep_turns = getattr(settings, "CHATBOT_KEEP_TURNS", 6)
+    return {
+        "keep_turns": keep_turns,
+        # Fold in batches so the summary is regenerated every few turns, not every turn
+        "summarize_after_turns": max(getattr(settings, "CHATBOT_SUMMARIZE_AFTER_TURNS", 10), keep_turns + 1),
+        "max_tokens": getattr(settings, "CHATBOT_CONTEXT_MAX_TOKENS", 3000),
+    }
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a human message."""
+    turns: List[List[BaseMessage]] = []
+    for msg in messages:
+        if msg.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def current_turn_has_tool_results(messages: Sequence[BaseMessage]) -> bool:
+    """Whether a tool already answered in the latest turn (older turns' tool results do not count)."""
+    turns = split_turns(messages)
+    return bool(turns) and any(msg.type == "tool" for msg in turns[-1])
+
+
+def messages_to_fold(messages: Sequence[BaseMessage], keep_turns: int, summarize_after_turns: int) -> List[BaseMessage]:
+    """
+    Messages of the oldest turns to fold into the summary, or [] while the
+    history is still under `summarize_after_turns` turns.
+    """
+    turns = split_turns(messages)
+    if len(turns) <= summarize_after_turns:
+        return []
+    return [msg for turn in turns[:-keep_turns] for msg in turn]
+
+
+def format_transcript(messages: Sequence[BaseMessage]) -> str:
+    """Plain-text transcript of human / AI / tool messages for the summarizer."""
+    lines = []
+    for msg in messages:
+        if msg.type == "human":
+            lines.append(f"User: {msg.content}")
+        elif msg.type == "ai" and msg.content:
+            lines.append(f"Assistant: {msg.content}")
+        elif msg.type == "tool":
+            lines.append(f"Retrieved content: {msg.content}")
+    return "\n".join(lines)
+
+
+def _summary_request(previous_summary: str, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    prompt = SUMMARY_PROMPT.format(
+        summary=previous_summary or "(none yet)",
+        transcript=format_transcript(messages),
+    )
+    return [HumanMessage(content=prompt)]
+
+
+def _summary_text(response) -> str:
+    return (response.content if hasattr(response, "content") else str(response)).strip()
+
+
+def summarize(llm, previous_summary: str, messages: Sequence[BaseMessage]) -> str:
+    """Extend `previous_summary` with the folded messages (incremental, one LLM call)."""
+    return _summary_text(llm.invoke(_summary_request(previous_summary, messages)))
+
+
+async def asummarize(llm, previous_summary: str, messages: Sequence[BaseMessage]) -> str:
+    """Async version of `summarize`."""
+    return _summary_text(await llm.ainvoke(_summary_request(previous_summary, messages)))
+
+
+def build_context(
+    system_prompt: str,
+    summary: str,
+    messages: Sequence[BaseMessage],
+    token_counter: Any,
+    max_tokens: int,
+) -> List[BaseMessage]:
+    """
+    System prompt (+ rolling summary) followed by the most recent messages
+    that fit in `max_tokens`, starting on a human message.
+    """
+    if summary:
+        system_prompt = f"{system_prompt}\n\n**Summary of the earlier conversation:**\n{summary}"
+    system = SystemMessage(content=system_prompt)
+
+    trimmed = trim_messages(
+        [system, *messages],
+        max_tokens=max_tokens,
+        token_counter=token_counter,
+        strategy="last",
+        start_on="human",
+        include_system=True,
+        allow_partial=False,
+    )
+
+    if not any(msg.type == "human" for msg in trimmed):
+        # The latest turn alone is over budget: send it anyway rather than nothing
+        turns = split_turns(messages)
+        logger.warning("Latest chat turn exceeds the context token budget")
+        return [system, *(turns[-1] if turns else [])]
+    return trimmed
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime, timedelta
 from logging import getLogger
 
@@ -58,9 +59,11 @@ class MessageTypes:
 class Keywords:
     """Common keywords for parsing user queries"""
 
-    # Platform keywords
+    # Platform keywords, only for platforms that are ingested (SocialPost.platform values),
+    # otherwise the Milvus filter matches no rows
     platform = {
-        "facebook": ["facebook", "fb", "meta"],
+        "bluesky": ["bluesky", "bsky"],
+        # "facebook": ["facebook", "fb", "meta"],
         # "instagram": ["instagram", "insta"],
         "tiktok": ["tiktok", "tt", "tik tok"],
         # "youtube": ["youtube", "yt"],
@@ -82,6 +85,20 @@ class Keywords:
     # Keywords for increasing search scope
     broad_search = ["all", "everything", "summary", "overview", "tất cả", "toàn bộ", "tóm tắt", "khái quát"]
 
+    # Phrases referring to the user's saved library (retrieval needed)
+    retrieval = [
+        "saved", "i save", "bookmarked", "my content", "my library", "my collection",
+        "my videos", "my posts", "my reels", "my feed",
+        "đã lưu", "nội dung của tôi", "video của tôi", "bài viết của tôi", "thư viện của tôi",
+    ]
+
+    # Short messages answered directly (greetings, thanks, questions about the assistant)
+    chit_chat = [
+        "hi", "hello", "hey", "thanks", "thank you", "bye", "goodbye", "ok", "okay",
+        "good morning", "good evening", "who are you", "what can you do", "how do i use",
+        "xin chào", "chào", "cảm ơn", "tạm biệt", "bạn là ai", "bạn làm được gì",
+    ]
+
     @staticmethod
     def filter_keywords():
         """Flattened list of all filter keywords"""
@@ -108,13 +125,17 @@ class Keywords:
             keywords.extend(kw_list)
         return keywords
     
+    @staticmethod
+    def mentions(query: str, kw_list: list[str]) -> bool:
+        """Whether any keyword appears in the query as a whole word or phrase"""
+        return any(re.search(rf"(?<!\w){re.escape(kw)}(?!\w)", query, re.IGNORECASE) for kw in kw_list)
+
     @staticmethod
     def filter_platform(query: str) -> list[str]:
-        """List of platforms mentioned in the query"""
+        """List of platforms mentioned in the query (whole words only: "tt" must not match "pretty")"""
         platforms = []
-        query_lower = query.lower()
         for platform, kw_list in Keywords.platform.items():
-            if any(kw in query_lower for kw in kw_list):
+            if Keywords.mentions(query, kw_list):
                 platforms.append(platform)
         return platforms
     
@@ -0,0 +1,147 @@
+"""
+Intent router in front of the chatbot agent.
+
+Decides locally whether a message needs retrieval from the user's library,
+so the graph can go straight to the RAG tool or straight to a plain chat
+answer without an extra tool-selection LLM call:
+
+1. keyword rules from `Keywords` (word-boundary matches)
+2. a nearest-prototype classifier on all-MiniLM-L6-v2 embeddings (the model
+   already loaded for RAG)
+3. decisions are cached per normalized message
+
+When neither step is confident the router returns None and the agent lets
+the LLM choose, as before.
+"""
+
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .messages import Keywords
+
+logger = logging.getLogger(__name__)
+
+RETRIEVE = "retrieve"
+CHAT = "chat"
+
+# Example messages per intent for the embedding classifier (English and Vietnamese)
+PROTOTYPES: Dict[str, List[str]] = {
+    RETRIEVE: [
+        "What did I save about cooking?",
+        "Find the video about investing I saved last week",
+        "Summarize my saved TikTok videos",
+        "What content do I have about fitness?",
+        "Tell me about the posts on machine learning in my library",
+        "Which Bluesky posts mention climate change?",
+        "Explain the productivity tips from my saved videos",
+        "Give me an overview of everything I saved",
+        "Tôi đã lưu video nào về nấu ăn?",
+        "Tóm tắt các bài viết tôi đã lưu về du lịch",
+    ],
+    CHAT: [
+        "Hello, how are you?",
+        "Thanks a lot!",
+        "What can you do?",
+        "Who are you?",
+        "How do I save a post in ReelsAI?",
+        "Can you reply in Vietnamese?",
+        "Good morning",
+        "That's all, bye",
+        "Xin chào bạn",
+        "Cảm ơn bạn nhiều",
+    ],
+}
+
+# Messages at most this long can be routed to chat by the chit-chat keywords
+MAX_CHIT_CHAT_WORDS = 5
+
+
+def _phrase_pattern(phrases: List[str]) -> re.Pattern:
+    alternatives = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+
+def _normalize(message: str) -> str:
+    return " ".join(message.lower().split())
+
+
+class IntentRouter:
+    """Routes a user message to RETRIEVE, CHAT or None (let the LLM decide)."""
+
+    def __init__(self, min_similarity: Optional[float] = None, min_margin: Optional[float] = None):
+        self.min_similarity = min_similarity if min_similarity is not None else getattr(
+            settings, "CHATBOT_ROUTER_MIN_SIMILARITY", 0.45
+        )
+        self.min_margin = min_margin if min_margin is not None else getattr(
+            settings, "CHATBOT_ROUTER_MIN_MARGIN", 0.05
+        )
+        self._retrieval = _phrase_pattern(Keywords.retrieval + Keywords.platform_keywords())
+        self._chit_chat = _phrase_pattern(Keywords.chit_chat)
+        self._prototypes: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.route = lru_cache(maxsize=2048)(self._route)
+
+    def __call__(self, message: str) -> Optional[str]:
+        return self.route(_normalize(message))
+
+    def _route(self, message: str) -> Optional[str]:
+        decision = self.route_by_keywords(message)
+        if decision is None:
+            decision = self.route_by_embedding(message)
+        logger.info(f"Intent router: {decision or 'undecided'} for '{message[:60]}'")
+        return decision
+
+    def route_by_keywords(self, message: str) -> Optional[str]:
+        if self._retrieval.search(message):
+            return RETRIEVE
+        if len(message.split()) <= MAX_CHIT_CHAT_WORDS and self._chit_chat.search(message):
+            return CHAT
+        return None
+
+    def route_by_embedding(self, message: str) -> Optional[str]:
+        prototypes = self._get_prototypes()
+        if prototypes is None:
+            return None
+
+        from apps.agents.rag.utils import get_model
+
+        query = get_model().encode(message, normalize_embeddings=True)
+        scores = {intent: float(np.max(vectors @ query)) for intent, vectors in prototypes.items()}
+        best, second = sorted(scores, key=scores.get, reverse=True)[:2]
+        if scores[best] >= self.min_similarity and scores[best] - scores[second] >= self.min_margin:
+            return best
+        return None
+
+    def _get_prototypes(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    from apps.agents.rag.utils import get_model
+
+                    model = get_model()
+                    if model is None:
+                        return None
+                    self._prototypes = {
+                        intent: np.asarray(model.encode(examples, normalize_embeddings=True))
+                        for intent, examples in PROTOTYPES.items()
+                    }
+        return self._prototypes
+
+
+_router: Optional[IntentRouter] = None
+
+
+def get_router() -> Optional[IntentRouter]:
+    """Process-wide router, None when CHATBOT_ROUTER is disabled."""
+    global _router
+    if not getattr(settings, "CHATBOT_ROUTER", True):
+        return None
+    if _router is None:
+        _router = IntentRouter()
+    return _router
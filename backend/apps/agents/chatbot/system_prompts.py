@@ -40,22 +40,41 @@ You can communicate fluently in both English and Vietnamese. Respond in the lang
 Remember: You have access to their personal content library through the retrieve_and_answer tool. Use it wisely to provide the most helpful and relevant responses to their questions.
 """
 
-RAG_PROMPT = """
-Based on the following content from the user's social media library, provide a comprehensive and helpful answer to their question.
-
-User's Question: {query}
+RAG_CONTEXT_TEMPLATE = """
 Search Summary: {search_meta}
 
 Retrieved Content:
 {context}
+"""
 
-Instructions:
+RAG_ANSWER_INSTRUCTIONS = """
+**Answering from retrieved content:**
+The latest tool result contains content retrieved from the user's social media library for their question.
 - Answer the user's question using the retrieved content
 - Start with a brief summary if multiple pieces of content are relevant
 - Be specific and reference which pieces of content support your answer
 - If content spans multiple platforms, highlight interesting patterns or differences
 - If the content doesn't fully answer the question, say so and provide what information you can
+- If nothing relevant was found, say so and suggest how the user could rephrase or broaden the search
 - Keep the answer conversational, helpful, and well-organized
 - If there are dates, mention the timeline of the content
+"""
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and ReelsAI, an assistant for the user's saved social content.
+
+Current summary:
+{summary}
+
+New conversation turns to fold into the summary:
+{transcript}
+
+Instructions:
+- Return the updated summary only, as a few short paragraphs or bullet points
+- Keep facts the user shared, their preferences, open questions and the topics or saved content discussed
+- Keep names, platforms and dates that later questions may refer to
+- Drop greetings, filler and details already answered that are unlikely to matter again
+- Write in the language the user is using
+- Stay under 250 words
 
-Answer:"""
\ No newline at end of file
+Updated summary:"""
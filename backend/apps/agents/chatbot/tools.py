@@ -1,19 +1,35 @@
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+import asyncio
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from django.conf import settings
+from apps.agents.rag.rerank import count_tokens, fit_to_budget, get_rerank_config, get_reranker
 from apps.agents.rag.utils import query_items
-from .system_prompts import RAG_PROMPT
+from .system_prompts import RAG_CONTEXT_TEMPLATE
 from .messages import Keywords
-from ..kg_constructor.config import get_openai_llm
 
 logger = logging.getLogger(__name__)
 
-tools_llm = get_openai_llm(model="gpt-4o-mini")
+# Embedding, Milvus and reranking calls of the async tool run here, off the event loop.
+# Bounded so many concurrent chats queue for CPU instead of oversubscribing it.
+_executor = None
 
-@tool
-def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "CHATBOT_RAG_WORKERS", 8),
+            thread_name_prefix="chatbot-rag",
+        )
+    return _executor
+
+
+def _retrieve_context(query: str, user_id: str, k: int = 5) -> str:
     """
-    Retrieve relevant content from database, then generate an answer.
+    Retrieve relevant content from the user's library to answer their question.
     
     Use this tool when users ask about their social content, saved content, or need 
     information from their personal content library. Works with TikTok and Facebook content.
@@ -24,7 +40,7 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         k: Number of top relevant items to retrieve (default: 5)
         
     Returns:
-        Comprehensive answer based on retrieved content from social content library
+        The retrieved content, formatted as context for the final answer
     """
     try:        
         logger.info(f"RAG tool called with query: '{query}' for user: {user_id}")
@@ -37,9 +53,10 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         # Simple heuristics to improve search
         query_lower = query.lower()
         
-        # Platform filtering
+        # Platform filtering (several platforms are matched with a Milvus `in` filter)
         platform_filters = Keywords.filter_platform(query)
         logger.info(f"Filtering for platforms: {platform_filters}")
+        platform_filter = platform_filters or None
         
         # Time filtering for recent content
         time_filters = Keywords.filter_time(query)
@@ -49,11 +66,16 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         if Keywords.is_broad_search(query):
             top_k = 10
         
+        # With a reranker, over-fetch candidates and keep the best ones above the cutoff
+        rerank_cfg = get_rerank_config()
+        reranker = get_reranker(rerank_cfg["method"])
+        fetch_k = top_k * rerank_cfg["overfetch"] if reranker else top_k
+        
         # Query Milvus for relevant content
         search_results = query_items(
             user_id=user_id,
             query=query,
-            top_k=top_k,
+            top_k=fetch_k,
             from_timestamp=time_filter,
             platform=platform_filter
         )
@@ -61,10 +83,15 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         results = search_results.get("results", [])
         filter_info = search_results.get("filter", "")
         
+        if reranker and results:
+            candidates = len(results)
+            results = reranker.rerank(query, results, top_k, rerank_cfg["min_score"])
+            logger.info(f"Reranked {candidates} candidates with {reranker.name}, kept {len(results)}")
+        
         if not results:
             filter_msg = ""
             if platform_filter:
-                filter_msg += f" on {platform_filter.title()}"
+                filter_msg += f" on {' or '.join(p.title() for p in platform_filter)}"
             if time_filter:
                 filter_msg += f" from recent content"
                 
@@ -84,7 +111,7 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         for i, result in enumerate(results, 1):
             platform = result.get('platform', 'Unknown').title()
             summary = result.get('summary', 'No summary available')
-            score = result.get('score', 0.0)
+            score = result.get('rerank_score', result.get('score', 0.0))
             timestamp = result.get('timestamp', 0)
             
             platforms_found.add(platform)
@@ -102,7 +129,12 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
                 f"Content {i} ({platform}{date_str}, relevance: {score:.3f}):\n{summary}"
             )
         
+        # Keep the prompt within the context token budget (best items first)
+        context_pieces = fit_to_budget(context_pieces, rerank_cfg["token_budget"])
+        results = results[:len(context_pieces)]
+        platforms_found = {r.get('platform', 'Unknown').title() for r in results}
         context = "\n\n".join(context_pieces)
+        logger.info(f"RAG context: {len(context_pieces)} items, ~{count_tokens(context)} tokens")
         
         # Enhanced metadata for the answer
         search_meta = f"Found {len(results)} relevant items"
@@ -111,18 +143,9 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
         if time_filter:
             search_meta += " from recent content"
         
-        # Use LLM to generate answer based on retrieved content
-        llm = tools_llm
-        
-        response = llm.invoke([{"role": "user", "content": RAG_PROMPT.format(
-            query=query, 
-            search_meta=search_meta, 
-            context=context)
-            }])
-        answer = response.content if hasattr(response, 'content') else str(response)
-        
-        logger.info(f"RAG tool successfully generated answer for user {user_id} with {len(results)} results")
-        return answer
+        # The agent writes the answer from this context (no LLM call inside the tool)
+        logger.info(f"RAG tool retrieved context for user {user_id} with {len(results)} results")
+        return RAG_CONTEXT_TEMPLATE.format(search_meta=search_meta, context=context)
         
     except ImportError as e:
         logger.error(f"RAG dependencies not available: {e}")
@@ -136,4 +159,18 @@ def retrieve_and_answer(query: str, user_id: str, k: int = 5) -> str:
             f"I encountered an error while searching your content library: {str(e)}. "
             f"Please try again or rephrase your question. If the problem persists, "
             f"the search system may need to be configured or your content library may be empty."
-        )
\ No newline at end of file
+        )
+
+
+async def _aretrieve_context(query: str, user_id: str, k: int = 5) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(_retrieve_context, query, user_id, k)
+    )
+
+
+retrieve_and_answer = StructuredTool.from_function(
+    func=_retrieve_context,
+    coroutine=_aretrieve_context,
+    name="retrieve_and_answer",
+)
@@ -0,0 +1,130 @@
+"""
+Short-TTL result cache for RAG searches.
+
+Entries are keyed by user, a per-user data version, the normalized query and the
+filter expression. Writing new data for a user bumps that user's version, so all
+of their cached results are invalidated at once without scanning keys.
+
+The bump must reach every process that serves queries, so the cache is disabled
+when the default cache backend is process-local (LocMemCache without REDIS_URL).
+"""
+
+import hashlib
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from .config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_CACHE_TTL = 120
+
+# Backends that keep entries inside one process: other processes never see a version bump
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+_local_cache_warned = False
+
+
+def _cache():
+    from django.core.cache import cache
+
+    return cache
+
+
+def is_shared_cache() -> bool:
+    """Whether the default Django cache is shared by every process (Redis, Memcached, database...)."""
+    try:
+        from django.conf import settings
+
+        backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    except Exception:
+        return False
+    return bool(backend) and backend not in LOCAL_CACHE_BACKENDS
+
+
+def versioned_cache_enabled() -> bool:
+    """Caches invalidated by `invalidate_user` are only safe on a shared cache backend."""
+    global _local_cache_warned
+    if is_shared_cache():
+        return True
+    if not _local_cache_warned:
+        _local_cache_warned = True
+        logger.warning("Default cache is process-local: RAG query and answer caches are disabled (set REDIS_URL)")
+    return False
+
+
+def _version_key(user_id: str) -> str:
+    return f"rag:version:{user_id}"
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop surrounding punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?!.,;:")
+
+
+def get_user_version(user_id: str) -> int:
+    """Current data version of a user's RAG items."""
+    try:
+        return _cache().get(_version_key(user_id), 0)
+    except Exception as e:
+        logger.warning(f"RAG cache unavailable: {e}")
+        return 0
+
+
+def invalidate_user(user_id: str) -> None:
+    """Invalidate every cached result of a user (call after writing their data)."""
+    key = _version_key(user_id)
+    try:
+        # Readers default to 0 when the key is missing; add() is atomic, so two
+        # processes cannot both reset an existing counter
+        _cache().add(key, 0, timeout=None)
+        try:
+            _cache().incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            _cache().add(key, 1, timeout=None)
+    except Exception as e:
+        logger.warning(f"RAG cache invalidation failed for user {user_id}: {e}")
+
+
+def _query_key(user_id: str, version: int, query: str, expr: str, **params: Any) -> str:
+    extra = "|".join(f"{k}={params[k]}" for k in sorted(params))
+    digest = hashlib.sha1(f"{normalize_query(query)}|{expr}|{extra}".encode()).hexdigest()
+    return f"rag:query:{user_id}:{version}:{digest}"
+
+
+def get_ttl() -> int:
+    if not versioned_cache_enabled():
+        return 0
+    return int(get_setting("RAG_QUERY_CACHE_TTL", DEFAULT_QUERY_CACHE_TTL))
+
+
+def get_cached_result(user_id: str, version: int, query: str, expr: str, **params: Any) -> Optional[Dict[str, Any]]:
+    """Cached query_items result for the given data version, or None on a miss."""
+    if get_ttl() <= 0:
+        return None
+    try:
+        return _cache().get(_query_key(user_id, version, query, expr, **params))
+    except Exception as e:
+        logger.warning(f"RAG cache read failed: {e}")
+        return None
+
+
+def set_cached_result(user_id: str, version: int, query: str, expr: str, result: Dict[str, Any], **params: Any) -> None:
+    """
+    Store a query_items result.
+
+    `version` must be read before searching, so a result racing with an insert is
+    stored under the old version and never served after the invalidation.
+    """
+    ttl = get_ttl()
+    if ttl <= 0:
+        return
+    try:
+        _cache().set(_query_key(user_id, version, query, expr, **params), result, timeout=ttl)
+    except Exception as e:
+        logger.warning(f"RAG cache write failed: {e}")
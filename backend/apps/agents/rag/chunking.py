@@ -0,0 +1,71 @@
+"""
+Passage chunking for long summaries.
+
+all-MiniLM-L6-v2 truncates input after 256 word pieces, so long video
+summaries are split into overlapping passages that are embedded separately
+and stored with their parent `content_id`. Search over-fetches passages and
+aggregates them back to one hit per parent item.
+"""
+
+from typing import Any, Dict, List
+
+from .config import get_setting
+
+
+def get_chunking_config() -> Dict[str, Any]:
+    return {
+        "enabled": str(get_setting("RAG_CHUNKING", "false")).lower() in ("1", "true", "yes"),
+        "chunk_words": int(get_setting("RAG_CHUNK_WORDS", 150)),
+        "overlap_words": int(get_setting("RAG_CHUNK_OVERLAP_WORDS", 30)),
+        "overfetch": int(get_setting("RAG_CHUNK_OVERFETCH", 4)),
+        "aggregation": str(get_setting("RAG_CHUNK_AGGREGATION", "max")).lower(),
+    }
+
+
+def split_passages(text: str, chunk_words: int = 150, overlap_words: int = 30) -> List[str]:
+    """
+    Split text into passages of at most `chunk_words` words, consecutive
+    passages sharing `overlap_words` words. Short texts yield one passage.
+    """
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [text.strip()] if words else []
+
+    step = max(chunk_words - overlap_words, 1)
+    passages = []
+    for start in range(0, len(words), step):
+        passages.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return passages
+
+
+def aggregate_passages(hits: List[Dict[str, Any]], top_k: int, method: str = "max") -> List[Dict[str, Any]]:
+    """
+    Group passage hits by parent content_id.
+
+    method: "max" keeps the best passage score, "sum" adds the scores of every
+    matched passage (favours items that match in several places).
+    The parent's summary is its matched passages in document order.
+    """
+    parents: Dict[str, Dict[str, Any]] = {}
+    for hit in hits:
+        parent = parents.get(hit["content_id"])
+        if parent is None:
+            parent = parents[hit["content_id"]] = {**hit, "score": 0.0, "passages": []}
+        parent["passages"].append(hit)
+        if method == "sum":
+            parent["score"] += hit["score"]
+        else:
+            parent["score"] = max(parent["score"], hit["score"])
+
+    results = []
+    for parent in parents.values():
+        passages = sorted(parent.pop("passages"), key=lambda h: h.get("chunk_index") or 0)
+        parent["summary"] = " … ".join(p["summary"] for p in passages)
+        parent["matched_passages"] = len(passages)
+        parent.pop("chunk_index", None)
+        results.append(parent)
+
+    results.sort(key=lambda h: h["score"], reverse=True)
+    return results[:top_k]
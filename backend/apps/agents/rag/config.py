@@ -0,0 +1,135 @@
+"""
+Configuration for the RAG layer.
+
+Values are read from Django settings when they are configured and fall back to
+environment variables, so `milvus_setup` can also run outside of Django.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+
+def get_setting(name: str, default: Any = None) -> Any:
+    """Read a RAG setting from Django settings, falling back to the environment."""
+    try:
+        from django.conf import settings
+
+        if settings.configured and hasattr(settings, name):
+            return getattr(settings, name)
+    except ImportError:
+        pass
+    return os.getenv(name, default)
+
+
+# Index profiles for the `embedding` field.
+# Each profile pairs build params with the search params that index type understands
+# (HNSW reads `ef`, IVF_* read `nprobe`, DISKANN reads `search_list`).
+INDEX_PROFILES: Dict[str, Dict[str, Any]] = {
+    "hnsw": {
+        "index_params": {
+            "index_type": "HNSW",
+            "metric_type": "COSINE",
+            "params": {"M": 16, "efConstruction": 200},
+        },
+        "search_params": {"metric_type": "COSINE", "params": {"ef": 64}},
+        "description": "Graph index, best latency/recall for in-memory collections",
+    },
+    "ivf_flat": {
+        "index_params": {
+            "index_type": "IVF_FLAT",
+            "metric_type": "COSINE",
+            "params": {"nlist": 128},
+        },
+        "search_params": {"metric_type": "COSINE", "params": {"nprobe": 16}},
+        "description": "Inverted file with raw vectors (previous default)",
+    },
+    "ivf_sq8": {
+        "index_params": {
+            "index_type": "IVF_SQ8",
+            "metric_type": "COSINE",
+            "params": {"nlist": 128},
+        },
+        "search_params": {"metric_type": "COSINE", "params": {"nprobe": 16}},
+        "description": "Inverted file with 8-bit scalar quantization, ~4x less memory",
+    },
+    "diskann": {
+        "index_params": {
+            "index_type": "DISKANN",
+            "metric_type": "COSINE",
+            "params": {},
+        },
+        "search_params": {"metric_type": "COSINE", "params": {"search_list": 100}},
+        "description": "Disk-resident graph index (self-hosted Milvus with DiskANN enabled)",
+    },
+    "autoindex": {
+        "index_params": {
+            "index_type": "AUTOINDEX",
+            "metric_type": "COSINE",
+            "params": {},
+        },
+        "search_params": {"metric_type": "COSINE", "params": {"level": 1}},
+        "description": "Zilliz Cloud managed index",
+    },
+}
+
+DEFAULT_INDEX_PROFILE = "ivf_flat"
+
+# Search-time knob of each index type, used to tune or benchmark a profile
+SEARCH_KNOBS = {
+    "HNSW": "ef",
+    "IVF_FLAT": "nprobe",
+    "IVF_SQ8": "nprobe",
+    "IVF_PQ": "nprobe",
+    "DISKANN": "search_list",
+    "AUTOINDEX": "level",
+}
+
+
+def get_index_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get an index profile by name.
+
+    Args:
+        name: Profile name (defaults to the RAG_INDEX_PROFILE setting)
+
+    Returns:
+        Profile dict with `index_params` and `search_params`
+    """
+    name = (name or get_setting("RAG_INDEX_PROFILE", DEFAULT_INDEX_PROFILE)).lower()
+    if name not in INDEX_PROFILES:
+        available = ", ".join(INDEX_PROFILES.keys())
+        raise ValueError(f"Unknown RAG index profile: {name}. Available profiles: {available}")
+    return INDEX_PROFILES[name]
+
+
+def get_search_params(index_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Search params matching an index type.
+
+    Args:
+        index_type: Milvus index type of the collection (e.g. "HNSW"). When unknown,
+            the configured profile's search params are used.
+    """
+    configured = get_index_profile()
+    if not index_type or configured["index_params"]["index_type"] == index_type.upper():
+        return configured["search_params"]
+
+    for profile in INDEX_PROFILES.values():
+        if profile["index_params"]["index_type"] == index_type.upper():
+            return profile["search_params"]
+    return configured["search_params"]
+
+
+# Retrieval mode for query_items: "dense" (vector only) or "hybrid" (BM25 + vector)
+DEFAULT_RETRIEVAL_MODE = "dense"
+
+
+def get_hybrid_config() -> Dict[str, Any]:
+    """Per-leg top-k and weights for hybrid retrieval with reciprocal rank fusion."""
+    return {
+        "dense_k": int(get_setting("RAG_HYBRID_DENSE_K", 20)),
+        "sparse_k": int(get_setting("RAG_HYBRID_SPARSE_K", 20)),
+        "dense_weight": float(get_setting("RAG_HYBRID_DENSE_WEIGHT", 1.0)),
+        "sparse_weight": float(get_setting("RAG_HYBRID_SPARSE_WEIGHT", 1.0)),
+        "rrf_k": int(get_setting("RAG_RRF_K", 60)),
+    }
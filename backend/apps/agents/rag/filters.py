@@ -0,0 +1,165 @@
+"""
+Typed filter builder for Milvus search expressions.
+
+Values are never interpolated into the expression: `build()` returns an
+expression template with `{placeholders}` plus the matching parameters, which
+Milvus binds server side (expression templates, Milvus >= 2.5). `render()`
+produces an equivalent literal with escaped values for logs, cache keys and
+servers without template support.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Filterable scalar fields of the RAG collection and their Python types
+FIELD_TYPES = {
+    "id": int,
+    "user_id": str,
+    "content_id": str,
+    "platform": str,
+    "timestamp": int,
+}
+
+# op -> Milvus operator
+OPERATORS = {
+    "eq": "==",
+    "ne": "!=",
+    "in": "in",
+    "gte": ">=",
+    "lte": "<=",
+    "gt": ">",
+    "lt": "<",
+}
+
+
+_COMPARATORS = {
+    "gte": lambda a, b: a >= b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "lt": lambda a, b: a < b,
+}
+
+
+@lru_cache(maxsize=256)
+def _compile(shape: Tuple[Tuple[str, str], ...]) -> str:
+    """Expression template for a sequence of (field, op) clauses."""
+    return " && ".join(
+        f"{field} {OPERATORS[op]} {{{_param_name(index, field, op)}}}"
+        for index, (field, op) in enumerate(shape)
+    )
+
+
+def _param_name(index: int, field: str, op: str) -> str:
+    return f"{field}_{op}_{index}"
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_literal(v) for v in value) + "]"
+    if isinstance(value, str):
+        # JSON string escaping matches Milvus' double-quoted string literals
+        return json.dumps(value, ensure_ascii=False)
+    return str(int(value))
+
+
+class MilvusFilter:
+    """
+    Builder for conjunctive Milvus filters.
+
+    Example:
+        >>> f = MilvusFilter().eq("user_id", "42").in_("platform", ["tiktok", "bluesky"])
+        >>> f.build()
+        ('user_id == {user_id_eq_0} && platform in {platform_in_1}',
+         {'user_id_eq_0': '42', 'platform_in_1': ['tiktok', 'bluesky']})
+    """
+
+    def __init__(self):
+        self._clauses: List[Tuple[str, str, Any]] = []
+
+    def _add(self, field: str, op: str, value: Any) -> "MilvusFilter":
+        if field not in FIELD_TYPES:
+            raise ValueError(f"Field '{field}' cannot be filtered on")
+        expected = FIELD_TYPES[field]
+        values = value if op == "in" else [value]
+        for v in values:
+            if not isinstance(v, expected) or isinstance(v, bool):
+                raise ValueError(f"Field '{field}' expects {expected.__name__}, got {v!r}")
+        self._clauses.append((field, op, list(value) if op == "in" else value))
+        return self
+
+    def eq(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "eq", value)
+
+    def ne(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "ne", value)
+
+    def in_(self, field: str, values: Iterable[Any]) -> "MilvusFilter":
+        values = list(values)
+        if not values:
+            raise ValueError(f"Empty 'in' list for field '{field}'")
+        if len(values) == 1:
+            return self._add(field, "eq", values[0])
+        return self._add(field, "in", values)
+
+    def gte(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "gte", value)
+
+    def lte(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "lte", value)
+
+    def gt(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "gt", value)
+
+    def lt(self, field: str, value: Any) -> "MilvusFilter":
+        return self._add(field, "lt", value)
+
+    def between(self, field: str, low: Any, high: Any) -> "MilvusFilter":
+        return self.gte(field, low).lte(field, high)
+
+    @property
+    def clauses(self) -> List[Tuple[str, str, Any]]:
+        return list(self._clauses)
+
+    def build(self) -> Tuple[str, Dict[str, Any]]:
+        """Expression template and its parameters."""
+        shape = tuple((field, op) for field, op, _ in self._clauses)
+        params = {
+            _param_name(index, field, op): value
+            for index, (field, op, value) in enumerate(self._clauses)
+        }
+        return _compile(shape), params
+
+    def render(self) -> str:
+        """Literal expression with escaped values."""
+        return " && ".join(
+            f"{field} {OPERATORS[op]} {_literal(value)}" for field, op, value in self._clauses
+        )
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        """Evaluate the filter in Python, for backends without server-side filtering."""
+        for field, op, value in self._clauses:
+            actual = row.get(field)
+            if op == "in":
+                if actual not in value:
+                    return False
+            elif op in ("eq", "ne"):
+                if (actual == value) != (op == "eq"):
+                    return False
+            else:
+                if actual is None or not _COMPARATORS[op](actual, value):
+                    return False
+        return True
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+def user_items_filter(user_id: str, from_timestamp=None, platform=None) -> MilvusFilter:
+    """Filter for one user's items, optionally by minimum timestamp and platform(s)."""
+    f = MilvusFilter().eq("user_id", str(user_id))
+    if from_timestamp:
+        f.gte("timestamp", int(from_timestamp))
+    if platform:
+        f.in_("platform", [platform] if isinstance(platform, str) else platform)
+    return f
@@ -4,11 +4,16 @@ from pymilvus import (
     FieldSchema,
     CollectionSchema,
     DataType,
+    Function,
+    FunctionType,
     utility,
 )
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
+from .config import get_index_profile
+
 load_dotenv()
 # from django.conf import settings
 
@@ -18,41 +23,124 @@ ZILLIZ_URI = os.getenv("ZILLIZ_URI")
 ZILLIZ_TOKEN = os.getenv("ZILLIZ_TOKEN")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
+# Số partition vật lý mà Milvus dùng để hash partition key (user_id).
+# Mỗi search có filter user_id chỉ phải quét 1 partition thay vì toàn bộ collection.
+NUM_PARTITIONS = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))
+
 # settings.configure()
 
 # ========= CONNECT =========
 connections.connect(alias="default", uri=ZILLIZ_URI, token=ZILLIZ_TOKEN)
 print("✅ Connected to Zilliz Cloud")
 
+
 # ========= DEFINE SCHEMA =========
-if COLLECTION_NAME not in utility.list_collections():
+def build_schema() -> CollectionSchema:
+    """Schema with `user_id` as partition key so searches are pruned per user."""
     fields = [
         FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
         FieldSchema(name="content_id", dtype=DataType.VARCHAR, max_length=64),
-        FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(
+            name="user_id",
+            dtype=DataType.VARCHAR,
+            max_length=64,
+            is_partition_key=True,
+        ),
         FieldSchema(name="platform", dtype=DataType.VARCHAR, max_length=20),
-        FieldSchema(name="summary", dtype=DataType.VARCHAR, max_length=4000),
+        FieldSchema(
+            name="summary",
+            dtype=DataType.VARCHAR,
+            max_length=4000,
+            enable_analyzer=True,
+        ),
         FieldSchema(name="timestamp", dtype=DataType.INT64),  # Unix timestamp
+        # Thứ tự passage khi summary dài được chia nhỏ (0 nếu không chia)
+        FieldSchema(name="chunk_index", dtype=DataType.INT64),
         FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
+        # BM25 sparse vector, được Milvus tự sinh từ `summary` khi insert
+        FieldSchema(name="sparse", dtype=DataType.SPARSE_FLOAT_VECTOR),
     ]
 
     schema = CollectionSchema(
         fields, description="Unified embeddings for TikTok + Facebook content"
     )
-    collection = Collection(COLLECTION_NAME, schema)
-    print("🆕 Created collection:", COLLECTION_NAME)
-
-    # Sử dụng chỉ mục IVF_FLAT, phù hợp cho kích thước 384 chiều
-    index_params = {
-        "index_type": "IVF_FLAT",
-        "metric_type": "COSINE",
-        "params": {"nlist": 128},
-    }
+    schema.add_function(
+        Function(
+            name="summary_bm25",
+            function_type=FunctionType.BM25,
+            input_field_names=["summary"],
+            output_field_names=["sparse"],
+        )
+    )
+    return schema
+
+
+def create_collection(name: str, profile: Optional[str] = None) -> Collection:
+    """Create a collection with the current schema and its vector index."""
+    collection = Collection(name, build_schema(), num_partitions=NUM_PARTITIONS)
+    print("🆕 Created collection:", name)
+
+    # Loại index lấy từ profile trong config (RAG_INDEX_PROFILE), mặc định IVF_FLAT
+    index_params = get_index_profile(profile)["index_params"]
     collection.create_index(field_name="embedding", index_params=index_params)
-    print("✅ Created Index for 'embedding'")
+    print(f"✅ Created {index_params['index_type']} index for 'embedding'")
+
+    collection.create_index(
+        field_name="sparse",
+        index_params={
+            "index_type": "SPARSE_INVERTED_INDEX",
+            "metric_type": "BM25",
+            "params": {},
+        },
+    )
+    print("✅ Created BM25 index for 'sparse'")
+    return collection
+
+
+def get_index_type(collection: Collection) -> Optional[str]:
+    """Index type currently built on the `embedding` field, if any."""
+    for index in collection.indexes:
+        if index.field_name == "embedding":
+            return index.params.get("index_type")
+    return None
+
+
+def has_partition_key(collection: Collection) -> bool:
+    """True if the collection was created with a partition key field."""
+    return any(
+        getattr(field, "is_partition_key", False)
+        for field in collection.schema.fields
+    )
+
+
+def has_field(collection: Collection, name: str) -> bool:
+    """True if the collection schema contains the given field."""
+    return any(field.name == name for field in collection.schema.fields)
+
+
+def is_current_schema(collection: Collection) -> bool:
+    """True if the collection has every field and the partition key of `build_schema`."""
+    return has_partition_key(collection) and all(
+        has_field(collection, field.name) for field in build_schema().fields
+    )
+
+
+if COLLECTION_NAME not in utility.list_collections():
+    collection = create_collection(COLLECTION_NAME)
 else:
     collection = Collection(COLLECTION_NAME)
     print("📁 Using existing collection:", COLLECTION_NAME)
+    if not is_current_schema(collection):
+        print(
+            "⚠️ Collection schema is outdated (missing 'user_id' partition key, BM25 or chunk fields). "
+            "Run `python manage.py migrate_rag_partitions` to re-ingest it."
+        )
+    configured_index = get_index_profile()["index_params"]["index_type"]
+    if get_index_type(collection) not in (None, configured_index):
+        print(
+            f"⚠️ Collection index is {get_index_type(collection)}, RAG_INDEX_PROFILE asks for "
+            f"{configured_index}. Search params follow the existing index until it is rebuilt."
+        )
 
 collection.load()
 print(f"🚀 Loaded collection: {COLLECTION_NAME}")
@@ -0,0 +1,174 @@
+"""
+Reranking stage between retrieval and the RAG prompt.
+
+`query_items` is asked for more candidates than the prompt needs; a reranker
+rescores them against the query, drops those under a relevance cutoff and the
+caller trims the rest to a token budget before building the prompt.
+
+- "cross_encoder": a small CPU cross-encoder (ms-marco MiniLM) reading the
+  query and each summary together. Most accurate, ~10-30 ms per candidate batch.
+- "heuristic": fuses the retrieval score with query term overlap. No model.
+- "none": keep the retrieval order (default).
+
+Select with the RAG_RERANKER setting.
+"""
+
+import logging
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from .config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Relevance cutoff per reranker when RAG_RERANK_MIN_SCORE is not set.
+# Cross-encoder scores are sigmoid probabilities; heuristic scores are relative to the best hit.
+DEFAULT_MIN_SCORES = {"cross_encoder": 0.05, "heuristic": 0.5}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def get_rerank_config() -> Dict[str, Any]:
+    method = str(get_setting("RAG_RERANKER", "none")).lower()
+    min_score = get_setting("RAG_RERANK_MIN_SCORE", None)
+    return {
+        "method": method,
+        "overfetch": int(get_setting("RAG_RERANK_OVERFETCH", 3)),
+        "min_score": float(min_score) if min_score not in (None, "") else DEFAULT_MIN_SCORES.get(method, 0.0),
+        "token_budget": int(get_setting("RAG_CONTEXT_TOKEN_BUDGET", 1500)),
+        "model": get_setting("RAG_RERANK_MODEL", DEFAULT_CROSS_ENCODER),
+    }
+
+
+class Reranker:
+    """Rescores retrieval hits against the query."""
+
+    name = "base"
+
+    def score(self, query: str, hits: List[Dict[str, Any]]) -> List[float]:
+        raise NotImplementedError
+
+    def rerank(self, query: str, hits: List[Dict[str, Any]], top_k: int, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """Best `top_k` hits scoring at least `min_score`, each with a `rerank_score`."""
+        if not hits:
+            return []
+        scored = [
+            {**hit, "rerank_score": float(score)}
+            for hit, score in zip(hits, self.score(query, hits))
+        ]
+        scored.sort(key=lambda h: h["rerank_score"], reverse=True)
+        return [h for h in scored if h["rerank_score"] >= min_score][:top_k]
+
+
+class HeuristicReranker(Reranker):
+    """
+    Score fusion without a model: retrieval score relative to the best
+    candidate, blended with the share of query terms found in the summary.
+    """
+
+    name = "heuristic"
+
+    def __init__(self, retrieval_weight: float = 0.7):
+        self.retrieval_weight = retrieval_weight
+
+    def score(self, query, hits):
+        terms = {t for t in _TOKEN_RE.findall(query.lower()) if len(t) > 2}
+        best = max((h.get("score") or 0.0) for h in hits) or 1.0
+
+        scores = []
+        for hit in hits:
+            retrieval = max(hit.get("score") or 0.0, 0.0) / best
+            if terms:
+                words = set(_TOKEN_RE.findall((hit.get("summary") or "").lower()))
+                overlap = len(terms & words) / len(terms)
+            else:
+                overlap = 0.0
+            scores.append(self.retrieval_weight * retrieval + (1 - self.retrieval_weight) * overlap)
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers CrossEncoder on CPU, loaded on first use."""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu", max_length=512)
+        return self._model
+
+    def score(self, query, hits):
+        logits = self.model.predict(
+            [(query, hit.get("summary") or "") for hit in hits],
+            batch_size=32,
+            show_progress_bar=False,
+        )
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+
+_rerankers: Dict[str, Reranker] = {}
+
+
+def get_reranker(method: Optional[str] = None) -> Optional[Reranker]:
+    """Process-wide reranker for `method` (defaults to RAG_RERANKER), None when disabled."""
+    cfg = get_rerank_config()
+    method = (method or cfg["method"]).lower()
+    if method not in _rerankers:
+        if method == "cross_encoder":
+            _rerankers[method] = CrossEncoderReranker(cfg["model"])
+        elif method == "heuristic":
+            _rerankers[method] = HeuristicReranker()
+        else:
+            return None
+    return _rerankers[method]
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of `text` (tiktoken when installed, ~4 chars per token otherwise)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def fit_to_budget(pieces: List[str], max_tokens: int) -> List[str]:
+    """
+    Leading pieces whose combined size fits in `max_tokens`.
+    The first piece is always kept so a single long item still gets answered.
+    """
+    kept, used = [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(piece)
+        used += tokens
+    return kept
@@ -0,0 +1,325 @@
+"""
+Vector store backends behind `insert_items` / `query_items`.
+
+- MilvusStore: the remote Zilliz/Milvus collection (default)
+- LocalStore: in-process NumPy matrices, one per user, persisted to disk and
+  memory-mapped on read. Meant for development, CI and single-node deployments.
+
+Select with the RAG_BACKEND setting ("milvus" or "local").
+"""
+
+import json
+import logging
+import os
+import re
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+from .config import get_search_params as params_for_index, get_setting
+from .filters import MilvusFilter
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FIELDS = ["content_id", "summary", "platform", "timestamp", "chunk_index"]
+BM25_SEARCH_PARAMS = {"metric_type": "BM25", "params": {}}
+
+
+class VectorStore:
+    """Interface of a RAG storage backend."""
+
+    name = "base"
+    # Whether search_text (BM25 leg of hybrid retrieval) is available
+    supports_sparse = False
+
+    def insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Store rows with content_id, user_id, platform, summary, timestamp and embedding."""
+        raise NotImplementedError
+
+    def delete(self, filters: MilvusFilter) -> int:
+        """Remove every row matching `filters`, returning the number of rows deleted."""
+        raise NotImplementedError
+
+    def search(self, vector: List[float], filters: MilvusFilter, limit: int) -> List[Dict[str, Any]]:
+        """Top `limit` rows by cosine similarity among rows matching `filters`."""
+        raise NotImplementedError
+
+    def search_text(self, query: str, filters: MilvusFilter, limit: int) -> List[Dict[str, Any]]:
+        """Top `limit` rows by BM25 over summary among rows matching `filters`."""
+        raise NotImplementedError(f"{self.name} store has no lexical index")
+
+
+class MilvusStore(VectorStore):
+    """Remote Milvus / Zilliz Cloud collection."""
+
+    name = "milvus"
+
+    def __init__(self, collection):
+        self.collection = collection
+        field_names = {f.name for f in collection.schema.fields}
+        self.supports_sparse = "sparse" in field_names
+        # Collections created before chunking have no chunk_index field
+        self.output_fields = [name for name in OUTPUT_FIELDS if name in field_names]
+        self._search_params = None
+
+    @property
+    def search_params(self) -> Dict[str, Any]:
+        """Search params matching the index actually built on the collection."""
+        if self._search_params is None:
+            from .milvus_setup import get_index_type
+
+            self._search_params = params_for_index(get_index_type(self.collection))
+        return self._search_params
+
+    def _build_columns_for_insert(self, rows: List[Dict[str, Any]]) -> List[List[Any]]:
+        """
+        Build column-wise payload according to collection.schema order,
+        skipping auto id if present.
+        """
+        schema = self.collection.schema
+        schema_fields = [f.name for f in schema.fields]
+        # skip auto id field if collection.auto_id True (usually 'id')
+        if schema.auto_id:
+            schema_fields = schema_fields[1:]
+
+        # skip fields generated server-side by a function (e.g. BM25 'sparse')
+        function_outputs = {f.name for f in schema.fields if getattr(f, "is_function_output", False)}
+        schema_fields = [name for name in schema_fields if name not in function_outputs]
+
+        # map expected names -> provided values, one column per field
+        # Expect embedding field named 'embedding' (a list of floats per row)
+        return [[row[fname] for row in rows] for fname in schema_fields]
+
+    def insert(self, rows: List[Dict[str, Any]]) -> None:
+        self.collection.insert(self._build_columns_for_insert(rows))
+        self.collection.flush()
+
+    def delete(self, filters: MilvusFilter) -> int:
+        # Deletes take a literal expression; values are escaped by render()
+        result = self.collection.delete(expr=filters.render())
+        return getattr(result, "delete_count", 0)
+
+    def _filter_kwargs(self, filters: MilvusFilter) -> Dict[str, Any]:
+        if str(get_setting("RAG_FILTER_TEMPLATES", "true")).lower() in ("1", "true", "yes"):
+            expr, expr_params = filters.build()
+            return {"expr": expr, "expr_params": expr_params}
+        return {"expr": filters.render()}
+
+    def _search(self, data, anns_field, param, limit, filters) -> List[Dict[str, Any]]:
+        results = self.collection.search(
+            data=[data],
+            anns_field=anns_field,
+            param=param,
+            limit=limit,
+            output_fields=self.output_fields,
+            **self._filter_kwargs(filters),
+        )
+
+        hits = []
+        if results and len(results) > 0:
+            for hit in results[0]:
+                ent = hit.entity
+                hits.append(
+                    {
+                        "id": hit.id,
+                        "content_id": ent.get("content_id"),
+                        "summary": ent.get("summary"),
+                        "platform": ent.get("platform"),
+                        "timestamp": ent.get("timestamp"),
+                        "chunk_index": ent.get("chunk_index") or 0,
+                        "score": hit.score,
+                    }
+                )
+        return hits
+
+    def search(self, vector, filters, limit):
+        return self._search(vector, "embedding", self.search_params, limit, filters)
+
+    def search_text(self, query, filters, limit):
+        if not self.supports_sparse:
+            return super().search_text(query, filters, limit)
+        return self._search(query, "sparse", BM25_SEARCH_PARAMS, limit, filters)
+
+
+class LocalStore(VectorStore):
+    """
+    Per-user NumPy matrices on local disk.
+
+    Layout: <root>/<user>/vectors.npy (float32, L2-normalized, N x dim) and
+    <root>/<user>/items.json (row metadata in the same order). Writes replace
+    both files atomically; reads memory-map the matrix and are cached per
+    process until the files change.
+
+    Each read-modify-write of a user's files holds an exclusive flock on
+    <root>/<user>/.lock, so web workers and Celery workers sharing the same
+    directory do not lose each other's inserts or deletes (POSIX only; on
+    Windows the store is safe for a single process).
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        # user dir -> (mtime, vectors, items)
+        self._loaded: Dict[str, Any] = {}
+
+    def _user_dir(self, user_id: str) -> str:
+        user_id = str(user_id)
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", user_id):
+            user_id = hashlib.sha1(user_id.encode()).hexdigest()
+        return os.path.join(self.root, user_id)
+
+    @contextmanager
+    def _locked(self, user_dir: str):
+        """Exclusive lock on a user's files across threads and processes"""
+        os.makedirs(user_dir, exist_ok=True)
+        with self._lock, open(os.path.join(user_dir, ".lock"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _load(self, user_dir: str, fresh: bool = False):
+        """
+        (vectors, items) of a user. `fresh` skips the per-process cache: writers
+        re-read under the lock, since another process may have replaced the files
+        within the same mtime tick.
+        """
+        items_path = os.path.join(user_dir, "items.json")
+        if not os.path.exists(items_path):
+            return None, []
+
+        mtime = os.stat(items_path).st_mtime_ns
+        cached = self._loaded.get(user_dir)
+        if cached and cached[0] == mtime and not fresh:
+            return cached[1], cached[2]
+
+        with open(items_path, encoding="utf-8") as f:
+            items = json.load(f)
+        vectors = np.load(os.path.join(user_dir, "vectors.npy"), mmap_mode="r")
+        self._loaded[user_dir] = (mtime, vectors, items)
+        return vectors, items
+
+    def _write(self, user_dir: str, vectors: np.ndarray, items: List[Dict[str, Any]]) -> None:
+        os.makedirs(user_dir, exist_ok=True)
+        vectors_tmp = os.path.join(user_dir, "vectors.tmp.npy")
+        items_tmp = os.path.join(user_dir, "items.json.tmp")
+        np.save(vectors_tmp, vectors)
+        with open(items_tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False)
+        # vectors first: items.json mtime is what readers use to detect a new version
+        os.replace(vectors_tmp, os.path.join(user_dir, "vectors.npy"))
+        os.replace(items_tmp, os.path.join(user_dir, "items.json"))
+        self._loaded.pop(user_dir, None)
+
+    def insert(self, rows: List[Dict[str, Any]]) -> None:
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_user.setdefault(str(row["user_id"]), []).append(row)
+
+        for user_id, user_rows in by_user.items():
+            user_dir = self._user_dir(user_id)
+            with self._locked(user_dir):
+                vectors, items = self._load(user_dir, fresh=True)
+
+                new_vectors = np.asarray([r["embedding"] for r in user_rows], dtype=np.float32)
+                new_vectors /= np.linalg.norm(new_vectors, axis=1, keepdims=True) + 1e-12
+                next_id = max((item["id"] for item in items), default=0) + 1
+                new_items = [
+                    {
+                        "id": next_id + i,
+                        **{k: v for k, v in r.items() if k != "embedding"},
+                    }
+                    for i, r in enumerate(user_rows)
+                ]
+
+                if vectors is not None and len(items):
+                    new_vectors = np.vstack([np.asarray(vectors), new_vectors])
+                self._write(user_dir, new_vectors, items + new_items)
+
+    def _filter_user_dir(self, filters: MilvusFilter) -> str:
+        user_ids = [value for field, op, value in filters.clauses if field == "user_id" and op == "eq"]
+        if not user_ids:
+            raise ValueError("Local RAG store operations need a user_id filter")
+        return self._user_dir(user_ids[0])
+
+    def delete(self, filters):
+        user_dir = self._filter_user_dir(filters)
+        with self._locked(user_dir):
+            vectors, items = self._load(user_dir, fresh=True)
+            if vectors is None or not items:
+                return 0
+
+            keep = np.fromiter((not filters.matches(item) for item in items), dtype=bool, count=len(items))
+            deleted = int(len(items) - keep.sum())
+            if deleted:
+                self._write(user_dir, np.asarray(vectors)[keep], [item for item, k in zip(items, keep) if k])
+            return deleted
+
+    def search(self, vector, filters, limit):
+        vectors, items = self._load(self._filter_user_dir(filters))
+        if vectors is None or not items:
+            return []
+
+        mask = np.fromiter((filters.matches(item) for item in items), dtype=bool, count=len(items))
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        scores = vectors[candidates] @ query
+
+        k = min(limit, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        hits = []
+        for idx in top:
+            item = items[candidates[idx]]
+            hits.append(
+                {
+                    "id": item["id"],
+                    "content_id": item.get("content_id"),
+                    "summary": item.get("summary"),
+                    "platform": item.get("platform"),
+                    "timestamp": item.get("timestamp"),
+                    "chunk_index": item.get("chunk_index", 0),
+                    "score": float(scores[idx]),
+                }
+            )
+        return hits
+
+
+_store: Optional[VectorStore] = None
+
+
+def get_store() -> Optional[VectorStore]:
+    """Process-wide store for the configured RAG_BACKEND."""
+    global _store
+    if _store is None:
+        backend = str(get_setting("RAG_BACKEND", "milvus")).lower()
+        if backend == "local":
+            _store = LocalStore(get_setting("RAG_LOCAL_PATH", os.path.join("data", "rag")))
+        else:
+            try:
+                from .milvus_setup import collection
+
+                _store = MilvusStore(collection)
+            except Exception as e:
+                logger.exception("Failed to import milvus collection: %s", e)
+                _store = None
+    return _store
@@ -1,11 +1,19 @@
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Union
 import logging
 
+from .chunking import aggregate_passages, get_chunking_config, split_passages
+from .cache import get_cached_result, get_user_version, invalidate_user, set_cached_result
+from .config import DEFAULT_RETRIEVAL_MODE, get_hybrid_config, get_setting
+from .filters import user_items_filter
+from .stores import VectorStore, get_store
+
 logger = logging.getLogger(__name__)
 
 # Lazy load to avoid loading model on import
 _model = None
 _collection = None
+_executor = None
 
 
 def get_model():
@@ -34,30 +42,93 @@ def get_collection():
     return _collection
 
 
-def _build_columns_for_insert(data_map: Dict[str, Any]) -> List[List[Any]]:
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
+    return _executor
+
+
+def _passages_for(item: Dict[str, Any], chunking: Dict[str, Any]) -> List[str]:
+    if not chunking["enabled"]:
+        return [item["summary"]]
+    return split_passages(item["summary"], chunking["chunk_words"], chunking["overlap_words"]) or [item["summary"]]
+
+
+def insert_items(items: List[Dict[str, Any]], upsert: bool = True) -> Dict[str, Any]:
     """
-    Build column-wise payload according to collection.schema order,
-    skipping auto id if present.
+    Bulk insert items, embedding all summaries (or their passages) in one batch.
+
+    Each item needs content_id, user_id, platform, summary and optionally timestamp.
+    With RAG_CHUNKING enabled, long summaries are stored as overlapping passages
+    sharing the item's content_id, numbered by chunk_index.
+
+    Items are keyed by (user_id, content_id): with `upsert`, rows already stored
+    for the same key are replaced instead of duplicated.
     """
-    collection = get_collection()
-    if collection is None:
-        raise RuntimeError("Milvus collection is not available")
-
-    schema_fields = [f.name for f in collection.schema.fields]
-    # skip auto id field if collection.auto_id True (usually 'id')
-    if collection.schema.auto_id:
-        schema_fields = schema_fields[1:]
-
-    # map expected names -> provided values
-    # Expect embedding field named 'embedding'
-    columns = []
-    for fname in schema_fields:
-        if fname == "embedding":
-            # embedding should be a list of floats
-            columns.append([data_map["embedding"]])
-        else:
-            columns.append([data_map[fname]])
-    return columns
+    if not items:
+        return {"status": "success", "inserted": 0}
+
+    model = get_model()
+    store = get_store()
+    if store is None or model is None:
+        raise RuntimeError("Dependencies missing: model or vector store")
+
+    chunking = get_chunking_config()
+    rows = []
+    for item in items:
+        for chunk_index, passage in enumerate(_passages_for(item, chunking)):
+            rows.append(
+                {
+                    "content_id": item["content_id"],
+                    "user_id": item["user_id"],
+                    "platform": item["platform"],
+                    "summary": passage,
+                    "timestamp": item.get("timestamp"),
+                    "chunk_index": chunk_index,
+                }
+            )
+
+    embeddings = model.encode([row["summary"] for row in rows], batch_size=64).tolist()
+    for row, embedding in zip(rows, embeddings):
+        row["embedding"] = embedding
+
+    replaced = 0
+    if upsert:
+        # The primary key is auto-generated, so replace = delete by key, then insert
+        for user_id, content_ids in _content_ids_by_user(items).items():
+            replaced += store.delete(
+                user_items_filter(user_id).in_("content_id", content_ids)
+            )
+
+    store.insert(rows)
+
+    # New data for these users: drop their cached search results
+    for user_id in {item["user_id"] for item in items}:
+        invalidate_user(user_id)
+    return {"status": "success", "inserted": len(items), "passages": len(rows), "replaced": replaced}
+
+
+def delete_items(user_id: str, content_ids: List[str]) -> Dict[str, Any]:
+    """Remove every stored row (all passages) of the given items of one user."""
+    store = get_store()
+    if store is None:
+        raise RuntimeError("Dependencies missing: vector store")
+    if not content_ids:
+        return {"status": "success", "deleted": 0}
+
+    deleted = store.delete(user_items_filter(user_id).in_("content_id", [str(c) for c in content_ids]))
+    invalidate_user(user_id)
+    return {"status": "success", "deleted": deleted}
+
+
+def _content_ids_by_user(items: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    by_user: Dict[str, List[str]] = {}
+    for item in items:
+        content_ids = by_user.setdefault(str(item["user_id"]), [])
+        if item["content_id"] not in content_ids:
+            content_ids.append(item["content_id"])
+    return by_user
 
 
 def insert_item(
@@ -67,74 +138,103 @@ def insert_item(
     summary: str,
     timestamp: Optional[int] = None,
 ):
-    model = get_model()
-    collection = get_collection()
-    if collection is None or model is None:
-        raise RuntimeError("Dependencies missing: model or collection")
-
-    embedding = model.encode(summary).tolist()
-    values_map = {
-        "content_id": content_id,
-        "user_id": user_id,
-        "platform": platform,
-        "summary": summary,
-        "timestamp": timestamp,
-        "embedding": embedding,
-    }
-
-    # Only add timestamp if it exists in schema
-    # (kept for backwards compatibility if you re-add it later)
-    # if timestamp is not None:
-    #     values_map["timestamp"] = timestamp
-
-    columns = _build_columns_for_insert(values_map)
-    collection.insert(columns)
-    collection.flush()
+    insert_items(
+        [
+            {
+                "content_id": content_id,
+                "user_id": user_id,
+                "platform": platform,
+                "summary": summary,
+                "timestamp": timestamp,
+            }
+        ]
+    )
     return {"status": "success", "content_id": content_id}
 
 
+def reciprocal_rank_fusion(
+    legs: List[List[Dict[str, Any]]],
+    weights: List[float],
+    k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists with weighted reciprocal rank fusion.
+
+    Each hit must carry an `id`; a hit's fused score is
+    sum(weight / (k + rank)) over the legs it appears in (rank starts at 1).
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for hits, weight in zip(legs, weights):
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+            entry["score"] += weight / (k + rank)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)
+
+
 def query_items(
     user_id: str,
     query: str,
     top_k: int = 5,
     from_timestamp: Optional[int] = None,
-    platform: Optional[str] = None,
+    platform: Optional[Union[str, List[str]]] = None,
+    mode: Optional[str] = None,
 ) -> Dict[str, Any]:
-    model = get_model()
-    collection = get_collection()
-    if collection is None or model is None:
-        raise RuntimeError("Dependencies missing: model or collection")
-
-    query_vec = model.encode(query).tolist()
-    expr_parts = [f"user_id == '{user_id}'"]
-    if from_timestamp:
-        expr_parts.append(f"timestamp >= {from_timestamp}")
-    if platform:
-        expr_parts.append(f"platform == '{platform}'")
-    expr = " && ".join(expr_parts)
-
-    search_params = {"metric_type": "COSINE", "params": {"ef": 64}}
-    results = collection.search(
-        data=[query_vec],
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k,
-        expr=expr,
-        output_fields=["content_id", "summary", "platform"],
-    )
-
-    hits = []
-    if results and len(results) > 0:
-        for hit in results[0]:
-            ent = hit.entity
-            hits.append(
-                {
-                    "content_id": ent.get("content_id"),
-                    "summary": ent.get("summary"),
-                    "platform": ent.get("platform"),
-                    "timestamp": ent.get("timestamp"),
-                    "score": hit.score,
-                }
-            )
+    """
+    Semantic search over a user's items.
 
-    return {"query": query, "filter": expr, "results": hits}
+    platform: one platform or a list of platforms (matched with `in`).
+    mode: "dense" (vector only) or "hybrid" (BM25 over summary + vector, merged with
+    reciprocal rank fusion). Defaults to the RAG_RETRIEVAL_MODE setting.
+    """
+    model = get_model()
+    store = get_store()
+    if store is None or model is None:
+        raise RuntimeError("Dependencies missing: model or vector store")
+
+    filters = user_items_filter(user_id, from_timestamp=from_timestamp, platform=platform)
+    expr = filters.render()
+
+    mode = (mode or get_setting("RAG_RETRIEVAL_MODE", DEFAULT_RETRIEVAL_MODE)).lower()
+    if mode == "hybrid" and not store.supports_sparse:
+        logger.warning(f"Hybrid retrieval requested but the {store.name} store has no BM25 index, using dense")
+        mode = "dense"
+
+    # Repeated (user, query, filter) searches skip both the embedding and the store
+    version = get_user_version(user_id)
+    cached = get_cached_result(user_id, version, query, expr, top_k=top_k, mode=mode)
+    if cached is not None:
+        return cached
+
+    result = _query_store(store, model, query, filters, top_k, mode)
+    set_cached_result(user_id, version, query, expr, result, top_k=top_k, mode=mode)
+    return result
+
+
+def _query_store(store: VectorStore, model, query, filters, top_k, mode) -> Dict[str, Any]:
+    chunking = get_chunking_config()
+    # Passages of one item compete for the same slots, so over-fetch before aggregating
+    fetch_k = top_k * chunking["overfetch"] if chunking["enabled"] else top_k
+
+    if mode != "hybrid":
+        query_vec = model.encode(query).tolist()
+        hits = store.search(query_vec, filters, fetch_k)
+    else:
+        cfg = get_hybrid_config()
+        # The BM25 leg needs no embedding, so it runs while the query is being encoded
+        sparse_future = _get_executor().submit(
+            store.search_text, query, filters, max(cfg["sparse_k"], fetch_k)
+        )
+        query_vec = model.encode(query).tolist()
+        dense_hits = store.search(query_vec, filters, max(cfg["dense_k"], fetch_k))
+        sparse_hits = sparse_future.result()
+
+        hits = reciprocal_rank_fusion(
+            [dense_hits, sparse_hits],
+            [cfg["dense_weight"], cfg["sparse_weight"]],
+            k=cfg["rrf_k"],
+        )[:fetch_k]
+
+    if chunking["enabled"]:
+        hits = aggregate_passages(hits, top_k, chunking["aggregation"])
+
+    return {"query": query, "filter": filters.render(), "mode": mode, "results": hits}
@@ -2,15 +2,28 @@
 Test the chatbot API endpoints to ensure they work correctly.
 """
 
+import asyncio
 import json
 import logging
-from django.test import TestCase, Client
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from apps.agents.chatbot import answer_cache
+from apps.agents.chatbot import chatbot as chatbot_module
+from apps.agents.rag import cache as rag_cache
+from apps.agents.chatbot.messages import Keywords
+from apps.agents.chatbot.context import build_context, current_turn_has_tool_results, messages_to_fold, split_turns
+from apps.agents.chatbot.router import CHAT, RETRIEVE, IntentRouter
 from .models import ChatSession, ChatMessage
 
 
@@ -240,3 +253,184 @@ class ChatbotAPITestCase(APITestCase):
                 response = self.client.get(endpoint)
             
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ConversationContextTestCase(SimpleTestCase):
+    """Test the chatbot context window helpers"""
+    
+    def _conversation(self, turns):
+        messages = []
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"question {i}", id=f"h{i}"))
+            messages.append(AIMessage(content=f"answer {i}", id=f"a{i}"))
+        return messages
+    
+    @staticmethod
+    def _count_words(messages):
+        return sum(len(str(m.content).split()) for m in messages)
+    
+    def test_turns_keep_tool_calls_with_their_results(self):
+        messages = [
+            HumanMessage(content="what did I save about cooking?"),
+            AIMessage(content="", tool_calls=[{"name": "retrieve_and_answer", "args": {}, "id": "call_1"}]),
+            ToolMessage(content="pasta video", tool_call_id="call_1"),
+            AIMessage(content="You saved a pasta video."),
+            HumanMessage(content="thanks"),
+        ]
+        
+        turns = split_turns(messages)
+        
+        self.assertEqual([len(t) for t in turns], [4, 1])
+    
+    def test_previous_turn_tool_results_are_not_current(self):
+        messages = [
+            HumanMessage(content="what did I save about cooking?"),
+            AIMessage(content="", tool_calls=[{"name": "retrieve_and_answer", "args": {}, "id": "call_1"}]),
+            ToolMessage(content="pasta video", tool_call_id="call_1"),
+            AIMessage(content="You saved a pasta video."),
+            HumanMessage(content="thanks!"),
+        ]
+        
+        self.assertFalse(current_turn_has_tool_results(messages))
+        self.assertTrue(current_turn_has_tool_results(messages[:3]))
+    
+    def test_fold_only_after_threshold(self):
+        self.assertEqual(messages_to_fold(self._conversation(5), keep_turns=2, summarize_after_turns=5), [])
+        
+        folded = messages_to_fold(self._conversation(6), keep_turns=2, summarize_after_turns=5)
+        
+        self.assertEqual([m.id for m in folded], ["h0", "a0", "h1", "a1", "h2", "a2", "h3", "a3"])
+    
+    def test_build_context_respects_budget_and_starts_on_human(self):
+        messages = self._conversation(10)
+        
+        context = build_context("system", "earlier summary", messages, self._count_words, max_tokens=12)
+        
+        self.assertEqual(context[0].type, "system")
+        self.assertIn("earlier summary", context[0].content)
+        self.assertEqual(context[1].type, "human")
+        self.assertEqual(context[-1].content, "answer 9")
+        self.assertLessEqual(self._count_words(context), 12)
+
+
+class IntentRouterTestCase(SimpleTestCase):
+    """Test the keyword rules of the intent router"""
+    
+    def setUp(self):
+        self.router = IntentRouter(min_similarity=0.5, min_margin=0.05)
+    
+    def test_library_questions_go_to_retrieval(self):
+        self.assertEqual(self.router.route_by_keywords("what did i watch in my saved videos?"), RETRIEVE)
+        self.assertEqual(self.router.route_by_keywords("tóm tắt video của tôi"), RETRIEVE)
+        self.assertEqual(self.router.route_by_keywords("anything about cats on tiktok"), RETRIEVE)
+    
+    def test_short_chit_chat_goes_to_chat(self):
+        self.assertEqual(self.router.route_by_keywords("hello!"), CHAT)
+        self.assertEqual(self.router.route_by_keywords("cảm ơn bạn"), CHAT)
+    
+    def test_keywords_match_whole_words_only(self):
+        # "hi" inside "this" / "ok" inside "book" must not decide the route
+        self.assertIsNone(self.router.route_by_keywords("this book is about history"))
+
+
+class PlatformKeywordsTestCase(SimpleTestCase):
+    """Test platform detection used for the Milvus platform filter"""
+
+    def test_platform_names_are_detected(self):
+        self.assertEqual(Keywords.filter_platform("cat videos on TikTok"), ["tiktok"])
+        self.assertEqual(Keywords.filter_platform("bsky or tt posts about food"), ["bluesky", "tiktok"])
+        self.assertEqual(Keywords.filter_platform("what did people on Bluesky say?"), ["bluesky"])
+
+    def test_platforms_that_are_not_ingested_are_not_filtered(self):
+        self.assertEqual(Keywords.filter_platform("posts about Meta and Facebook"), [])
+
+    def test_substrings_do_not_restrict_the_platform(self):
+        self.assertEqual(Keywords.filter_platform("a pretty little video that got attention"), [])
+        self.assertEqual(Keywords.filter_platform("show the metadata of my posts"), [])
+
+
+class CheckpointerSetupTestCase(SimpleTestCase):
+    """Test checkpointer pool sizing and the failure cooldown"""
+
+    def setUp(self):
+        chatbot_module._checkpointer_failed_at.clear()
+        self.addCleanup(chatbot_module._checkpointer_failed_at.clear)
+
+    @override_settings(CHATBOT_CHECKPOINT_POOL_SIZE=2)
+    def test_small_pool_keeps_min_size_within_max(self):
+        self.assertEqual(chatbot_module._pool_kwargs(), {"min_size": 2, "max_size": 2})
+
+    @override_settings(CHATBOT_CHECKPOINT_RETRY_SECONDS=60)
+    def test_failure_is_cached_for_the_cooldown(self):
+        with mock.patch.object(chatbot_module, "_checkpointer", None), \
+                mock.patch.object(chatbot_module, "_get_db_url", return_value="postgresql://x"), \
+                mock.patch.object(chatbot_module, "ConnectionPool", side_effect=OSError("db down")) as pool:
+            first = chatbot_module.get_checkpointer()
+            second = chatbot_module.get_checkpointer()
+
+        self.assertIsInstance(first, chatbot_module.MemorySaver)
+        self.assertIsInstance(second, chatbot_module.MemorySaver)
+        pool.assert_called_once()
+    
+    def test_async_checkpointer_is_cached_per_event_loop(self):
+        async def twice():
+            return await chatbot_module.aget_checkpointer(), await chatbot_module.aget_checkpointer()
+        
+        saver = mock.MagicMock(setup=mock.AsyncMock())
+        with mock.patch.object(chatbot_module, "_async_checkpointers", {}), \
+                mock.patch.object(chatbot_module, "_async_checkpointer_locks", {}), \
+                mock.patch.object(chatbot_module, "_get_db_url", return_value="postgresql://x"), \
+                mock.patch.object(chatbot_module, "AsyncConnectionPool",
+                                  side_effect=lambda **kw: mock.MagicMock(open=mock.AsyncMock())) as pool, \
+                mock.patch.object(chatbot_module, "AsyncPostgresSaver", side_effect=lambda p: saver):
+            first, again = asyncio.run(twice())
+            asyncio.run(twice())
+            cached_loops = len(chatbot_module._async_checkpointers)
+        
+        self.assertIs(first, again)
+        # A new loop (e.g. async_to_sync under WSGI) never reuses a pool bound to a closed loop
+        self.assertEqual(pool.call_count, 2)
+        self.assertEqual(cached_loops, 1)
+
+
+def _fake_embedding(question):
+    """Unit vectors: questions about cooking point one way, everything else another"""
+    return np.array([1.0, 0.0] if "cook" in question.lower() else [0.0, 1.0], dtype=np.float32)
+
+
+@override_settings(CHATBOT_ANSWER_CACHE_TTL=60, CHATBOT_ANSWER_CACHE_THRESHOLD=0.9)
+@mock.patch.object(answer_cache, "embed_question", side_effect=_fake_embedding)
+class AnswerCacheTestCase(SimpleTestCase):
+    """Test the per-user semantic answer cache"""
+    
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(answer_cache, "versioned_cache_enabled", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_similar_question_hits(self, _embed):
+        _, version = answer_cache.lookup("7", "what did I save about cooking?")
+        answer_cache.store("7", version, "what did I save about cooking?", "Two pasta recipes.")
+        
+        hit, _ = answer_cache.lookup("7", "show me my saved cooking videos")
+        miss, _ = answer_cache.lookup("7", "what did I save about travel?")
+        
+        self.assertEqual(hit["answer"], "Two pasta recipes.")
+        self.assertIsNone(miss)
+    
+    def test_rag_insert_invalidates_answers(self, _embed):
+        _, version = answer_cache.lookup("7", "what did I save about cooking?")
+        answer_cache.store("7", version, "what did I save about cooking?", "Two pasta recipes.")
+        
+        rag_cache.invalidate_user("7")
+        
+        self.assertIsNone(answer_cache.lookup("7", "what did I save about cooking?")[0])
+    
+    def test_answers_are_per_user_and_skip_short_follow_ups(self, _embed):
+        _, version = answer_cache.lookup("7", "what did I save about cooking?")
+        answer_cache.store("7", version, "what did I save about cooking?", "Two pasta recipes.")
+        answer_cache.store("7", version, "more cooking?", "Short follow-up.")
+        
+        self.assertIsNone(answer_cache.lookup("8", "what did I save about cooking?")[0])
+        self.assertIsNone(answer_cache.lookup("7", "more cooking?")[0])
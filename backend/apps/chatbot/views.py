@@ -2,19 +2,30 @@
 API views for the chatbot application.
 """
 
+import asyncio
+import json
 import logging
 import uuid
 from datetime import datetime
 from typing import Dict, Any
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.openapi import OpenApiTypes
@@ -33,169 +44,292 @@ from .serializers import (
     RenameSessionSerializer,
     RenameSessionResponseSerializer
 )
-from ..agents.chatbot.chatbot import Chatbot, ChatRequest
+from ..agents.chatbot.chatbot import ChatRequest, get_chatbot
 # from ..agents.kg_constructor.neo4j_client import Neo4jClient
 
 logger = logging.getLogger(__name__)
 
 
-@extend_schema(
-    tags=['Chatbot'],
-    summary='Send a message to the chatbot',
-    description='''
-    Send a message to the chatbot and receive an AI response. 
-    If session_id is not provided, a new session will be created.
-    The chatbot uses RAG (Retrieval-Augmented Generation) tools when appropriate.
-    ''',
-    request=SendMessageSerializer,
-    responses={
-        200: SendMessageResponseSerializer,
-        400: ErrorResponseSerializer,
-        401: ErrorResponseSerializer,
-        500: ErrorResponseSerializer
-    },
-    parameters=[
-        OpenApiParameter(
-            name='session_id',
-            type=OpenApiTypes.STR,
-            location=OpenApiParameter.QUERY,
-            description='Optional session ID to continue an existing conversation'
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _authenticate_jwt(request):
+    """Resolve the user from the Bearer token (async views are not DRF views)"""
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _parse_body(request) -> Dict[str, Any]:
+    """JSON body, or form fields for form-encoded / multipart requests"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+def _save_exchange(chat_session, user_message, received_at, chat_response, source='api'):
+    """Persist the user message and the final AI message of an exchange"""
+    data = chat_response.data or {}
+    with transaction.atomic():
+        user_msg = ChatMessage.objects.create(
+            session=chat_session,
+            message_type='human',
+            content=user_message,
+            timestamp=received_at,
+            metadata={'source': source}
         )
-    ]
-)
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def send_message(request):
+        ai_msg = ChatMessage.objects.create(
+            session=chat_session,
+            message_type='ai',
+            content=chat_response.message,
+            used_rag_tool=data.get('used_rag_tool', False),
+            tool_calls_made=data.get('tool_calls_made', False),
+            confidence=chat_response.confidence,
+            task_type=chat_response.task,
+            metadata=data
+        )
+        # Update session timestamp
+        chat_session.save()
+    return user_msg, ai_msg
+
+
+def _has_long_lived_loop(request) -> bool:
     """
-    Send a message to the chatbot and get an AI response.
+    True when the request is served by the ASGI app. Under WSGI (runserver,
+    the test client) Django runs async views in a new event loop per request,
+    and the async checkpointer's pool would not outlive it.
     """
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def _run_chat(chatbot, chat_request, request):
+    """One chat turn: async graph on a long-lived loop, the sync graph in a thread otherwise"""
+    if _has_long_lived_loop(request):
+        return await chatbot.aprocess_message(chat_request)
+    return await sync_to_async(chatbot.process_message)(chat_request)
+
+
+async def _buffered_events(chatbot, chat_request):
+    """Fallback for `stream_message` under WSGI: the whole answer as one token event"""
+    chat_response = await sync_to_async(chatbot.process_message)(chat_request)
+    if chat_response.success:
+        yield {'event': 'token', 'content': chat_response.message}
+    yield {'event': 'final', 'response': chat_response}
+
+
+async def _start_exchange(user, payload):
+    """
+    Validate the body and get or create the chat session of an authenticated user.
+    Returns ((error, status), None) or (None, (user_message, chat_session, chat_request, chatbot)).
+    """
+    serializer = SendMessageSerializer(data=payload)
+    if not serializer.is_valid():
+        return ({'error': 'Invalid input', 'details': serializer.errors}, 400), None
+    
+    user_message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id')
+    
+    # Create or get session
+    if session_id:
+        try:
+            chat_session = await ChatSession.objects.aget(session_id=session_id, user=user)
+        except ChatSession.DoesNotExist:
+            return ({'error': f'Session {session_id} not found for this user'}, 404), None
+    else:
+        session_id = f"session_{user.id}_{uuid.uuid4().hex[:8]}"
+        chat_session = await ChatSession.objects.acreate(
+            session_id=session_id,
+            user=user,
+            title=user_message[:50] + "..." if len(user_message) > 50 else user_message
+        )
+    
+    # Shared chatbot (compiled graph + pooled checkpointer, built once per process)
     try:
-        # Validate input
-        serializer = SendMessageSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(
-                {'error': 'Invalid input', 'details': serializer.errors},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        user_message = serializer.validated_data['message']
-        session_id = serializer.validated_data.get('session_id')
+        chatbot = await sync_to_async(get_chatbot)()
+    except Exception as e:
+        logger.error(f"Failed to initialize chatbot: {e}")
+        return ({'error': 'Chatbot service unavailable'}, 503), None
+    
+    chat_request = ChatRequest(
+        user_message=user_message,
+        user_id=str(user.id),
+        session_id=session_id
+    )
+    return None, (user_message, chat_session, chat_request, chatbot)
+
+
+def _response_payload(chat_response, session_id, user_msg, ai_msg) -> Dict[str, Any]:
+    return {
+        'success': chat_response.success,
+        'message': chat_response.message,
+        'session_id': session_id,
+        'data': chat_response.data,
+        'task': chat_response.task,
+        'confidence': chat_response.confidence,
+        'timestamp': chat_response.timestamp,
+        'user_message_id': str(user_msg.id),
+        'ai_message_id': str(ai_msg.id)
+    }
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers may be coroutines (DRF's own dispatch is sync-only).
+    Authentication, permissions and throttling run in a thread; the handler is
+    awaited, so the view stays documented by drf-spectacular like other DRF views.
+    """
+    
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
         
-        # Create or get session
-        if session_id:
-            try:
-                chat_session = ChatSession.objects.get(
-                    session_id=session_id, 
-                    user=request.user
-                )
-            except ChatSession.DoesNotExist:
-                return Response(
-                    {'error': f'Session {session_id} not found for this user'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-        else:
-            # Create new session
-            session_id = f"session_{request.user.id}_{uuid.uuid4().hex[:8]}"
-            chat_session = ChatSession.objects.create(
-                session_id=session_id,
-                user=request.user,
-                title=user_message[:50] + "..." if len(user_message) > 50 else user_message
-            )
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
         
-        # Initialize chatbot
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class SendMessageView(AsyncAPIView):
+    """
+    Send a message to the chatbot and get an AI response.
+    
+    Async view: under ASGI, while the LLM is working the request only holds a
+    coroutine, so one worker can serve many concurrent chats.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @extend_schema(
+        tags=['Chatbot'],
+        summary='Send a message to the chatbot',
+        description='''
+        Send a message to the chatbot and receive an AI response. 
+        If session_id is not provided, a new session will be created.
+        The chatbot uses RAG (Retrieval-Augmented Generation) tools when appropriate.
+        ''',
+        request=SendMessageSerializer,
+        responses={
+            200: SendMessageResponseSerializer,
+            400: ErrorResponseSerializer,
+            401: ErrorResponseSerializer,
+            404: ErrorResponseSerializer,
+            500: ErrorResponseSerializer,
+            503: ErrorResponseSerializer
+        }
+    )
+    async def post(self, request):
         try:
-            # neo4j_client = Neo4jClient()
-            chatbot = Chatbot(
-                # neo4j_client=neo4j_client,
-                user=request.user
+            error, exchange = await _start_exchange(request.user, request.data)
+            if error is not None:
+                return Response(error[0], status=error[1])
+            user_message, chat_session, chat_request, chatbot = exchange
+            received_at = timezone.now()
+            
+            # Get chatbot response
+            chat_response = await _run_chat(chatbot, chat_request, request)
+            
+            # Save user message and AI response (or error message)
+            user_msg, ai_msg = await sync_to_async(_save_exchange)(
+                chat_session, user_message, received_at, chat_response
             )
+            response_data = _response_payload(chat_response, chat_request.session_id, user_msg, ai_msg)
+            
+            if not chat_response.success:
+                return Response(response_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            logger.info(f"Successfully processed message for user {request.user.id} in session {chat_request.session_id}")
+            return Response(response_data, status=status.HTTP_200_OK)
+            
         except Exception as e:
-            logger.error(f"Failed to initialize chatbot: {e}")
+            logger.error(f"Error in send_message: {e}")
             return Response(
-                {'error': 'Chatbot service unavailable'},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+                {'error': 'Internal server error', 'details': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+send_message = SendMessageView.as_view()
+
+
+@csrf_exempt
+@require_POST
+async def stream_message(request):
+    """
+    Send a message to the chatbot and stream the answer as Server-Sent Events.
+    
+    Same body and auth as send-message.
+    Events, in order:
+    - session: {"session_id"}
+    - tool_start / tool_end: {"name", "query"?} when the RAG tool runs
+    - token: {"content"} for each answer token
+    - done: the same payload as send-message, once ChatMessage rows are saved
+    
+    Tokens are flushed as they are produced under the ASGI app (reelsai.asgi);
+    under WSGI the answer arrives as a single token event.
+    """
+    user = await sync_to_async(_authenticate_jwt)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+    
+    try:
+        payload = _parse_body(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    error, exchange = await _start_exchange(user, payload)
+    if error is not None:
+        return JsonResponse(error[0], status=error[1])
+    user_message, chat_session, chat_request, chatbot = exchange
+    session_id = chat_request.session_id
+    received_at = timezone.now()
+    
+    async def event_stream():
+        yield _sse('session', {'session_id': session_id})
         
-        # Create chat request
-        chat_request = ChatRequest(
-            user_message=user_message,
-            user_id=str(request.user.id),
-            session_id=session_id
-        )
+        if _has_long_lived_loop(request):
+            events = chatbot.astream_message(chat_request)
+        else:
+            events = _buffered_events(chatbot, chat_request)
         
-        # Process message with chatbot
-        with transaction.atomic():
-            # Save user message
-            user_msg = ChatMessage.objects.create(
-                session=chat_session,
-                message_type='human',
-                content=user_message,
-                metadata={'source': 'api'}
-            )
-            
-            # Get chatbot response
-            chat_response = chatbot.process_message(chat_request)
+        async for event in events:
+            if event['event'] != 'final':
+                yield _sse(event['event'], {k: v for k, v in event.items() if k != 'event'})
+                continue
             
-            if not chat_response.success:
-                # Save error message
-                ai_msg = ChatMessage.objects.create(
-                    session=chat_session,
-                    message_type='ai',
-                    content=chat_response.message,
-                    confidence=chat_response.confidence,
-                    task_type=chat_response.task,
-                    metadata=chat_response.data or {}
-                )
-                
-                return Response(
-                    {
-                        'success': False,
-                        'message': chat_response.message,
-                        'session_id': session_id,
-                        'user_message_id': user_msg.id,
-                        'ai_message_id': ai_msg.id,
-                        'timestamp': chat_response.timestamp
-                    },
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            chat_response = event['response']
+            try:
+                user_msg, ai_msg = await sync_to_async(_save_exchange)(
+                    chat_session, user_message, received_at, chat_response, source='api_stream'
                 )
+            except Exception as e:
+                logger.error(f"Failed to save streamed messages for session {session_id}: {e}")
+                yield _sse('error', {'error': 'Failed to save messages', 'details': str(e)})
+                return
             
-            # Save successful AI response
-            ai_msg = ChatMessage.objects.create(
-                session=chat_session,
-                message_type='ai',
-                content=chat_response.message,
-                used_rag_tool=chat_response.data.get('used_rag_tool', False) if chat_response.data else False,
-                tool_calls_made=chat_response.data.get('tool_calls_made', False) if chat_response.data else False,
-                confidence=chat_response.confidence,
-                task_type=chat_response.task,
-                metadata=chat_response.data or {}
-            )
-            
-            # Update session timestamp
-            chat_session.save()
-        
-        # Prepare response
-        response_data = {
-            'success': chat_response.success,
-            'message': chat_response.message,
-            'session_id': session_id,
-            'data': chat_response.data,
-            'task': chat_response.task,
-            'confidence': chat_response.confidence,
-            'timestamp': chat_response.timestamp,
-            'user_message_id': user_msg.id,
-            'ai_message_id': ai_msg.id
-        }
-        
-        logger.info(f"Successfully processed message for user {request.user.id} in session {session_id}")
-        return Response(response_data, status=status.HTTP_200_OK)
-        
-    except Exception as e:
-        logger.error(f"Error in send_message: {e}")
-        return Response(
-            {'error': 'Internal server error', 'details': str(e)},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+            yield _sse('done', _response_payload(chat_response, session_id, user_msg, ai_msg))
+            logger.info(f"Successfully streamed message for user {user.id} in session {session_id}")
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering (nginx / Render) so events reach the client immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @extend_schema(
@@ -0,0 +1,99 @@
+"""
+Management command to benchmark the vectorized BonsaiRanker.
+
+Synthetic candidate pools of increasing size are ranked in two ways:
+from columnar arrays (`score_columns`, what `materialize_ranking` does)
+and from post dicts (`rank_posts`, which also converts them to columns).
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.feed.utils.ranker import BonsaiRanker
+
+
+class Command(BaseCommand):
+    """Benchmark BonsaiRanker on 10k-1M candidates"""
+
+    help = "Benchmark the vectorized BonsaiRanker on large synthetic candidate pools"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help='Candidate pool sizes (default: 10000 100000 1000000)'
+        )
+        parser.add_argument(
+            '--style',
+            type=str,
+            default='balanced',
+            help='Ranking style preset (default: balanced)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per size, the best one is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark"""
+        ranker = BonsaiRanker()
+        rng = np.random.default_rng(7)
+
+        self.stdout.write(f"⚖️ style={options['style']}, best of {options['repeat']}")
+        self.stdout.write(f"{'candidates':>12}{'columns ms':>14}{'to_columns ms':>16}{'rank_posts ms':>16}")
+        self.stdout.write("-" * 58)
+
+        for size in options['sizes']:
+            columns, metrics = self._synthetic_columns(rng, size)
+            column_ms = self._best(
+                lambda: ranker.score_columns(columns, style=options['style']), options['repeat']
+            )
+
+            posts = self._synthetic_posts(columns, metrics)
+            to_columns_ms = self._best(lambda: ranker.to_columns(posts), options['repeat'])
+            # rank_posts annotates the dicts in place; one run is enough at this size
+            rank_posts_ms = self._best(lambda: ranker.rank_posts(posts, style=options['style']), 1)
+
+            self.stdout.write(f"{size:>12}{column_ms:>14.1f}{to_columns_ms:>16.1f}{rank_posts_ms:>16.1f}")
+
+    def _best(self, func, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    def _synthetic_columns(self, rng, size):
+        now_us = int(time.time() * 1_000_000)
+        likes = rng.zipf(2.0, size).clip(max=100_000) - 1
+        reposts = rng.binomial(likes, 0.1)
+        replies = rng.binomial(likes, 0.05)
+        return {
+            # Curator scores are small integers, so there are many ties
+            "relevance": rng.integers(0, 11, size).astype(np.float64),
+            "recency": now_us - rng.integers(0, 30 * 86_400, size) * 1_000_000,
+            "popularity": BonsaiRanker.engagement(likes, reposts, replies),
+        }, (likes, reposts, replies)
+
+    def _synthetic_posts(self, columns, metrics):
+        likes, reposts, replies = metrics
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        return [
+            {
+                "uri": f"bench_{i}",
+                "curator_score": float(columns["relevance"][i]),
+                "created_at": (epoch + timedelta(microseconds=int(columns["recency"][i]))).isoformat(),
+                "like_count": int(likes[i]),
+                "repost_count": int(reposts[i]),
+                "reply_count": int(replies[i]),
+            }
+            for i in range(len(columns["relevance"]))
+        ]
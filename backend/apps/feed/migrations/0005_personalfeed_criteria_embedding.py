@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0004_socialpost_embed_quote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalfeed',
+            name='criteria_embedding',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
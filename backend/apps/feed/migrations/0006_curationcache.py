@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0005_personalfeed_criteria_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurationCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('criteria_hash', models.CharField(max_length=64)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('score', models.FloatField()),
+                ('reasoning', models.TextField()),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'criteria_hash', 'prompt_version'), name='unique_curation_cache_key')],
+            },
+        ),
+    ]
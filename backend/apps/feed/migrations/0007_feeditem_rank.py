@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0006_curationcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feeditem',
+            name='rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['feed', 'rank'], name='feed_item_feed_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0007_feeditem_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socialpost',
+            name='engagement_velocity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='socialpost',
+            name='metrics_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0008_socialpost_engagement_velocity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalfeed',
+            name='query_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
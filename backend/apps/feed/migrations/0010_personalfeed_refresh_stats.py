@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0009_personalfeed_query_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalfeed',
+            name='last_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='personalfeed',
+            name='last_refresh_yield',
+            field=models.FloatField(default=0, help_text='Số bài mới trung bình mỗi lần refresh (trung bình trượt)'),
+        ),
+    ]
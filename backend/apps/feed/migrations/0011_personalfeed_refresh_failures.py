@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0010_personalfeed_refresh_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalfeed',
+            name='refresh_failures',
+            field=models.PositiveIntegerField(default=0, help_text='Số lần refresh lỗi liên tiếp (giãn lịch refresh)'),
+        ),
+    ]
@@ -22,6 +22,10 @@ class PersonalFeed(models.Model):
     search_queries = models.JSONField(default=list)
     include_criteria = models.TextField(blank=True, default="")
     exclude_criteria = models.TextField(blank=True, default="")
+    # Vector embedding của include / exclude criteria (cache cho EmbeddingPrefilter)
+    criteria_embedding = models.JSONField(null=True, blank=True)
+    # Mốc refresh tăng dần theo từng query: {query: {"high_water": ..., "boundary_uris": [...]}}
+    query_state = models.JSONField(default=dict, blank=True)
 
     platform = models.CharField(
         max_length=20, choices=PLATFORM_CHOICES, default="bluesky"
@@ -32,6 +36,15 @@ class PersonalFeed(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Số liệu cho scheduler refresh định kỳ (schedule_feed_refreshes)
+    last_refreshed_at = models.DateTimeField(null=True, blank=True)
+    last_refresh_yield = models.FloatField(
+        default=0, help_text="Số bài mới trung bình mỗi lần refresh (trung bình trượt)"
+    )
+    refresh_failures = models.PositiveIntegerField(
+        default=0, help_text="Số lần refresh lỗi liên tiếp (giãn lịch refresh)"
+    )
+
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
@@ -63,6 +76,10 @@ class SocialPost(models.Model):
     created_at_source = models.DateTimeField(null=True, blank=True)
     fetched_at = models.DateTimeField(auto_now_add=True)
 
+    # Tốc độ tương tác (engagement / giờ) giữa hai lần refresh gần nhất, và thời điểm lấy metrics
+    engagement_velocity = models.FloatField(default=0)
+    metrics_updated_at = models.DateTimeField(null=True, blank=True)
+
 
 class FeedItem(models.Model):
     """Kết quả đã được AI Curate"""
@@ -76,8 +93,39 @@ class FeedItem(models.Model):
     ai_reasoning = models.TextField()
     ai_summary = models.TextField(null=True, blank=True)  # Tóm tắt video
 
+    # Thứ hạng BonsaiRanker trong feed (1 = đầu tiên), tính lại sau mỗi lần refresh
+    rank = models.PositiveIntegerField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("feed", "post")  # 1 bài chỉ xuất hiện 1 lần trong 1 feed
         ordering = ["-ai_score"]
+        indexes = [models.Index(fields=["feed", "rank"], name="feed_item_feed_rank_idx")]
+
+
+class CurationCache(models.Model):
+    """
+    Kết quả chấm điểm của Curator, dùng chung giữa các feed có cùng tiêu chí.
+    Khóa: (hash nội dung bài, hash tiêu chí đã chuẩn hóa, phiên bản prompt Curator).
+    """
+
+    content_hash = models.CharField(max_length=64)
+    criteria_hash = models.CharField(max_length=64)
+    prompt_version = models.CharField(max_length=20)
+
+    score = models.FloatField()
+    reasoning = models.TextField()
+    summary = models.TextField(null=True, blank=True)
+
+    hits = models.PositiveIntegerField(default=0)  # Số lần được dùng lại
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "criteria_hash", "prompt_version"],
+                name="unique_curation_cache_key",
+            )
+        ]
+
@@ -46,6 +46,7 @@ class FeedItemSerializer(serializers.ModelSerializer):
             "ai_score",
             "ai_reasoning",
             "ai_summary",
+            "rank",
             "created_at",
         ]
 
@@ -1,28 +1,101 @@
 # feeds/tasks.py
 from celery import shared_task
-from .models import PersonalFeed, SocialPost, FeedItem
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import PersonalFeed, FeedItem
 
 # Import các class utils của bạn (đảm bảo bạn đã copy file vào folder feeds/utils/)
 from .utils.planner import BonsaiPlanner
-from .utils.sourcer import BonsaiSourcer
+from .utils.sourcer import METRICS_REFRESH_MAX_POSTS, BonsaiSourcer
 from .utils.curator import BonsaiCurator
+from .utils.curation_cache import CurationCacheStore
+from .utils.persistence import (
+    existing_feed_post_ids,
+    materialize_ranking,
+    posts_needing_metrics,
+    save_feed_items,
+    update_post_metrics,
+    upsert_posts,
+)
+from .utils.prefilter import CURATE, DROP, KEEP, EmbeddingPrefilter
+from .utils.scheduling import (
+    claim_refresh,
+    enqueue_refresh,
+    estimate_refresh_cost,
+    exhausted_budgets,
+    get_budgets,
+    hold_refresh,
+    record_refresh_failure,
+    refresh_backoff,
+    refresh_priority,
+    release_budgets,
+    release_refresh,
+    reserve_budgets,
+)
 from .utils.tiktok_ingestion import fetch_tiktok_videos
 from .utils.video_processor import VideoPreprocessor
 from .utils.ai_engine import GeminiEngine
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
 import requests
 
+# Số query Bluesky search chạy song song và số lô Curator chấm song song
+SEARCH_WORKERS = 4
+RATE_WORKERS = 3
 
-@shared_task(name="update_feed_task")
-def update_feed_task(feed_id):
+# Hết ngân sách call: thử lại sau BUDGET_RETRY_SECONDS (+ jitter), tối đa BUDGET_MAX_RETRIES lần
+BUDGET_RETRY_SECONDS = 300
+BUDGET_MAX_RETRIES = 6
+# Trọng số của lần refresh mới nhất trong last_refresh_yield (trung bình trượt)
+YIELD_SMOOTHING = 0.5
+
+
+@shared_task(bind=True, name="update_feed_task")
+def update_feed_task(self, feed_id, token=None, reserved=False):
     """
     Task này sẽ được RabbitMQ phân phối cho Worker.
+    - token: quyền refresh feed (claim_refresh / enqueue_refresh); các yêu cầu trùng được gộp lại.
+    - reserved: ngân sách call đã được scheduler giữ chỗ trước.
     """
     try:
         feed = PersonalFeed.objects.get(id=feed_id)
     except PersonalFeed.DoesNotExist:
+        release_refresh(feed_id, token)
         return "Feed not found"
 
+    # Gọi trực tiếp update_feed_task.delay(feed_id): tự nhận quyền refresh.
+    # Có token mà khóa đã hết hạn (chờ retry lâu, cache bị evict): nhận lại thay vì bỏ qua
+    if token is None:
+        token = claim_refresh(feed_id)
+    elif not hold_refresh(feed_id, token):
+        token = None
+    if token is None:
+        return {"message": f"⏭️ Feed {feed_id} đang có refresh khác, bỏ qua", "feed_id": feed_id, "coalesced": True}
+
+    if not reserved and not reserve_budgets(estimate_refresh_cost(feed)):
+        if self.request.retries >= BUDGET_MAX_RETRIES:
+            release_refresh(feed_id, token)
+            return {"message": f"⏳ Hết ngân sách call, bỏ qua feed {feed_id}", "feed_id": feed_id}
+        # Giữ token (gia hạn khóa): các yêu cầu refresh trong lúc chờ vẫn được gộp vào lần này
+        hold_refresh(feed_id, token)
+        raise self.retry(countdown=BUDGET_RETRY_SECONDS + random.uniform(0, 60), max_retries=BUDGET_MAX_RETRIES)
+
+    try:
+        return _update_feed(feed)
+    except Exception:
+        # Ghi nhận lần thử lỗi: scheduler không chọn lại feed này ngay ở lượt sau
+        record_refresh_failure(feed)
+        raise
+    finally:
+        release_refresh(feed_id, token)
+
+
+def _update_feed(feed):
+    feed_id = feed.id
     print(f"🐇 RabbitMQ Worker: Đang xử lý feed {feed.title} ({feed.platform})...")
 
     # 1. PLANNING (Nếu cần refresh lại plan)
@@ -41,12 +114,87 @@ def update_feed_task(feed_id):
     }
 
     # 2. PROCESSING (Rẽ nhánh)
+    stats = None
     if feed.platform == "bluesky":
-        _process_bluesky(feed, criteria)
+        stats = _process_bluesky(feed, criteria)
     elif feed.platform == "tiktok":
-        _process_tiktok(feed, criteria)
+        stats = _process_tiktok(feed, criteria)
+
+    # 3. RANKING: lưu thứ hạng để API đọc feed phân trang theo rank
+    ranked = materialize_ranking(feed)
+
+    # 4. Số liệu cho scheduler: thời điểm refresh và số bài mới trung bình mỗi lần
+    saved = (stats or {}).get("saved", 0)
+    feed.last_refreshed_at = timezone.now()
+    feed.last_refresh_yield = YIELD_SMOOTHING * saved + (1 - YIELD_SMOOTHING) * feed.last_refresh_yield
+    feed.refresh_failures = 0
+    feed.save(update_fields=["last_refreshed_at", "last_refresh_yield", "refresh_failures"])
+
+    return {
+        "message": f"✅ Finished updating feed {feed_id}",
+        "feed_id": feed_id,
+        "ranked": ranked,
+        "stats": stats,
+    }
+
+
+@shared_task(name="rank_feed_task")
+def rank_feed_task(feed_id):
+    """Xếp hạng lại feed (ví dụ khi user đổi ranking_style)"""
+    try:
+        feed = PersonalFeed.objects.get(id=feed_id)
+    except PersonalFeed.DoesNotExist:
+        return "Feed not found"
+    return {"feed_id": feed_id, "ranked": materialize_ranking(feed)}
+
 
-    return f"✅ Finished updating feed {feed_id}"
+@shared_task(name="schedule_feed_refreshes")
+def schedule_feed_refreshes():
+    """
+    Chạy định kỳ bởi Celery beat (CELERY_BEAT_SCHEDULE).
+    Chọn các feed cần refresh theo refresh_priority (độ cũ x hoạt động của chủ feed x
+    hiệu suất refresh), giữ chỗ ngân sách call theo từng dịch vụ rồi đẩy task với độ trễ
+    ngẫu nhiên (jitter) để không dồn tất cả vào cùng một lúc.
+    """
+    now = timezone.now()
+    min_hours = getattr(settings, "FEED_REFRESH_MIN_HOURS", 1)
+    batch = getattr(settings, "FEED_REFRESH_BATCH", 20)
+    jitter = getattr(settings, "FEED_REFRESH_JITTER_SECONDS", 240)
+
+    candidates = list(
+        PersonalFeed.objects.select_related("user")
+        .filter(Q(last_refreshed_at__isnull=True) | Q(last_refreshed_at__lt=now - timedelta(hours=min_hours)))
+        .order_by(F("last_refreshed_at").asc(nulls_first=True))[: getattr(settings, "FEED_SCHEDULER_SCAN", 500)]
+    )
+    # Feed refresh lỗi liên tiếp: chờ lâu hơn (backoff) trước khi thử lại
+    candidates = [
+        feed for feed in candidates
+        if feed.last_refreshed_at is None or now - feed.last_refreshed_at >= refresh_backoff(feed, min_hours)
+    ]
+    candidates.sort(key=lambda feed: refresh_priority(feed, now), reverse=True)
+
+    budgets = get_budgets()
+    exhausted = set()
+    stats = {"candidates": len(candidates), "queued": 0, "coalesced": 0, "over_budget": 0}
+
+    for feed in candidates:
+        if stats["queued"] >= batch:
+            break
+        costs = estimate_refresh_cost(feed)
+        if exhausted & costs.keys() or not reserve_budgets(costs, budgets):
+            exhausted |= exhausted_budgets(costs, budgets)
+            stats["over_budget"] += 1
+            continue
+
+        if enqueue_refresh(feed, jitter_seconds=jitter, reserved=True) is None:
+            # Feed đã có refresh đang chờ / đang chạy
+            release_budgets(costs, budgets)
+            stats["coalesced"] += 1
+        else:
+            stats["queued"] += 1
+
+    print(f"🗓️ Feed scheduler: {stats}")
+    return stats
 
 
 def fetch_tiktok_oembed_sync(url):
@@ -69,59 +217,225 @@ def fetch_tiktok_oembed_sync(url):
     return None
 
 
+def _timed(func, *args, **kwargs):
+    """Chạy func, trả về (kết quả, số giây)"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _bluesky_post_row(p):
+    """Dict field SocialPost từ kết quả search Bluesky"""
+    # Kiểm tra nếu bài viết có danh sách ảnh, lấy cái đầu tiên làm thumbnail
+    image_url = None
+    if p.get("images") and len(p["images"]) > 0:
+        image_url = p["images"][0]
+
+    return {
+        "platform_id": p["uri"],
+        "platform": "bluesky",
+        "author": p["author"],
+        "content": p["content"],
+        # Dùng .get() để an toàn nếu field bị thiếu
+        "like_count": p.get("like_count", 0),
+        "repost_count": p.get("repost_count", 0),
+        "reply_count": p.get("reply_count", 0),
+        # Lưu thời gian tạo bài gốc (quan trọng cho việc sort độ mới)
+        "created_at_source": p.get("created_at"),
+        # Lưu Link Ảnh
+        "thumbnail_url": image_url,
+        "source_link": p.get("post_url"),
+    }
+
+
+def _add_feed_item(new_items, feed, post_id, score, reasoning, summary):
+    # Chỉ lưu bài đạt chuẩn (Score >= 4); ghi DB một lần ở cuối bằng save_feed_items
+    if score >= 4:
+        new_items.append(FeedItem(
+            feed=feed,
+            post_id=post_id,
+            ai_score=score,
+            ai_reasoning=reasoning,
+            ai_summary=summary,
+        ))
+
+
 def _process_bluesky(feed, criteria):
+    """
+    Pipeline song song:
+    1. Search tất cả query cùng lúc (SEARCH_WORKERS luồng), gộp trùng theo URI.
+       Mỗi query chỉ lấy bài mới kể từ lần refresh trước (feed.query_state).
+    2. Query nào xong trước thì lưu SocialPost trước, cả lô trong một upsert
+       (ORM chỉ chạy ở luồng chính). FeedItem được tạo một lần ở cuối.
+       Mốc query_state của một query chỉ được dời sau khi mọi bài của query đó đã
+       được chấm và lưu, để bài chưa chấm được lấy lại ở lần refresh sau.
+    3. Đủ một lô bài mới là dùng lại kết quả đã chấm (CurationCache, chung mọi feed
+       cùng tiêu chí), lọc sơ bộ phần còn lại bằng embedding (EmbeddingPrefilter) rồi
+       gửi phần không chắc chắn cho Curator chấm ngay, song song với các search còn lại.
+    4. Song song với search: lấy lại metrics các bài còn mới của feed (getPosts), để
+       engagement_velocity có snapshot sau (search sort=latest lưu bài khi metrics ~0).
+    Trả về số liệu và thời gian từng giai đoạn.
+    """
     sourcer = BonsaiSourcer()
     curator = BonsaiCurator()
+    prefilter = EmbeddingPrefilter() if getattr(settings, "FEED_PREFILTER", False) else None
+    curation_cache = CurationCacheStore(criteria)
 
-    for query in feed.search_queries:
-        # Gọi sourcer (đảm bảo sourcer.py đã được update để trả về key 'images')
-        posts = sourcer.get_posts_by_query(query, limit=5)
+    started = time.perf_counter()
+    stats = {
+        "queries": len(feed.search_queries), "api_calls": 0, "fetched": 0, "unique": 0,
+        "prefilter_dropped": 0, "prefilter_kept": 0, "rated": 0, "saved": 0, "metrics_refreshed": 0,
+    }
+    timings = {
+        "search_calls": 0.0, "metrics_calls": 0.0, "persist": 0.0, "cache": 0.0, "prefilter": 0.0, "rate_calls": 0.0,
+    }
+
+    seen = set()
+    pending = []  # [(post_id, content, query)] chờ chấm điểm
+    rating_jobs = []  # [(future, [(post_id, content, query)])]
+    failed_queries = set()  # Query có bài chưa chấm / lưu được: giữ mốc cũ
+    new_items = []  # FeedItem chờ bulk_create
+
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="feed-search") as search_pool, \
+            ThreadPoolExecutor(max_workers=RATE_WORKERS, thread_name_prefix="feed-rate") as rate_pool:
+
+        def submit_rating(batch):
+            nonlocal prefilter
+            cache_started = time.perf_counter()
+            cached = curation_cache.lookup([content for _, content, _ in batch])
+            timings["cache"] += time.perf_counter() - cache_started
+            for i, rating in cached.items():
+                _add_feed_item(new_items, feed, batch[i][0], rating["score"], rating["reasoning"], rating["summary"])
+            batch = [item for i, item in enumerate(batch) if i not in cached]
+
+            if batch and prefilter is not None:
+                try:
+                    decisions, elapsed = _timed(prefilter.classify, feed, [content for _, content, _ in batch])
+                    timings["prefilter"] += elapsed
+                except Exception as e:
+                    # Không có model embedding: gửi hết cho Curator như trước
+                    print(f"⚠️ Lỗi pre-filter, bỏ qua: {e}")
+                    prefilter = None
+                    decisions = [(CURATE, None)] * len(batch)
+
+                to_curate = []
+                for (post_id, content, query), (decision, similarity) in zip(batch, decisions):
+                    if decision == DROP:
+                        stats["prefilter_dropped"] += 1
+                    elif decision == KEEP:
+                        stats["prefilter_kept"] += 1
+                        _add_feed_item(
+                            new_items, feed, post_id, prefilter.score(similarity),
+                            f"Pre-scored by embedding similarity to the include criteria (cosine {similarity:.2f})",
+                            None,
+                        )
+                    else:
+                        to_curate.append((post_id, content, query))
+                batch = to_curate
 
-        for p in posts:
+            if batch:
+                contents = [content for _, content, _ in batch]
+                rating_jobs.append((rate_pool.submit(_timed, curator.rate_posts, contents, criteria), batch))
+
+        try:
+            metrics_uris = posts_needing_metrics(feed, METRICS_REFRESH_MAX_POSTS)
+        except Exception as e:
+            print(f"⚠️ Lỗi chọn bài cần làm mới metrics: {e}")
+            metrics_uris = []
+        metrics_job = search_pool.submit(_timed, sourcer.get_post_metrics, metrics_uris) if metrics_uris else None
+
+        query_state = {}
+        searches = {
+            search_pool.submit(
+                _timed, sourcer.get_new_posts_by_query, query, (feed.query_state or {}).get(query)
+            ): query
+            for query in feed.search_queries
+        }
+        for future in as_completed(searches):
+            query = searches[future]
+            (posts, query_state[query], calls), elapsed = future.result()
+            timings["search_calls"] += elapsed
+            stats["api_calls"] += calls
+            stats["fetched"] += len(posts)
+
+            # Cùng một bài có thể xuất hiện ở nhiều query
+            posts = [p for p in posts if p["uri"] not in seen]
+            seen.update(p["uri"] for p in posts)
+
+            persist_started = time.perf_counter()
             try:
-                # --- 1. XỬ LÝ ẢNH ---
-                # Kiểm tra nếu bài viết có danh sách ảnh, lấy cái đầu tiên làm thumbnail
-                image_url = None
-                if p.get("images") and len(p["images"]) > 0:
-                    image_url = p["images"][0]
-
-                # --- 2. LƯU CACHE (SocialPost) ---
-                post_obj, _ = SocialPost.objects.update_or_create(
-                    platform_id=p["uri"],
-                    defaults={
-                        "platform": "bluesky",
-                        "author": p["author"],
-                        "content": p["content"],
-                        # Dùng .get() để an toàn nếu field bị thiếu
-                        "like_count": p.get("like_count", 0),
-                        "repost_count": p.get("repost_count", 0),
-                        "reply_count": p.get("reply_count", 0),
-                        # Lưu thời gian tạo bài gốc (quan trọng cho việc sort độ mới)
-                        "created_at_source": p.get("created_at"),
-                        # Lưu Link Ảnh
-                        "thumbnail_url": image_url,
-                        "source_link": p.get("post_url"),
-                    },
+                post_ids = upsert_posts([_bluesky_post_row(p) for p in posts])
+                # Chỉ chấm điểm những bài chưa có trong Feed hiện tại
+                existing = existing_feed_post_ids(feed, post_ids.values())
+                pending.extend(
+                    (post_ids[p["uri"]], p["content"], query)
+                    for p in posts
+                    if p["uri"] in post_ids and post_ids[p["uri"]] not in existing
                 )
+            except Exception as e:
+                print(f"⚠️ Lỗi lưu {len(posts)} bài viết: {e}")
+                # Không dời mốc, lần refresh sau lấy lại các bài này
+                query_state[query] = (feed.query_state or {}).get(query) or {}
+            timings["persist"] += time.perf_counter() - persist_started
 
-                # --- 3. AI CHẤM ĐIỂM (Curator) ---
-                # Chỉ chấm điểm nếu bài này chưa có trong Feed hiện tại
-                if not FeedItem.objects.filter(feed=feed, post=post_obj).exists():
-                    rating = curator.rate_post(p["content"], criteria)
-
-                    # Chỉ lưu bài đạt chuẩn (Score >= 4)
-                    if rating["score"] >= 4:
-                        FeedItem.objects.create(
-                            feed=feed,
-                            post=post_obj,
-                            ai_score=rating["score"],
-                            ai_reasoning=rating["reasoning"],
-                            ai_summary=rating.get("summary", ""),
-                        )
+            # Gửi lô đầy cho Curator, không đợi các query còn lại
+            while len(pending) >= curator.batch_max_posts:
+                submit_rating(pending[:curator.batch_max_posts])
+                pending = pending[curator.batch_max_posts:]
+
+        timings["search_done"] = time.perf_counter() - started
+        stats["unique"] = len(seen)
 
+        if metrics_job is not None:
+            try:
+                (metrics, calls), elapsed = metrics_job.result()
+                timings["metrics_calls"] += elapsed
+                stats["api_calls"] += calls
+                persist_started = time.perf_counter()
+                stats["metrics_refreshed"] = update_post_metrics(metrics)
+                timings["persist"] += time.perf_counter() - persist_started
             except Exception as e:
-                print(f"⚠️ Lỗi xử lý bài viết {p.get('uri')}: {e}")
+                print(f"⚠️ Lỗi làm mới metrics: {e}")
+        if pending:
+            submit_rating(pending)
+
+        # --- AI CHẤM ĐIỂM (Curator): thu kết quả và lưu FeedItem ---
+        for future, batch in rating_jobs:
+            try:
+                ratings, elapsed = future.result()
+            except Exception as e:
+                print(f"⚠️ Lỗi Curator cho lô {len(batch)} bài: {e}")
+                failed_queries.update(query for _, _, query in batch)
                 continue
+            timings["rate_calls"] += elapsed
+            stats["rated"] += len(batch)
+            curation_cache.store([content for _, content, _ in batch], ratings)
+
+            for (post_id, _, query), rating in zip(batch, ratings):
+                if rating.get("error"):
+                    failed_queries.add(query)
+                    continue
+                _add_feed_item(new_items, feed, post_id, rating["score"], rating["reasoning"], rating.get("summary", ""))
+
+    persist_started = time.perf_counter()
+    stats["saved"] = save_feed_items(new_items)
+    # Bài đã chấm và lưu xong: dời mốc của các query thành công (chỉ giữ các query hiện tại)
+    previous_state = feed.query_state or {}
+    feed.query_state = {
+        query: (previous_state.get(query) or {}) if query in failed_queries else state
+        for query, state in query_state.items()
+    }
+    feed.save(update_fields=["query_state"])
+    stats["failed_queries"] = len(failed_queries)
+    timings["persist"] += time.perf_counter() - persist_started
+
+    stats["cache_hits"] = curation_cache.hits
+    stats["cache_misses"] = curation_cache.misses
+    stats["cache_hit_rate"] = curation_cache.hit_rate
+    timings["total"] = time.perf_counter() - started
+    stats["timings"] = {name: round(value, 3) for name, value in timings.items()}
+    print(f"⏱️ Feed {feed.id}: {stats}")
+    return stats
 
 
 def _process_tiktok(feed, criteria):
@@ -129,50 +443,54 @@ def _process_tiktok(feed, criteria):
     gemini = GeminiEngine()
 
     # Gọi Apify lấy link
-    raw_videos = fetch_tiktok_videos(feed.search_queries, max_items=3)
+    raw_videos = [v for v in fetch_tiktok_videos(feed.search_queries, max_items=3) if v.get("video_url")]
 
+    # Lưu Cache (một upsert cho tất cả video)
+    rows = []
     for vid in raw_videos:
-        # Lưu Cache
-        video_url = vid.get("video_url")
-        embed_html = fetch_tiktok_oembed_sync(video_url)
-
-        post_obj, _ = SocialPost.objects.update_or_create(
-            platform_id=video_url,
-            defaults={
-                "platform": "tiktok",
-                "author": vid["author"],
-                "content": vid["desc"],  # Caption gốc
-                "thumbnail_url": vid.get("author_avatar"),
-                # Metrics tương tác
-                "like_count": vid.get("like_count", 0),
-                "repost_count": vid.get("repost_count", 0),
-                "reply_count": vid.get("reply_count", 0),
-                "created_at_source": vid.get("created_at"),
-                "source_link": video_url,
-                "embed_quote": embed_html,
-            },
-        )
-
-        # AI Phân tích Video
-        if not FeedItem.objects.filter(feed=feed, post=post_obj).exists():
-            video_path = video_processor.download_video(vid)
-            if video_path:
-                # Gọi Gemini 1.5 Flash
-                analysis = gemini.analyze_video(video_path, post_text=vid["desc"])
-
-                # Dọn dẹp file
-                try:
-                    os.remove(video_path)
-                except:
-                    pass
-
-                if analysis:
-                    score = 8 if analysis.get("is_relevant_to_intent") else 2
-                    if score >= 4:
-                        FeedItem.objects.create(
-                            feed=feed,
-                            post=post_obj,
-                            ai_score=score,
-                            ai_reasoning=analysis.get("reasoning"),
-                            ai_summary=analysis.get("transcript_summary"),
-                        )
+        video_url = vid["video_url"]
+        rows.append({
+            "platform_id": video_url,
+            "platform": "tiktok",
+            "author": vid["author"],
+            "content": vid["desc"],  # Caption gốc
+            "thumbnail_url": vid.get("author_avatar"),
+            # Metrics tương tác
+            "like_count": vid.get("like_count", 0),
+            "repost_count": vid.get("repost_count", 0),
+            "reply_count": vid.get("reply_count", 0),
+            "created_at_source": vid.get("created_at"),
+            "source_link": video_url,
+            "embed_quote": fetch_tiktok_oembed_sync(video_url),
+        })
+    post_ids = upsert_posts(rows)
+    existing = existing_feed_post_ids(feed, post_ids.values())
+
+    new_items = []
+    for vid in raw_videos:
+        post_id = post_ids.get(vid["video_url"])
+
+        # AI Phân tích Video (chỉ video chưa có trong Feed)
+        if post_id is None or post_id in existing:
+            continue
+        existing.add(post_id)
+
+        video_path = video_processor.download_video(vid)
+        if video_path:
+            # Gọi Gemini 1.5 Flash
+            analysis = gemini.analyze_video(video_path, post_text=vid["desc"])
+
+            # Dọn dẹp file
+            try:
+                os.remove(video_path)
+            except:
+                pass
+
+            if analysis:
+                score = 8 if analysis.get("is_relevant_to_intent") else 2
+                _add_feed_item(
+                    new_items, feed, post_id, score,
+                    analysis.get("reasoning"), analysis.get("transcript_summary"),
+                )
+
+    return {"fetched": len(raw_videos), "saved": save_feed_items(new_items)}
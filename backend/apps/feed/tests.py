@@ -0,0 +1,458 @@
+"""
+Tests for the feed pipeline helpers that do not need external APIs.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from apps.feed.utils import curation_cache, persistence, scheduling
+from apps.feed.utils.curator import BonsaiCurator
+from apps.feed.utils.persistence import add_engagement_velocity, clean_post_row
+from apps.feed.utils.ranker import BORDA, SCORE, US_PER_HOUR, BonsaiRanker, borda_points
+from apps.feed.utils.sourcer import BonsaiSourcer
+
+
+class CuratorBatchingTestCase(SimpleTestCase):
+    """Test batch rating of BonsaiCurator with a mocked OpenAI client"""
+
+    def _curator(self, **kwargs):
+        curator = BonsaiCurator(**kwargs)
+        curator.client = mock.MagicMock()
+        return curator
+
+    def _respond(self, curator, ratings):
+        message = SimpleNamespace(content=json.dumps({"ratings": ratings}))
+        curator.client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=message)]
+        )
+
+    def test_batches_respect_token_budget(self):
+        curator = self._curator(batch_input_tokens=10, batch_max_posts=20)
+
+        # "a" * 8 -> 3 token
+        self.assertEqual(curator.make_batches(["a" * 8] * 5), [[0, 1, 2], [3, 4]])
+
+    def test_batches_respect_post_limit(self):
+        curator = self._curator(batch_input_tokens=1000, batch_max_posts=2)
+
+        self.assertEqual(curator.make_batches(["x"] * 5), [[0, 1], [2, 3], [4]])
+
+    def test_oversized_post_gets_its_own_batch(self):
+        curator = self._curator(batch_input_tokens=10, batch_max_posts=20)
+
+        self.assertEqual(curator.make_batches(["a", "b" * 400, "c"]), [[0], [1], [2]])
+
+    def test_ratings_are_matched_by_id_not_order(self):
+        curator = self._curator()
+        self._respond(curator, [
+            {"id": "p7", "score": 15, "reasoning": "r7", "summary": "s7"},
+            {"id": "p3", "score": 4, "reasoning": "r3", "summary": "s3"},
+            {"id": "p3", "score": 9},
+            {"id": "p99", "score": 8},
+            {"id": "p5", "score": "not a number"},
+        ])
+
+        ratings = curator._rate_batch([(3, "a"), (5, "b"), (7, "c")], {})
+
+        self.assertEqual(sorted(ratings), [3, 7])
+        self.assertEqual(ratings[3]["score"], 4)
+        self.assertEqual(ratings[7]["score"], 10)
+
+    def test_missing_ratings_fall_back_to_single_post(self):
+        curator = self._curator()
+        self._respond(curator, [{"id": "p1", "score": 6, "reasoning": "", "summary": ""}])
+        fallback = {"score": 2, "reasoning": "single", "summary": ""}
+
+        with mock.patch.object(curator, "rate_post", return_value=fallback) as rate_post:
+            ratings = curator.rate_posts(["a", "b"], {})
+
+        self.assertEqual(ratings[0], fallback)
+        self.assertEqual(ratings[1]["score"], 6)
+        rate_post.assert_called_once_with("a", {})
+
+    def test_malformed_single_post_reply_is_an_error(self):
+        curator = self._curator()
+        replies = [{"reasoning": "no score"}, {"score": "high"}, ["not", "a", "dict"]]
+
+        for reply in replies:
+            message = SimpleNamespace(content=json.dumps(reply))
+            curator.client.chat.completions.create.return_value = SimpleNamespace(
+                choices=[SimpleNamespace(message=message)]
+            )
+            rating = curator.rate_post("a", {})
+            self.assertTrue(rating["error"])
+            self.assertEqual(rating["score"], 0)
+
+    def test_single_post_reply_is_normalized(self):
+        curator = self._curator()
+        message = SimpleNamespace(content=json.dumps({"score": "12"}))
+        curator.client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=message)]
+        )
+
+        self.assertEqual(curator.rate_post("a", {}), {"score": 10, "reasoning": "", "summary": ""})
+
+
+class CurationCacheStoreTestCase(SimpleTestCase):
+    """Test curation cache lookup / store with the CurationCache model mocked"""
+
+    criteria = {"include_criteria": "AI research", "exclude_criteria": "crypto"}
+
+    def setUp(self):
+        patcher = mock.patch.object(curation_cache, "CurationCache")
+        self.model = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = curation_cache.CurationCacheStore(self.criteria)
+
+    def test_criteria_hash_ignores_case_and_whitespace(self):
+        self.assertEqual(
+            curation_cache.criteria_hash({"include_criteria": "  ai   RESEARCH", "exclude_criteria": "Crypto"}),
+            self.store.criteria_hash,
+        )
+
+    def test_lookup_maps_hits_back_to_indexes(self):
+        row = SimpleNamespace(
+            id=1, content_hash=curation_cache.content_hash("hello world"), score=8, reasoning="r", summary="s"
+        )
+        hit_update = mock.Mock()
+        self.model.objects.filter.side_effect = [[row], hit_update]
+
+        found = self.store.lookup(["Hello   World", "other post", "hello world"])
+
+        self.assertEqual(sorted(found), [0, 2])
+        self.assertEqual(found[0], {"score": 8, "reasoning": "r", "summary": "s"})
+        self.assertEqual((self.store.hits, self.store.misses), (2, 1))
+        hit_update.update.assert_called_once()
+        self.assertEqual(self.store.hit_rate, 0.667)
+
+    def test_lookup_miss_does_not_count_hits_in_db(self):
+        self.model.objects.filter.return_value = []
+
+        self.assertEqual(self.store.lookup(["a", "b"]), {})
+        self.assertEqual(self.model.objects.filter.call_count, 1)
+
+    def test_store_skips_errors_and_duplicate_contents(self):
+        self.store.store(
+            ["a", "A", "b", "c"],
+            [{"score": 7}, {"score": 7}, {"score": 0, "error": True}, {"reasoning": "no score"}],
+        )
+
+        created, = self.model.objects.bulk_create.call_args.args
+        self.assertEqual(len(created), 1)
+        self.assertTrue(self.model.objects.bulk_create.call_args.kwargs["ignore_conflicts"])
+
+    def test_store_without_valid_ratings_writes_nothing(self):
+        self.store.store(["a"], [{"score": 0, "error": True}])
+
+        self.model.objects.bulk_create.assert_not_called()
+
+
+class RankerTestCase(SimpleTestCase):
+    """Test the vectorized Borda / score ranking"""
+
+    def setUp(self):
+        self.ranker = BonsaiRanker()
+
+    def test_borda_ties_share_average_points(self):
+        np.testing.assert_array_equal(borda_points([3, 1, 3, 2]), [3.5, 1, 3.5, 2])
+
+    def test_borda_points_do_not_depend_on_input_order(self):
+        np.testing.assert_array_equal(borda_points([5, 5, 5]), [2, 2, 2])
+        self.assertEqual(len(borda_points([])), 0)
+
+    def test_borda_order_follows_weighted_ranks(self):
+        columns = {
+            "relevance": np.array([9.0, 2.0, 5.0]),
+            "recency": np.array([1, 3, 2], dtype=np.int64),
+            "popularity": np.array([0.0, 100.0, 10.0]),
+        }
+
+        _, focused, _ = self.ranker.score_columns(columns, style="focused", mode=BORDA)
+        _, trending, _ = self.ranker.score_columns(columns, style="trending", mode=BORDA)
+
+        self.assertEqual(focused.tolist(), [0, 2, 1])
+        self.assertEqual(trending.tolist(), [1, 2, 0])
+
+    def test_signals_without_weight_are_ignored(self):
+        columns = {"relevance": np.array([1.0, 2.0]), "quality": np.array([2.0, 1.0])}
+
+        _, order, points = self.ranker.score_columns(columns, weights={"recency": 0, "popularity": 0})
+
+        self.assertEqual(order.tolist(), [1, 0])
+        self.assertEqual(set(points), {"relevance"})
+
+    def test_score_mode_trades_accumulated_engagement_for_velocity(self):
+        now_us = 1_000_000 * US_PER_HOUR
+        columns = {
+            # Bài 0: rất liên quan, viral nhưng đã cũ; bài 1: mới và đang tăng tương tác
+            "relevance": np.array([9.0, 5.0]),
+            "recency": np.array([now_us - 100 * US_PER_HOUR, now_us - US_PER_HOUR], dtype=np.int64),
+            "popularity": np.array([1000.0, 10.0]),
+            "velocity": np.array([0.0, 50.0]),
+        }
+
+        _, trending, features = self.ranker.score_columns(columns, style="trending", mode=SCORE, now_us=now_us)
+        _, focused, _ = self.ranker.score_columns(columns, style="focused", mode=SCORE, now_us=now_us)
+
+        self.assertEqual(trending.tolist(), [1, 0])
+        self.assertEqual(focused.tolist(), [0, 1])
+        self.assertAlmostEqual(features["recency"][1], 0.5 ** (1 / 24))
+        self.assertEqual(features["velocity"].tolist(), [0.0, 1.0])
+
+    def test_score_mode_gives_no_recency_to_unknown_dates(self):
+        decay = BonsaiRanker.time_decay(np.array([0, US_PER_HOUR], dtype=np.int64), 12.0, now_us=US_PER_HOUR)
+
+        self.assertEqual(decay.tolist(), [0.0, 1.0])
+
+
+class EngagementVelocityTestCase(SimpleTestCase):
+    """Test velocity between metrics snapshots with SocialPost mocked"""
+
+    def setUp(self):
+        self.now = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        patcher = mock.patch.object(persistence, "SocialPost")
+        self.model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _previous(self, *rows):
+        self.model.objects.filter.return_value.values.return_value = list(rows)
+
+    def _snapshot(self, platform_id, hours_ago, likes, velocity=0.0):
+        return {
+            "platform_id": platform_id, "like_count": likes, "repost_count": 0, "reply_count": 0,
+            "engagement_velocity": velocity, "metrics_updated_at": self.now - timedelta(hours=hours_ago),
+            "created_at_source": self.now - timedelta(days=1),
+        }
+
+    def test_velocity_is_delta_between_snapshots(self):
+        self._previous(self._snapshot("a", hours_ago=2, likes=10))
+        row = {"platform_id": "a", "like_count": 20, "repost_count": 2, "reply_count": 2}
+
+        add_engagement_velocity([row], now=self.now)
+
+        # (20 + 3*2 + 2*2 - 10) / 2 giờ
+        self.assertEqual(row["engagement_velocity"], 10.0)
+        self.assertEqual(row["metrics_updated_at"], self.now)
+
+    def test_snapshot_younger_than_15_minutes_is_kept(self):
+        previous = self._snapshot("a", hours_ago=0.1, likes=10, velocity=3.0)
+        self._previous(previous)
+        row = {"platform_id": "a", "like_count": 50, "repost_count": 0, "reply_count": 0}
+
+        add_engagement_velocity([row], now=self.now)
+
+        self.assertEqual(row["like_count"], 10)
+        self.assertEqual(row["engagement_velocity"], 3.0)
+        self.assertEqual(row["metrics_updated_at"], previous["metrics_updated_at"])
+
+    def test_engagement_drop_is_not_negative_velocity(self):
+        self._previous(self._snapshot("a", hours_ago=1, likes=10))
+        row = {"platform_id": "a", "like_count": 5, "repost_count": 0, "reply_count": 0}
+
+        add_engagement_velocity([row], now=self.now)
+
+        self.assertEqual(row["engagement_velocity"], 0.0)
+
+    def test_new_post_uses_engagement_over_age(self):
+        self._previous()
+        row = {
+            "platform_id": "b", "like_count": 8, "repost_count": 0, "reply_count": 0,
+            "created_at_source": self.now - timedelta(hours=4),
+        }
+        just_posted = {
+            "platform_id": "c", "like_count": 3, "repost_count": 0, "reply_count": 0,
+            "created_at_source": self.now - timedelta(minutes=5),
+        }
+
+        add_engagement_velocity([row, just_posted], now=self.now)
+
+        self.assertEqual(row["engagement_velocity"], 2.0)
+        # Tuổi tối thiểu 1 giờ
+        self.assertEqual(just_posted["engagement_velocity"], 3.0)
+
+
+class CleanPostRowTestCase(SimpleTestCase):
+    """Test row cleaning before the bulk SocialPost upsert"""
+
+    def _row(self, **overrides):
+        row = {
+            "platform_id": "at://did:plc:abc/app.bsky.feed.post/1",
+            "platform": "bluesky",
+            "author": "alice.bsky.social",
+            "content": "hello",
+            "like_count": 3,
+            "created_at_source": "2025-01-02T03:04:05+00:00",
+            "source_link": "https://bsky.app/profile/alice/post/1",
+        }
+        row.update(overrides)
+        return row
+
+    def test_valid_row_is_kept(self):
+        cleaned = clean_post_row(self._row())
+
+        self.assertEqual(cleaned["author"], "alice.bsky.social")
+        self.assertEqual(cleaned["created_at_source"].year, 2025)
+
+    def test_long_author_is_truncated(self):
+        cleaned = clean_post_row(self._row(author="a" * 150))
+
+        self.assertEqual(len(cleaned["author"]), 100)
+
+    def test_bad_values_fall_back_instead_of_failing_the_batch(self):
+        cleaned = clean_post_row(self._row(
+            source_link="https://example.com/" + "x" * 600,
+            created_at_source="not a date",
+            like_count="many",
+            author=None,
+        ))
+
+        self.assertIsNone(cleaned["source_link"])
+        self.assertIsNone(cleaned["created_at_source"])
+        self.assertEqual(cleaned["like_count"], 0)
+        self.assertEqual(cleaned["author"], "")
+
+    def test_unusable_platform_id_drops_the_row(self):
+        self.assertIsNone(clean_post_row(self._row(platform_id="x" * 501)))
+        self.assertIsNone(clean_post_row(self._row(platform_id=None)))
+
+
+class IncrementalSourcingTestCase(SimpleTestCase):
+    """Test high-water marks and metrics refresh of BonsaiSourcer (no login)"""
+
+    def setUp(self):
+        self.sourcer = BonsaiSourcer.__new__(BonsaiSourcer)
+        self.sourcer.client = None
+
+    def _post(self, uri, created_at):
+        return {"uri": uri, "created_at": created_at}
+
+    def test_mark_moves_to_newest_post_with_its_boundary(self):
+        posts = [
+            self._post("a", "2025-01-01T10:00:00+00:00"),
+            self._post("b", "2025-01-01T12:00:00+00:00"),
+            self._post("c", "2025-01-01T12:00:00+00:00"),
+        ]
+
+        state = self.sourcer._advance_state({}, posts)
+
+        self.assertEqual(state["high_water"], "2025-01-01T12:00:00+00:00")
+        self.assertEqual(sorted(state["boundary_uris"]), ["b", "c"])
+
+    def test_same_mark_keeps_previous_boundary(self):
+        previous = {"high_water": "2025-01-01T12:00:00+00:00", "boundary_uris": ["b"]}
+
+        state = self.sourcer._advance_state(previous, [self._post("d", "2025-01-01T12:00:00+00:00")])
+
+        self.assertEqual(sorted(state["boundary_uris"]), ["b", "d"])
+
+    def test_future_dates_do_not_push_the_mark_past_now(self):
+        future = (datetime.now(timezone.utc) + timedelta(days=2)).isoformat()
+
+        state = self.sourcer._advance_state({}, [self._post("z", future)])
+
+        self.assertLessEqual(datetime.fromisoformat(state["high_water"]), datetime.now(timezone.utc))
+
+    def test_no_posts_keeps_state(self):
+        previous = {"high_water": "2025-01-01T12:00:00+00:00", "boundary_uris": ["b"]}
+
+        self.assertEqual(self.sourcer._advance_state(previous, []), previous)
+
+    def test_metrics_are_fetched_in_batches(self):
+        def get_posts(params):
+            return SimpleNamespace(posts=[
+                SimpleNamespace(uri=uri, like_count=1, repost_count=None, reply_count=2) for uri in params["uris"]
+            ])
+
+        self.sourcer.client = mock.MagicMock()
+        self.sourcer.client.app.bsky.feed.get_posts.side_effect = get_posts
+
+        metrics, calls = self.sourcer.get_post_metrics([f"at://{i}" for i in range(30)], batch_size=25)
+
+        self.assertEqual(calls, 2)
+        self.assertEqual(len(metrics), 30)
+        self.assertEqual(metrics["at://0"], {"like_count": 1, "repost_count": 0, "reply_count": 2})
+
+
+class RefreshCoordinationTestCase(SimpleTestCase):
+    """Test refresh coalescing and call budgets (shared cache simulated on the local cache)"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(scheduling, "shared_cache", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_second_claim_is_coalesced_until_release(self):
+        token = scheduling.claim_refresh(1)
+
+        self.assertIsNotNone(token)
+        self.assertIsNone(scheduling.claim_refresh(1))
+        self.assertTrue(scheduling.owns_refresh(1, token))
+
+        scheduling.release_refresh(1, token)
+
+        self.assertFalse(scheduling.owns_refresh(1, token))
+        self.assertIsNotNone(scheduling.claim_refresh(1))
+
+    def test_expired_lock_is_reclaimed_by_its_token(self):
+        token = scheduling.claim_refresh(1)
+        cache.delete("feed:refresh:1")
+
+        self.assertTrue(scheduling.hold_refresh(1, token))
+        self.assertTrue(scheduling.owns_refresh(1, token))
+
+    def test_lock_held_by_another_token_is_not_taken(self):
+        scheduling.claim_refresh(1)
+
+        self.assertFalse(scheduling.hold_refresh(1, "other"))
+
+    def test_budget_refuses_calls_over_limit(self):
+        budget = scheduling.RateBudget("test", limit=5, period=3600)
+
+        self.assertTrue(budget.try_acquire(3))
+        self.assertFalse(budget.try_acquire(3))
+        self.assertEqual(budget.used(), 3)
+        self.assertTrue(budget.try_acquire(2))
+
+    def test_ranking_is_enqueued_once_per_window(self):
+        feed = SimpleNamespace(id=1)
+
+        with mock.patch("apps.feed.tasks.rank_feed_task") as rank_feed_task:
+            scheduling.enqueue_ranking(feed)
+            scheduling.enqueue_ranking(feed)
+
+        rank_feed_task.delay.assert_called_once_with(1)
+
+    def test_local_cache_disables_coalescing_and_budgets(self):
+        scheduling.shared_cache.return_value = False
+        budget = scheduling.RateBudget("test", limit=1, period=3600)
+
+        self.assertIsNotNone(scheduling.claim_refresh(1))
+        self.assertIsNotNone(scheduling.claim_refresh(1))
+        self.assertTrue(budget.try_acquire(10))
+
+    def test_backoff_doubles_per_consecutive_failure(self):
+        feed = SimpleNamespace(refresh_failures=0)
+        self.assertEqual(scheduling.refresh_backoff(feed, 1), timedelta(hours=1))
+
+        feed.refresh_failures = 3
+        self.assertEqual(scheduling.refresh_backoff(feed, 1), timedelta(hours=8))
+
+        feed.refresh_failures = 50
+        self.assertEqual(scheduling.refresh_backoff(feed, 1), timedelta(hours=32))
+
+    def test_failed_refresh_records_attempt_time(self):
+        now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        feed = mock.Mock(id=1, last_refreshed_at=None, refresh_failures=1)
+
+        scheduling.record_refresh_failure(feed, now=now)
+
+        self.assertEqual(feed.last_refreshed_at, now)
+        self.assertEqual(feed.refresh_failures, 2)
+        feed.save.assert_called_once_with(update_fields=["last_refreshed_at", "refresh_failures"])
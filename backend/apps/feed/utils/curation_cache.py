@@ -0,0 +1,80 @@
+import hashlib
+
+from django.db.models import F
+
+from ..models import CurationCache
+from .curator import CURATOR_PROMPT_VERSION
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(_normalize(content).encode("utf-8")).hexdigest()
+
+
+def criteria_hash(criteria: dict) -> str:
+    """Hash của include / exclude criteria đã chuẩn hóa (chữ thường, gộp khoảng trắng)"""
+    text = f"{_normalize(criteria.get('include_criteria'))}\n{_normalize(criteria.get('exclude_criteria'))}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CurationCacheStore:
+    """
+    Cache kết quả Curator theo (nội dung bài, tiêu chí, phiên bản prompt), dùng
+    chung cho mọi feed và mọi lần refresh. Mỗi lần lookup / store là một query.
+    """
+
+    def __init__(self, criteria: dict, prompt_version: str = CURATOR_PROMPT_VERSION):
+        self.criteria_hash = criteria_hash(criteria)
+        self.prompt_version = prompt_version
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, contents):
+        """{index: rating} cho các nội dung đã có trong cache"""
+        hashes = [content_hash(c) for c in contents]
+        rows = {
+            row.content_hash: row
+            for row in CurationCache.objects.filter(
+                content_hash__in=set(hashes),
+                criteria_hash=self.criteria_hash,
+                prompt_version=self.prompt_version,
+            )
+        }
+
+        found = {}
+        for i, h in enumerate(hashes):
+            row = rows.get(h)
+            if row is not None:
+                found[i] = {"score": row.score, "reasoning": row.reasoning, "summary": row.summary}
+
+        if rows:
+            CurationCache.objects.filter(id__in=[row.id for row in rows.values()]).update(hits=F("hits") + 1)
+        self.hits += len(found)
+        self.misses += len(contents) - len(found)
+        return found
+
+    def store(self, contents, ratings):
+        """Lưu kết quả Curator (bỏ qua kết quả lỗi)"""
+        rows = {}
+        for content, rating in zip(contents, ratings):
+            if rating.get("error") or "score" not in rating:
+                continue
+            h = content_hash(content)
+            rows[h] = CurationCache(
+                content_hash=h,
+                criteria_hash=self.criteria_hash,
+                prompt_version=self.prompt_version,
+                score=rating["score"],
+                reasoning=rating.get("reasoning") or "",
+                summary=rating.get("summary"),
+            )
+        if rows:
+            CurationCache.objects.bulk_create(list(rows.values()), ignore_conflicts=True)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return round(self.hits / total, 3) if total else 0.0
@@ -5,11 +5,50 @@ from openai import OpenAI
 
 load_dotenv()
 
+# Tăng mỗi khi sửa prompt / thang điểm: kết quả cũ trong CurationCache sẽ không được dùng lại
+CURATOR_PROMPT_VERSION = "v1"
+
+# Thang điểm chung cho rate_post và rate_posts
+SCORING_SCALE = """
+        Scoring Scale:
+        - 8-10: Strongly matches 'Include' criteria (High quality, exact topic).
+        - 5-7:  General match (Relevant but broad).
+        - 1-2:  Matches 'Exclude' criteria or irrelevant (Show less).
+        - 0:    Toxic, spam, or explicitly forbidden content (Never show).
+"""
+
+# Giới hạn cho một request chấm điểm theo lô
+BATCH_INPUT_TOKENS = 6000  # Tổng token nội dung bài viết trong 1 request
+BATCH_MAX_POSTS = 20  # Mỗi bài tốn ~80 token output (score + reasoning + summary)
+POST_MAX_CHARS = 2000  # Cắt bớt bài quá dài
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token (~4 ký tự / token), đủ để chia lô"""
+    return len(text) // 4 + 1
+
+
+def parse_rating(rating):
+    """Kết quả model -> {score (0-10), reasoning, summary}; None nếu không hợp lệ"""
+    if not isinstance(rating, dict):
+        return None
+    try:
+        score = int(rating.get("score"))
+    except (TypeError, ValueError):
+        return None
+    return {
+        "score": max(0, min(score, 10)),
+        "reasoning": rating.get("reasoning") or "",
+        "summary": rating.get("summary") or "",
+    }
+
 
 class BonsaiCurator:
-    def __init__(self):
+    def __init__(self, batch_input_tokens=BATCH_INPUT_TOKENS, batch_max_posts=BATCH_MAX_POSTS):
         api_key = os.getenv("OPENAI_API_KEY")
         self.client = OpenAI(api_key=api_key) if api_key else None
+        self.batch_input_tokens = batch_input_tokens
+        self.batch_max_posts = batch_max_posts
 
     def rate_post(self, post_content: str, criteria: dict):
         """
@@ -18,22 +57,17 @@ class BonsaiCurator:
             - post_content: Nội dung text của bài post.
             - criteria: Dictionary chứa 'include_criteria' và 'exclude_criteria' (từ Planner).
         Output:
-            - Dictionary {score: int, reasoning: str}
+            - Dictionary {score: int 0-10, reasoning: str, summary: str}
+              (có thêm "error": True khi không chấm được, kết quả này không được cache)
         """
         if not self.client:
-            return {"score": 0, "reasoning": "No API Client"}
+            return {"score": 0, "reasoning": "No API Client", "error": True}
 
         # Prompt Engineering: Dạy cho LLM cách chấm điểm theo chuẩn BONSAI
         system_prompt = """
         You are the 'Curator' module of a personalized feed system.
         Your task is to rate a social media post based on the user's specific intent.
-        
-        Scoring Scale:
-        - 8-10: Strongly matches 'Include' criteria (High quality, exact topic).
-        - 5-7:  General match (Relevant but broad).
-        - 1-2:  Matches 'Exclude' criteria or irrelevant (Show less).
-        - 0:    Toxic, spam, or explicitly forbidden content (Never show).
-
+        """ + SCORING_SCALE + """
         Output Format (JSON only):
         {
             "score": <int 0-10>,
@@ -62,12 +96,118 @@ class BonsaiCurator:
                 temperature=0.0,  # Cần nhất quán, không sáng tạo lung tung
             )
 
-            result = json.loads(response.choices[0].message.content)
-            return result
-
+            result = parse_rating(json.loads(response.choices[0].message.content))
         except Exception as e:
             print(f"❌ Lỗi Curator: {e}")
-            return {"score": 0, "reasoning": "Error"}
+            return {"score": 0, "reasoning": "Error", "error": True}
+
+        if result is None:
+            print("❌ Lỗi Curator: kết quả không hợp lệ")
+            return {"score": 0, "reasoning": "Invalid output", "error": True}
+        return result
+
+    def rate_posts(self, posts, criteria: dict):
+        """
+        Chấm điểm nhiều bài viết, gộp nhiều bài vào một request JSON mode.
+        Input:
+            - posts: List nội dung text của các bài post.
+            - criteria: Dictionary chứa 'include_criteria' và 'exclude_criteria'.
+        Output:
+            - List {score, reasoning, summary} theo đúng thứ tự của posts.
+        Bài nào không có kết quả hợp lệ trong lô sẽ được chấm lại riêng bằng rate_post.
+        """
+        if not self.client:
+            return [{"score": 0, "reasoning": "No API Client", "error": True} for _ in posts]
+
+        ratings = [None] * len(posts)
+        for batch in self.make_batches(posts):
+            batch_ratings = self._rate_batch([(i, posts[i]) for i in batch], criteria)
+            for i in batch:
+                rating = batch_ratings.get(i)
+                # Fallback: chấm lại từng bài nếu lô bị lỗi hoặc thiếu bài
+                ratings[i] = rating if rating is not None else self.rate_post(posts[i], criteria)
+        return ratings
+
+    def make_batches(self, posts):
+        """Chia index của posts thành các lô theo ngân sách token và số bài tối đa"""
+        batches, current, used = [], [], 0
+        for i, content in enumerate(posts):
+            tokens = estimate_tokens((content or "")[:POST_MAX_CHARS])
+            if current and (used + tokens > self.batch_input_tokens or len(current) >= self.batch_max_posts):
+                batches.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _rate_batch(self, items, criteria: dict):
+        """
+        Chấm một lô [(index, content)] trong một request.
+        Trả về {index: rating} cho các bài có kết quả hợp lệ.
+        """
+        # Id ổn định "p<index>" để ghép kết quả, không phụ thuộc thứ tự model trả về
+        system_prompt = """
+        You are the 'Curator' module of a personalized feed system.
+        Your task is to rate each social media post in a list based on the user's specific intent.
+        Rate every post independently and return exactly one rating per post id.
+        """ + SCORING_SCALE + """
+        Output Format (JSON only):
+        {
+            "ratings": [
+                {
+                    "id": "<post id>",
+                    "score": <int 0-10>,
+                    "reasoning": "<short explanation why>",
+                    "summary": "<concise summary of the post content in 1-2 sentences>"
+                }
+            ]
+        }
+        """
+
+        posts_json = json.dumps(
+            [{"id": f"p{i}", "content": (content or "")[:POST_MAX_CHARS]} for i, content in items],
+            ensure_ascii=False,
+        )
+        user_message = f"""
+        USER INTENT:
+        - Include: {criteria.get('include_criteria')}
+        - Exclude: {criteria.get('exclude_criteria')}
+
+        POSTS TO RATE (JSON list):
+        {posts_json}
+        """
+
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.0,
+            )
+            result = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"❌ Lỗi Curator (batch {len(items)} bài): {e}")
+            return {}
+
+        wanted = {f"p{i}": i for i, _ in items}
+        ratings = {}
+        for rating in result.get("ratings") or []:
+            parsed = parse_rating(rating)
+            if parsed is None:
+                continue
+            index = wanted.get(str(rating.get("id")))
+            if index is None or index in ratings:
+                continue
+            ratings[index] = parsed
+
+        if len(ratings) < len(items):
+            print(f"⚠️ Curator batch thiếu {len(items) - len(ratings)}/{len(items)} kết quả, chấm lại từng bài")
+        return ratings
 
 
 # --- PHẦN TEST CHẠY THỬ (GIẢ LẬP) ---
@@ -99,8 +239,9 @@ if __name__ == "__main__":
     print(f"🎯 Tiêu chí lọc: {mock_criteria['include_criteria']}")
     print("--- BẮT ĐẦU CHẤM ĐIỂM ---\n")
 
-    for post in mock_posts:
-        rating = curator.rate_post(post["text"], mock_criteria)
+    ratings = curator.rate_posts([post["text"] for post in mock_posts], mock_criteria)
+
+    for post, rating in zip(mock_posts, ratings):
 
         # Hiển thị kết quả
         print(f"Post: [{post['text'][:50]}...]")
@@ -0,0 +1,231 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, models
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import FeedItem, SocialPost
+from .ranker import US_PER_HOUR, BonsaiRanker, to_epoch_us
+
+# Hai lần lấy metrics cách nhau ít hơn khoảng này thì giữ snapshot cũ (delta quá nhỏ, nhiễu)
+MIN_SNAPSHOT_HOURS = 0.25
+METRIC_FIELDS = ("like_count", "repost_count", "reply_count")
+# Chỉ lấy lại metrics của bài đăng trong METRICS_MAX_AGE_HOURS giờ qua (velocity chỉ có ý nghĩa
+# với bài còn mới) và có snapshot cũ hơn METRICS_STALE_HOURS giờ
+METRICS_MAX_AGE_HOURS = 72
+METRICS_STALE_HOURS = 1
+
+
+def _engagement(row):
+    """Cùng công thức với BonsaiRanker.calculate_engagement"""
+    return (row.get("like_count") or 0) + 3 * (row.get("repost_count") or 0) + 2 * (row.get("reply_count") or 0)
+
+
+def add_engagement_velocity(rows, now=None):
+    """
+    Thêm engagement_velocity / metrics_updated_at vào các row sắp upsert.
+    - Bài đã có snapshot: (engagement mới - engagement cũ) / số giờ giữa hai snapshot.
+    - Bài mới: engagement / tuổi bài (giờ, tối thiểu 1).
+    Một query cho cả lô để lấy snapshot trước đó.
+    """
+    now = now or timezone.now()
+    previous = {
+        row["platform_id"]: row
+        for row in SocialPost.objects.filter(platform_id__in=[r["platform_id"] for r in rows]).values(
+            "platform_id", *METRIC_FIELDS, "engagement_velocity", "metrics_updated_at", "created_at_source"
+        )
+    }
+
+    for row in rows:
+        prev = previous.get(row["platform_id"])
+        if prev and prev["metrics_updated_at"]:
+            hours = (now - prev["metrics_updated_at"]).total_seconds() / 3600
+            if hours < MIN_SNAPSHOT_HOURS:
+                # Giữ nguyên snapshot trước làm mốc cho lần sau
+                row.update({field: prev[field] for field in METRIC_FIELDS})
+                row["engagement_velocity"] = prev["engagement_velocity"]
+                row["metrics_updated_at"] = prev["metrics_updated_at"]
+                continue
+            row["engagement_velocity"] = max(_engagement(row) - _engagement(prev), 0) / hours
+        else:
+            created_at_us = to_epoch_us(row.get("created_at_source") or (prev or {}).get("created_at_source"))
+            age_hours = (to_epoch_us(now) - created_at_us) / US_PER_HOUR if created_at_us else 0
+            row["engagement_velocity"] = _engagement(row) / max(age_hours, 1.0)
+        row["metrics_updated_at"] = now
+    return rows
+
+
+def clean_post_row(row):
+    """
+    Chuẩn hóa một row SocialPost trước khi bulk upsert, để một bài lỗi không làm hỏng cả lô:
+    - CharField quá dài (author...): cắt bớt.
+    - URLField quá dài / không hợp lệ, giá trị sai kiểu (ngày, số): None hoặc giá trị mặc định.
+    Trả về None nếu không thể lưu bài (platform_id thiếu hoặc quá dài).
+    """
+    cleaned = {}
+    for name, value in row.items():
+        field = SocialPost._meta.get_field(name)
+        try:
+            value = field.to_python(value)
+            if value is not None and isinstance(field, models.URLField):
+                field.run_validators(value)
+        except ValidationError:
+            if name == "platform_id":
+                return None
+            value = None if field.null else field.get_default()
+
+        if isinstance(value, str) and field.max_length and len(value) > field.max_length:
+            if name == "platform_id":
+                return None
+            value = value[: field.max_length]
+        if value is None and not field.null:
+            if name == "platform_id":
+                return None
+            value = field.get_default()
+        cleaned[name] = value
+    return cleaned
+
+
+def upsert_posts(rows):
+    """
+    Lưu / cập nhật nhiều SocialPost cùng lúc (INSERT ... ON CONFLICT (platform_id) DO UPDATE).
+    Input: list dict field -> giá trị, bắt buộc có "platform_id".
+    Output: {platform_id: post_id} của các bài đã lưu
+    3 query cho cả lô (snapshot metrics cũ, upsert, đọc id), thay vì SELECT + UPDATE/INSERT cho từng bài.
+    Row được làm sạch trước (clean_post_row); nếu cả lô vẫn lỗi thì lưu lại từng bài,
+    để chỉ bài lỗi bị bỏ qua như trước.
+    """
+    cleaned = []
+    for row in rows:
+        clean = clean_post_row(row)
+        if clean is None:
+            print(f"⚠️ Bỏ qua bài không hợp lệ: {str(row.get('platform_id'))[:80]}")
+        else:
+            cleaned.append(clean)
+    if not cleaned:
+        return {}
+
+    # Một platform_id chỉ xuất hiện một lần trong câu INSERT (bản sau cùng thắng)
+    by_platform_id = {row["platform_id"]: row for row in cleaned}
+    rows = add_engagement_velocity(list(by_platform_id.values()))
+
+    try:
+        _bulk_upsert(rows)
+    except DatabaseError as e:
+        print(f"⚠️ Lỗi upsert lô {len(rows)} bài, lưu lại từng bài: {e}")
+        for row in rows:
+            try:
+                _bulk_upsert([row])
+            except DatabaseError as row_error:
+                print(f"⚠️ Bỏ qua bài {row['platform_id'][:80]}: {row_error}")
+    return dict(
+        SocialPost.objects.filter(platform_id__in=list(by_platform_id)).values_list("platform_id", "id")
+    )
+
+
+def _bulk_upsert(rows):
+    update_fields = sorted({field for row in rows for field in row if field != "platform_id"})
+    SocialPost.objects.bulk_create(
+        [SocialPost(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=["platform_id"],
+        update_fields=update_fields,
+    )
+
+
+def posts_needing_metrics(feed, limit, now=None):
+    """
+    platform_id các bài Bluesky của feed cần lấy lại metrics (mới nhất trước):
+    đăng trong METRICS_MAX_AGE_HOURS giờ qua, snapshot cũ hơn METRICS_STALE_HOURS giờ.
+    """
+    now = now or timezone.now()
+    return list(
+        SocialPost.objects.filter(
+            feeditem__feed=feed,
+            platform="bluesky",
+            created_at_source__gte=now - timedelta(hours=METRICS_MAX_AGE_HOURS),
+        )
+        .filter(Q(metrics_updated_at__isnull=True) | Q(metrics_updated_at__lt=now - timedelta(hours=METRICS_STALE_HOURS)))
+        .order_by("-created_at_source")
+        .values_list("platform_id", flat=True)[:limit]
+    )
+
+
+def update_post_metrics(metrics, now=None):
+    """
+    Ghi snapshot metrics mới cho các bài đã lưu và tính lại engagement_velocity.
+    Input: {platform_id: {"like_count", "repost_count", "reply_count"}} (BonsaiSourcer.get_post_metrics)
+    Output: số bài được cập nhật
+    """
+    if not metrics:
+        return 0
+    rows = add_engagement_velocity([{"platform_id": pid, **values} for pid, values in metrics.items()], now=now)
+    ids = dict(SocialPost.objects.filter(platform_id__in=list(metrics)).values_list("platform_id", "id"))
+    fields = [*METRIC_FIELDS, "engagement_velocity", "metrics_updated_at"]
+    posts = [
+        SocialPost(id=ids[row["platform_id"]], **{field: row[field] for field in fields})
+        for row in rows
+        if row["platform_id"] in ids
+    ]
+    SocialPost.objects.bulk_update(posts, fields, batch_size=500)
+    return len(posts)
+
+
+def existing_feed_post_ids(feed, post_ids):
+    """Các post_id đã có FeedItem trong feed (một query)"""
+    if not post_ids:
+        return set()
+    return set(
+        FeedItem.objects.filter(feed=feed, post_id__in=list(post_ids)).values_list("post_id", flat=True)
+    )
+
+
+def save_feed_items(items):
+    """
+    Tạo nhiều FeedItem cùng lúc, bỏ qua cặp (feed, post) đã tồn tại.
+    Trả về số FeedItem thực sự được tạo (ignore_conflicts không cho biết dòng nào bị bỏ qua,
+    nên đếm các cặp trước và sau khi insert).
+    """
+    if not items:
+        return 0
+    pairs = FeedItem.objects.filter(
+        feed_id__in={item.feed_id for item in items}, post_id__in={item.post_id for item in items}
+    )
+    before = pairs.count()
+    FeedItem.objects.bulk_create(items, ignore_conflicts=True)
+    return pairs.count() - before
+
+
+def materialize_ranking(feed, ranker=None):
+    """
+    Xếp hạng toàn bộ FeedItem của feed bằng BonsaiRanker (theo feed.ranking_style)
+    và lưu thứ hạng vào FeedItem.rank, để API đọc feed chỉ cần ORDER BY rank.
+    Đọc thẳng các cột cần thiết (values_list) rồi xếp hạng vector hóa.
+    Trả về số bài đã xếp hạng.
+    """
+    ranker = ranker or BonsaiRanker()
+    rows = list(
+        FeedItem.objects.filter(feed=feed).values_list(
+            "id", "ai_score", "post__created_at_source",
+            "post__like_count", "post__repost_count", "post__reply_count", "post__engagement_velocity",
+        )
+    )
+    if not rows:
+        return 0
+
+    ids, scores, created_at, likes, reposts, replies, velocity = zip(*rows)
+    columns = {
+        "relevance": np.asarray(scores, dtype=np.float64),
+        "recency": np.fromiter((to_epoch_us(c) for c in created_at), dtype=np.int64, count=len(rows)),
+        "popularity": ranker.engagement(likes, reposts, replies),
+        "velocity": np.asarray(velocity, dtype=np.float64),
+    }
+    mode = getattr(settings, "FEED_RANKING_MODE", "score")
+    _, order, _ = ranker.score_columns(columns, style=feed.ranking_style, mode=mode)
+
+    items = [FeedItem(id=ids[i], rank=position) for position, i in enumerate(order.tolist(), start=1)]
+    FeedItem.objects.bulk_update(items, ["rank"], batch_size=1000)
+    return len(items)
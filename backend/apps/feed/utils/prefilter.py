@@ -0,0 +1,86 @@
+import numpy as np
+from django.conf import settings
+
+from .curation_cache import criteria_hash
+
+# Kết quả phân loại của pre-filter
+DROP = "drop"  # Rõ ràng lạc đề: bỏ, không gọi LLM
+KEEP = "keep"  # Rõ ràng khớp: chấm điểm luôn từ độ tương đồng
+CURATE = "curate"  # Vùng không chắc chắn: gửi cho BonsaiCurator
+
+
+class EmbeddingPrefilter:
+    """
+    Lọc sơ bộ bằng embedding (all-MiniLM-L6-v2, model RAG đang dùng) trước Curator.
+
+    - cosine(post, include) < low: DROP
+    - cosine(post, include) >= high và không nghiêng về exclude: KEEP
+    - còn lại: CURATE
+    Vector của include / exclude criteria được tính một lần và lưu trên
+    PersonalFeed.criteria_embedding.
+    Tắt mặc định (FEED_PREFILTER): các ngưỡng cần được hiệu chỉnh trước khi bật.
+    """
+
+    def __init__(self, low=None, high=None, model=None):
+        self.low = low if low is not None else getattr(settings, "FEED_PREFILTER_LOW", 0.15)
+        self.high = high if high is not None else getattr(settings, "FEED_PREFILTER_HIGH", 0.6)
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            from apps.agents.rag.utils import get_model
+
+            self._model = get_model()
+        return self._model
+
+    def encode(self, texts):
+        return np.asarray(self.model.encode(list(texts), batch_size=64, normalize_embeddings=True), dtype=np.float32)
+
+    def criteria_vectors(self, feed):
+        """(include_vector, exclude_vector hoặc None), tính lại khi tiêu chí thay đổi"""
+        # Cùng hash với CurationCache: vector đã lưu còn đúng khi tiêu chí (đã chuẩn hóa) không đổi
+        key = criteria_hash({"include_criteria": feed.include_criteria, "exclude_criteria": feed.exclude_criteria})
+        cached = feed.criteria_embedding or {}
+
+        if cached.get("key") != key:
+            texts = [feed.include_criteria or feed.user_intent]
+            if feed.exclude_criteria.strip():
+                texts.append(feed.exclude_criteria)
+            vectors = self.encode(texts)
+            cached = {
+                "key": key,
+                "include": [round(float(x), 5) for x in vectors[0]],
+                "exclude": [round(float(x), 5) for x in vectors[1]] if len(vectors) > 1 else None,
+            }
+            feed.criteria_embedding = cached
+            feed.save(update_fields=["criteria_embedding"])
+
+        include = np.asarray(cached["include"], dtype=np.float32)
+        exclude = np.asarray(cached["exclude"], dtype=np.float32) if cached.get("exclude") else None
+        return include, exclude
+
+    def classify(self, feed, contents):
+        """List (decision, cosine với include) cho từng nội dung, embed cả lô một lần"""
+        if not contents:
+            return []
+
+        include, exclude = self.criteria_vectors(feed)
+        posts = self.encode(contents)
+        inc_scores = posts @ include
+        exc_scores = posts @ exclude if exclude is not None else np.full(len(contents), -1.0)
+
+        results = []
+        for inc, exc in zip(inc_scores.tolist(), exc_scores.tolist()):
+            if inc < self.low:
+                results.append((DROP, inc))
+            elif inc >= self.high and exc < inc:
+                results.append((KEEP, inc))
+            else:
+                results.append((CURATE, inc))
+        return results
+
+    def score(self, similarity: float) -> int:
+        """Điểm 7-10 (thang Curator) cho bài KEEP, theo độ tương đồng trong [high, 1]"""
+        span = max(1.0 - self.high, 1e-6)
+        return int(round(7 + 3 * min(max((similarity - self.high) / span, 0.0), 1.0)))
@@ -1,4 +1,58 @@
-from datetime import datetime
+import math
+import time
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+# Tên tín hiệu mặc định, theo thứ tự của presets
+SIGNALS = ("relevance", "recency", "popularity")
+
+BORDA = "borda"  # Weighted Borda Count trên thứ hạng của từng tín hiệu
+SCORE = "score"  # Tổng có trọng số của các đặc trưng liên tục, chuẩn hóa về [0, 1]
+
+# Chu kỳ bán rã (giờ) của time decay trong chế độ SCORE
+HALF_LIFE_HOURS = {"fresh": 12.0, "trending": 24.0}
+DEFAULT_HALF_LIFE_HOURS = 48.0
+
+US_PER_HOUR = 3_600_000_000
+
+
+def to_epoch_us(value) -> int:
+    """created_at (datetime, date hoặc chuỗi ISO 8601) -> microseconds từ epoch (UTC); thiếu / lỗi -> 0"""
+    if not value:
+        return 0
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.strip())
+        elif isinstance(value, date) and not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1_000_000)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def borda_points(values) -> np.ndarray:
+    """
+    Điểm Borda cho một tín hiệu (càng lớn càng tốt): bài thấp nhất 1 điểm, cao nhất N điểm.
+    Các bài bằng nhau nhận trung bình điểm của nhóm (tie-aware), không phụ thuộc thứ tự đầu vào.
+    """
+    values = np.asarray(values)
+    n = len(values)
+    if n == 0:
+        return np.zeros(0)
+
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    # Vị trí bắt đầu của từng nhóm giá trị bằng nhau
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    group_points = starts + (counts + 1) / 2.0
+
+    points = np.empty(n)
+    points[order] = np.repeat(group_points, counts)
+    return points
 
 
 class BonsaiRanker:
@@ -11,6 +65,14 @@ class BonsaiRanker:
             "trending": (0.1, 0.2, 0.7),  # Ưu tiên tin nhiều tương tác
             "balanced": (0.34, 0.33, 0.33),  # Cân bằng
         }
+        # Trọng số cho chế độ SCORE: "velocity" (tương tác / giờ giữa hai lần refresh)
+        # thay phần lớn engagement tích lũy, để bài viral nhưng đã cũ không chiếm đầu feed
+        self.score_presets = {
+            "focused": {"relevance": 0.6, "recency": 0.2, "popularity": 0.1, "velocity": 0.1},
+            "fresh": {"relevance": 0.2, "recency": 0.6, "popularity": 0.05, "velocity": 0.15},
+            "trending": {"relevance": 0.1, "recency": 0.2, "popularity": 0.2, "velocity": 0.5},
+            "balanced": {"relevance": 0.34, "recency": 0.26, "popularity": 0.2, "velocity": 0.2},
+        }
 
     def calculate_engagement(self, post):
         """Công thức: Likes + 3*Reposts + 2*Replies"""
@@ -19,64 +81,126 @@ class BonsaiRanker:
         replies = post.get("reply_count", 0)
         return likes + (3 * reposts) + (2 * replies)
 
-    def get_rank_map(self, posts, key_func, reverse=True):
-        """Hàm phụ trợ: Trả về dictionary {post_id: rank_point}"""
-        # Sắp xếp list
-        sorted_posts = sorted(posts, key=key_func, reverse=reverse)
-        # Gán điểm rank: Bài đứng nhất được N điểm, bài cuối được 1 điểm
+    def get_weights(self, style="balanced", weights=None, mode=BORDA):
+        """Trọng số {signal: w}: preset theo style (và mode), ghi đè / bổ sung bằng weights"""
+        if mode == SCORE:
+            merged = dict(self.score_presets.get(style, self.score_presets["balanced"]))
+        else:
+            merged = dict(zip(SIGNALS, self.presets.get(style, self.presets["balanced"])))
+        merged.update(weights or {})
+        return merged
+
+    def to_columns(self, posts):
+        """Chuyển list bài viết thành các mảng cột (chỉ duyệt Python một lần)"""
         n = len(posts)
-        rank_map = {}
-        for idx, post in enumerate(sorted_posts):
-            rank_map[post["uri"]] = n - idx
-        return rank_map
+        relevance = np.fromiter((p.get("curator_score") or 0 for p in posts), dtype=np.float64, count=n)
+        created_at = np.fromiter((to_epoch_us(p.get("created_at")) for p in posts), dtype=np.int64, count=n)
+        metrics = np.array(
+            [(p.get("like_count") or 0, p.get("repost_count") or 0, p.get("reply_count") or 0) for p in posts],
+            dtype=np.float64,
+        ).reshape(n, 3)
+        return {
+            "relevance": relevance,
+            "recency": created_at,
+            "popularity": self.engagement(metrics[:, 0], metrics[:, 1], metrics[:, 2]),
+            "velocity": np.fromiter((p.get("engagement_velocity") or 0 for p in posts), dtype=np.float64, count=n),
+        }
 
-    def rank_posts(self, posts, style="balanced"):
+    @staticmethod
+    def engagement(likes, reposts, replies) -> np.ndarray:
+        """calculate_engagement cho cả mảng"""
+        return np.asarray(likes, dtype=np.float64) + 3 * np.asarray(reposts) + 2 * np.asarray(replies)
+
+    @staticmethod
+    def time_decay(created_at_us, half_life_hours, now_us=None) -> np.ndarray:
+        """exp(-ln2 * tuổi / half_life): 1 với bài vừa đăng, 0.5 sau một chu kỳ; thiếu thời gian -> 0"""
+        created_at_us = np.asarray(created_at_us, dtype=np.int64)
+        now_us = now_us if now_us is not None else int(time.time() * 1_000_000)
+        age_hours = np.maximum(now_us - created_at_us, 0) / US_PER_HOUR
+        decay = np.exp(-math.log(2) * age_hours / half_life_hours)
+        return np.where(created_at_us > 0, decay, 0.0)
+
+    @staticmethod
+    def log_scale(values) -> np.ndarray:
+        """log1p rồi chia cho max: đưa engagement / velocity (phân phối đuôi dài) về [0, 1]"""
+        scaled = np.log1p(np.maximum(np.asarray(values, dtype=np.float64), 0))
+        top = scaled.max() if len(scaled) else 0.0
+        return scaled / top if top > 0 else scaled
+
+    @staticmethod
+    def min_max(values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return values
+        low, high = values.min(), values.max()
+        return (values - low) / (high - low) if high > low else np.zeros(len(values))
+
+    def score_features(self, columns, style="balanced", now_us=None):
+        """Đặc trưng liên tục trong [0, 1] cho chế độ SCORE"""
+        features = {}
+        for signal, values in columns.items():
+            if signal == "relevance":
+                features[signal] = np.clip(np.asarray(values, dtype=np.float64) / 10.0, 0, 1)
+            elif signal == "recency":
+                half_life = HALF_LIFE_HOURS.get(style, DEFAULT_HALF_LIFE_HOURS)
+                features[signal] = self.time_decay(values, half_life, now_us)
+            elif signal in ("popularity", "velocity"):
+                features[signal] = self.log_scale(values)
+            else:
+                features[signal] = self.min_max(values)
+        return features
+
+    def score_columns(self, columns, style="balanced", weights=None, mode=BORDA, now_us=None):
+        """
+        Xếp hạng trên các cột tín hiệu.
+        columns: {signal: mảng giá trị (càng lớn càng tốt; "recency" là epoch microseconds)};
+        chỉ tính các signal có trọng số.
+        - mode BORDA: Weighted Borda Count trên thứ hạng của từng tín hiệu.
+        - mode SCORE: tổng có trọng số của đặc trưng liên tục (time decay, log engagement, velocity).
+        Trả về (final_score, order giảm dần, {signal: điểm Borda hoặc đặc trưng}).
         """
-        Thuật toán Weighted Borda Count [cite: 816, 820]
+        weights = self.get_weights(style, weights, mode)
+        n = len(next(iter(columns.values()))) if columns else 0
+        features = self.score_features(columns, style, now_us) if mode == SCORE else None
+
+        final_score = np.zeros(n)
+        points = {}
+        for signal, w in weights.items():
+            if not w or signal not in columns:
+                continue
+            points[signal] = features[signal] if features is not None else borda_points(columns[signal])
+            final_score += w * points[signal]
+
+        order = np.argsort(-final_score, kind="stable")
+        return final_score, order, points
+
+    def rank_posts(self, posts, style="balanced", weights=None, extra_signals=None, mode=BORDA):
+        """
+        Thuật toán Weighted Borda Count [cite: 816, 820], vector hóa bằng NumPy.
+        - weights: ghi đè / bổ sung trọng số preset, ví dụ {"recency": 0.5, "quality": 0.2}
+        - extra_signals: {signal: list giá trị theo thứ tự posts} cho các tín hiệu thêm
+        - mode: BORDA (mặc định) hoặc SCORE (score fusion, xem score_columns)
         """
         if not posts:
             return []
 
-        # Lấy trọng số
-        w_rel, w_rec, w_pop = self.presets.get(style, self.presets["balanced"])
-        print(
-            f"⚖️ Đang xếp hạng theo style '{style}': w_rel={w_rel}, w_rec={w_rec}, w_pop={w_pop}"
-        )
-
-        # 1. Tính Rank cho từng tiêu chí
-        # Rank by Relevance (Điểm Curator chấm)
-        rank_rel = self.get_rank_map(
-            posts, key_func=lambda x: x.get("curator_score", 0)
-        )
+        columns = self.to_columns(posts)
+        for signal, values in (extra_signals or {}).items():
+            columns[signal] = np.asarray(values, dtype=np.float64)
 
-        # Rank by Recency (Thời gian tạo)
-        rank_rec = self.get_rank_map(posts, key_func=lambda x: x.get("created_at", ""))
+        final_score, order, points = self.score_columns(columns, style, weights, mode)
+        print(f"⚖️ Đang xếp hạng {len(posts)} bài theo style '{style}' ({mode}): {self.get_weights(style, weights, mode)}")
 
-        # Rank by Popularity (Engagement Score)
-        rank_pop = self.get_rank_map(
-            posts, key_func=lambda x: self.calculate_engagement(x)
-        )
-
-        # 2. Tính điểm tổng hợp (Weighted Sum)
+        # Lưu kết quả để hiển thị
         ranked_posts = []
-        for post in posts:
-            uri = post["uri"]
-
-            # Lấy điểm rank của bài post này ở từng tiêu chí
-            r_rel = rank_rel.get(uri, 0)
-            r_rec = rank_rec.get(uri, 0)
-            r_pop = rank_pop.get(uri, 0)
-
-            # Công thức Borda
-            final_score = (w_rel * r_rel) + (w_rec * r_rec) + (w_pop * r_pop)
-
-            # Lưu kết quả để hiển thị
-            post["final_score"] = round(final_score, 2)
-            post["debug_ranks"] = f"(Rel:{r_rel}, Rec:{r_rec}, Pop:{r_pop})"
+        for i in order.tolist():
+            post = posts[i]
+            post["final_score"] = round(float(final_score[i]), 2)
+            post["debug_ranks"] = "(" + ", ".join(
+                f"{signal[:3].capitalize()}:{points[signal][i]:g}" for signal in points
+            ) + ")"
             ranked_posts.append(post)
-
-        # 3. Sắp xếp lại danh sách lần cuối theo Final Score
-        return sorted(ranked_posts, key=lambda x: x["final_score"], reverse=True)
+        return ranked_posts
 
 
 # --- PHẦN TEST CHẠY THỬ ---
@@ -0,0 +1,255 @@
+import math
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.agents.rag.cache import is_shared_cache
+
+from .sourcer import GET_POSTS_BATCH, INCREMENTAL_MAX_PAGES, INCREMENTAL_PAGE_SIZE, METRICS_REFRESH_MAX_POSTS
+from .curator import BATCH_MAX_POSTS
+
+# Số video TikTok lấy cho mỗi query (fetch_tiktok_videos max_items)
+TIKTOK_ITEMS_PER_QUERY = 3
+
+# Ngân sách mặc định: {tên dịch vụ: (số call, trong bao nhiêu giây)}
+DEFAULT_RATE_BUDGETS = {
+    "bluesky": (1000, 3600),
+    "openai": (3000, 3600),
+    "apify": (20, 3600),
+    "gemini": (100, 3600),
+}
+
+_local_cache_warned = False
+
+
+def shared_cache():
+    """
+    True nếu cache default dùng chung giữa các process (Redis, Memcached, DB...).
+    Với LocMemCache / DummyCache, việc gộp refresh và ngân sách call bị tắt thay vì
+    chạy sai (mỗi worker một bộ đếm riêng, khóa không thấy nhau).
+    """
+    global _local_cache_warned
+    if is_shared_cache():
+        return True
+    if not _local_cache_warned:
+        _local_cache_warned = True
+        print("⚠️ Cache không dùng chung giữa các worker: tắt gộp refresh và ngân sách call (cần REDIS_URL)")
+    return False
+
+
+class RateBudget:
+    """
+    Ngân sách call dùng chung cho mọi worker (Django cache / Redis), theo cửa sổ cố định:
+    tối đa `limit` call mỗi `period` giây.
+    """
+
+    def __init__(self, name, limit, period):
+        self.name = name
+        self.limit = limit
+        self.period = period
+
+    def _key(self, now=None):
+        window = int((now or timezone.now()).timestamp() // self.period)
+        return f"feed:budget:{self.name}:{window}"
+
+    def used(self):
+        if not shared_cache():
+            return 0
+        return cache.get(self._key()) or 0
+
+    def try_acquire(self, cost=1):
+        """Trừ `cost` call khỏi ngân sách; False (và hoàn lại) nếu vượt limit"""
+        if cost <= 0 or not shared_cache():
+            return True
+        key = self._key()
+        cache.add(key, 0, timeout=self.period * 2)
+        try:
+            used = cache.incr(key, cost)
+        except ValueError:
+            # Key vừa hết hạn giữa add và incr
+            cache.add(key, 0, timeout=self.period * 2)
+            used = cache.incr(key, cost)
+        if used > self.limit:
+            cache.decr(key, cost)
+            return False
+        return True
+
+    def release(self, cost=1):
+        if not shared_cache():
+            return
+        try:
+            cache.decr(self._key(), cost)
+        except ValueError:
+            pass
+
+
+def get_budgets():
+    budgets = {**DEFAULT_RATE_BUDGETS, **getattr(settings, "FEED_RATE_BUDGETS", {})}
+    return {name: RateBudget(name, limit, period) for name, (limit, period) in budgets.items()}
+
+
+def estimate_refresh_cost(feed):
+    """Số call (ước lượng tối đa) một lần refresh feed sẽ dùng, theo từng dịch vụ"""
+    queries = max(len(feed.search_queries or []), 1)
+    if feed.platform == "tiktok":
+        return {"apify": 1, "gemini": queries * TIKTOK_ITEMS_PER_QUERY}
+    max_posts = queries * INCREMENTAL_MAX_PAGES * INCREMENTAL_PAGE_SIZE
+    return {
+        # Search + làm mới metrics các bài đã lưu
+        "bluesky": queries * INCREMENTAL_MAX_PAGES + math.ceil(METRICS_REFRESH_MAX_POSTS / GET_POSTS_BATCH),
+        # Planner (lần đầu) + các lô Curator
+        "openai": 1 + math.ceil(max_posts / BATCH_MAX_POSTS),
+    }
+
+
+def reserve_budgets(costs, budgets=None):
+    """Giữ chỗ tất cả ngân sách cần thiết, hoặc không giữ gì cả (trả về False)"""
+    budgets = budgets or get_budgets()
+    acquired = []
+    for name, cost in costs.items():
+        budget = budgets.get(name)
+        if budget is None:
+            continue
+        if not budget.try_acquire(cost):
+            for done, done_cost in acquired:
+                done.release(done_cost)
+            return False
+        acquired.append((budget, cost))
+    return True
+
+
+def release_budgets(costs, budgets=None):
+    """Hoàn lại ngân sách đã giữ chỗ bằng reserve_budgets"""
+    budgets = budgets or get_budgets()
+    for name, cost in costs.items():
+        if name in budgets:
+            budgets[name].release(cost)
+
+
+def exhausted_budgets(costs, budgets=None):
+    """Tên các ngân sách không còn đủ cho costs"""
+    budgets = budgets or get_budgets()
+    return {
+        name for name, cost in costs.items()
+        if name in budgets and budgets[name].used() + cost > budgets[name].limit
+    }
+
+
+# --- Gộp các yêu cầu refresh trùng nhau cho cùng một feed ---
+
+def _refresh_key(feed_id):
+    return f"feed:refresh:{feed_id}"
+
+
+def _lock_timeout():
+    return getattr(settings, "CELERY_TASK_TIME_LIMIT", 1800) + getattr(settings, "FEED_REFRESH_JITTER_SECONDS", 240)
+
+
+def claim_refresh(feed_id):
+    """Token nếu chưa có refresh nào của feed đang chờ / đang chạy, ngược lại None"""
+    token = uuid.uuid4().hex
+    if not shared_cache():
+        return token
+    return token if cache.add(_refresh_key(feed_id), token, timeout=_lock_timeout()) else None
+
+
+def owns_refresh(feed_id, token):
+    if token is None:
+        return False
+    return not shared_cache() or cache.get(_refresh_key(feed_id)) == token
+
+
+def hold_refresh(feed_id, token):
+    """
+    Giữ quyền refresh cho token khi task bắt đầu chạy (hoặc trước khi retry).
+    Khóa đã hết hạn / bị evict thì nhận lại bằng cache.add và gia hạn; chỉ trả về False
+    khi một token KHÁC đang giữ khóa (yêu cầu này được gộp vào refresh đó).
+    """
+    if token is None:
+        return False
+    if not shared_cache():
+        return True
+    key = _refresh_key(feed_id)
+    if cache.add(key, token, timeout=_lock_timeout()):
+        return True
+    if cache.get(key) != token:
+        return False
+    cache.touch(key, timeout=_lock_timeout())
+    return True
+
+
+def release_refresh(feed_id, token):
+    if shared_cache() and owns_refresh(feed_id, token):
+        cache.delete(_refresh_key(feed_id))
+
+
+def enqueue_refresh(feed, jitter_seconds=0, reserved=False):
+    """
+    Đẩy update_feed_task cho feed, trừ khi đã có một refresh đang chờ / đang chạy.
+    Trả về AsyncResult, hoặc None nếu yêu cầu được gộp vào refresh đang có.
+    """
+    from ..tasks import update_feed_task
+
+    token = claim_refresh(feed.id)
+    if token is None:
+        return None
+    countdown = random.uniform(0, jitter_seconds) if jitter_seconds else 0
+    return update_feed_task.apply_async(
+        args=[feed.id], kwargs={"token": token, "reserved": reserved}, countdown=countdown
+    )
+
+
+# --- Xếp hạng lại ngoài luồng đọc ---
+
+# Trong khoảng này, các lần đọc feed chưa xếp hạng chỉ đẩy một rank_feed_task
+RANK_ENQUEUE_SECONDS = 300
+
+
+def enqueue_ranking(feed):
+    """Đẩy rank_feed_task cho feed, trừ khi vừa đẩy trong RANK_ENQUEUE_SECONDS giây qua"""
+    from ..tasks import rank_feed_task
+
+    if not cache.add(f"feed:rank:{feed.id}", 1, timeout=RANK_ENQUEUE_SECONDS):
+        return None
+    return rank_feed_task.delay(feed.id)
+
+
+# --- Độ ưu tiên ---
+
+def refresh_backoff(feed, min_hours):
+    """Khoảng chờ tối thiểu từ lần refresh trước: nhân đôi sau mỗi lần lỗi liên tiếp (tối đa x32)"""
+    return timedelta(hours=min_hours * 2 ** min(feed.refresh_failures, 5))
+
+
+def record_refresh_failure(feed, now=None):
+    """Lưu thời điểm refresh lỗi để scheduler giãn lần thử sau (refresh_backoff)"""
+    feed.last_refreshed_at = now or timezone.now()
+    feed.refresh_failures += 1
+    try:
+        feed.save(update_fields=["last_refreshed_at", "refresh_failures"])
+    except Exception as e:
+        # Không che lỗi gốc của lần refresh
+        print(f"⚠️ Không lưu được lần refresh lỗi của feed {feed.id}: {e}")
+
+
+def refresh_priority(feed, now=None):
+    """
+    Độ ưu tiên refresh = độ cũ (giờ) x mức hoạt động của chủ feed x hiệu suất refresh trước.
+    - Hoạt động: exp(-số ngày từ lần đăng nhập cuối / 7), tối thiểu 0.05.
+    - Hiệu suất: 1 + log1p(số bài mới trung bình mỗi lần refresh).
+    """
+    now = now or timezone.now()
+    last = feed.last_refreshed_at or feed.created_at
+    staleness_hours = max((now - last).total_seconds() / 3600, 0)
+
+    last_login = feed.user.last_login
+    if last_login:
+        activity = max(math.exp(-(now - last_login).total_seconds() / 86400 / 7), 0.05)
+    else:
+        activity = 0.05
+
+    return staleness_hours * activity * (1 + math.log1p(max(feed.last_refresh_yield, 0)))
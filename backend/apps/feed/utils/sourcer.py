@@ -1,10 +1,28 @@
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from atproto import Client
 
 # Load biến môi trường
 load_dotenv()
 
+# Refresh tăng dần: số bài mỗi trang search và số trang tối đa mỗi query mỗi lần refresh
+INCREMENTAL_PAGE_SIZE = 25
+INCREMENTAL_MAX_PAGES = 3
+# Làm mới metrics của bài đã lưu: app.bsky.feed.getPosts nhận tối đa 25 URI mỗi call,
+# mỗi lần refresh feed lấy lại tối đa METRICS_REFRESH_MAX_POSTS bài
+GET_POSTS_BATCH = 25
+METRICS_REFRESH_MAX_POSTS = 100
+
+
+def _parse_time(value):
+    """created_at (ISO 8601) -> datetime UTC; lỗi -> epoch"""
+    try:
+        parsed = datetime.fromisoformat(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return datetime.fromtimestamp(0, tz=timezone.utc)
+
 
 class BonsaiSourcer:
     def __init__(self):
@@ -23,66 +41,154 @@ class BonsaiSourcer:
             print(f"❌ Lỗi đăng nhập: {e}")
             self.client = None
 
-    def get_posts_by_query(self, query, limit=10):
+    def get_posts_by_query(self, query, limit=10, cursor=None, since=None, sort=None):
         if not self.client:
             return []
         print(f"🔎 Đang tìm kiếm bài viết với từ khóa: '{query}'...")
         try:
-            data = self.client.app.bsky.feed.search_posts(
-                params={"q": query, "limit": limit}
-            )
-            results = []
-
-            for post in data.posts:
-                # 1. Lấy Metrics (Nằm ở cấp ngoài cùng của Post View)
-                # Lưu ý: 'post' ở đây là object PostView của thư viện atproto
-                like_count = getattr(post, "like_count", 0)
-                repost_count = getattr(post, "repost_count", 0)
-                reply_count = getattr(post, "reply_count", 0)
-
-                # 2. Logic Lấy Ảnh Thông Minh (Hỗ trợ cả bài thường và bài Quote)
-                images = []
-
-                # Kiểm tra 'embed' ở cấp ngoài cùng
-                if hasattr(post, "embed") and post.embed:
-                    embed = post.embed
-
-                    # Trường hợp 1: Bài có ảnh trực tiếp (app.bsky.embed.images)
-                    if hasattr(embed, "images") and embed.images:
-                        for img in embed.images:
-                            if hasattr(img, "fullsize"):
-                                images.append(img.fullsize)
+            results, _ = self._search_page(query, limit, cursor=cursor, since=since, sort=sort)
+            return results
+        except Exception as e:
+            print(f"Lỗi khi search: {e}")
+            return []
 
-                    # Trường hợp 2: Bài Quote/RecordWithMedia (app.bsky.embed.recordWithMedia)
-                    # Ảnh có thể nằm trong phần media đính kèm
-                    elif hasattr(embed, "media") and hasattr(embed.media, "images"):
-                        for img in embed.media.images:
-                            if hasattr(img, "fullsize"):
-                                images.append(img.fullsize)
+    def get_new_posts_by_query(self, query, state=None, page_size=INCREMENTAL_PAGE_SIZE, max_pages=INCREMENTAL_MAX_PAGES):
+        """
+        Chỉ lấy bài MỚI của query kể từ lần refresh trước.
+        state (lưu trên PersonalFeed.query_state[query]):
+            {"high_water": created_at mới nhất đã thấy (ISO), "boundary_uris": [uri của các bài tại mốc đó]}
+        Search sort=latest, since=high_water, phân trang bằng cursor, dừng khi gặp bài đã thấy
+        hoặc hết max_pages trang (nếu có nhiều bài mới hơn thế, phần cũ hơn bị bỏ qua).
+        Bài được lưu ngay sau khi đăng, metrics gần như bằng 0: metrics được cập nhật
+        sau bằng get_post_metrics.
+        Lần đầu (chưa có state): chỉ lấy một trang mới nhất.
+        Output: (posts, state mới, số API call)
+        """
+        if not self.client:
+            return [], state or {}, 0
 
-                    # Trường hợp 3 (Hiếm): Ảnh nằm sâu trong bài được quote (ít khi cần lấy cái này làm thumbnail chính)
-                rkey = post.uri.split("/")[-1]
-                post_url = f"https://bsky.app/profile/{post.author.handle}/post/{rkey}"
+        state = state or {}
+        high_water = state.get("high_water")
+        high_water_time = _parse_time(high_water) if high_water else None
+        boundary = set(state.get("boundary_uris") or [])
+        pages = max_pages if high_water else 1
+        print(f"🔎 Đang tìm bài mới cho từ khóa: '{query}' (since={high_water})...")
 
-                results.append(
-                    {
-                        "type": "search_result",
-                        "author": post.author.handle,
-                        "content": post.record.text,
-                        "images": images,  # List các link ảnh tìm được
-                        "created_at": post.record.created_at,
-                        "like_count": like_count,
-                        "repost_count": repost_count,
-                        "reply_count": reply_count,
-                        "uri": post.uri,
-                        "cid": post.cid,
-                        "post_url": post_url,  # <--- THÊM TRƯỜNG NÀY
-                    }
+        posts, cursor, calls = [], None, 0
+        try:
+            for _ in range(pages):
+                page, cursor = self._search_page(
+                    query, page_size, cursor=cursor, since=high_water, sort="latest"
                 )
-            return results
+                calls += 1
+
+                reached_seen = False
+                for post in page:
+                    # sort=latest: gặp bài đã thấy thì các bài sau đó cũng đã thấy
+                    if post["uri"] in boundary or (
+                        high_water_time and _parse_time(post["created_at"]) < high_water_time
+                    ):
+                        reached_seen = True
+                        break
+                    posts.append(post)
+                if reached_seen or not cursor or len(page) < page_size:
+                    break
         except Exception as e:
+            # Giữ state cũ để lần sau lấy lại từ mốc cũ
             print(f"Lỗi khi search: {e}")
-            return []
+            return posts, state, calls
+
+        return posts, self._advance_state(state, posts), calls
+
+    def get_post_metrics(self, uris, batch_size=GET_POSTS_BATCH):
+        """
+        Metrics hiện tại của các bài đã lưu (app.bsky.feed.getPosts, batch_size URI mỗi call).
+        Output: ({uri: {"like_count", "repost_count", "reply_count"}}, số API call)
+        Bài đã bị xóa không có trong kết quả.
+        """
+        if not self.client or not uris:
+            return {}, 0
+
+        metrics, calls = {}, 0
+        for start in range(0, len(uris), batch_size):
+            data = self.client.app.bsky.feed.get_posts(params={"uris": list(uris[start:start + batch_size])})
+            calls += 1
+            for post in data.posts:
+                metrics[post.uri] = {
+                    "like_count": getattr(post, "like_count", 0) or 0,
+                    "repost_count": getattr(post, "repost_count", 0) or 0,
+                    "reply_count": getattr(post, "reply_count", 0) or 0,
+                }
+        return metrics, calls
+
+    def _advance_state(self, state, posts):
+        """Dời mốc high_water tới bài mới nhất vừa lấy"""
+        if not posts:
+            return state
+        # Không để created_at ở tương lai (lệch giờ) đẩy mốc vượt quá hiện tại
+        newest = min(max(_parse_time(p["created_at"]) for p in posts), datetime.now(timezone.utc))
+        at_newest = [p["uri"] for p in posts if _parse_time(p["created_at"]) >= newest]
+        if state.get("high_water") and newest == _parse_time(state["high_water"]):
+            at_newest = list(set(at_newest) | set(state.get("boundary_uris") or []))
+        return {"high_water": newest.isoformat(), "boundary_uris": at_newest[:50]}
+
+    def _search_page(self, query, limit, cursor=None, since=None, sort=None):
+        """Một lần gọi search_posts: (list bài, cursor trang sau)"""
+        params = {"q": query, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if since:
+            params["since"] = since
+        if sort:
+            params["sort"] = sort
+
+        data = self.client.app.bsky.feed.search_posts(params=params)
+        return [self._parse_post(post) for post in data.posts], getattr(data, "cursor", None)
+
+    def _parse_post(self, post):
+        # 1. Lấy Metrics (Nằm ở cấp ngoài cùng của Post View)
+        # Lưu ý: 'post' ở đây là object PostView của thư viện atproto
+        like_count = getattr(post, "like_count", 0)
+        repost_count = getattr(post, "repost_count", 0)
+        reply_count = getattr(post, "reply_count", 0)
+
+        # 2. Logic Lấy Ảnh Thông Minh (Hỗ trợ cả bài thường và bài Quote)
+        images = []
+
+        # Kiểm tra 'embed' ở cấp ngoài cùng
+        if hasattr(post, "embed") and post.embed:
+            embed = post.embed
+
+            # Trường hợp 1: Bài có ảnh trực tiếp (app.bsky.embed.images)
+            if hasattr(embed, "images") and embed.images:
+                for img in embed.images:
+                    if hasattr(img, "fullsize"):
+                        images.append(img.fullsize)
+
+            # Trường hợp 2: Bài Quote/RecordWithMedia (app.bsky.embed.recordWithMedia)
+            # Ảnh có thể nằm trong phần media đính kèm
+            elif hasattr(embed, "media") and hasattr(embed.media, "images"):
+                for img in embed.media.images:
+                    if hasattr(img, "fullsize"):
+                        images.append(img.fullsize)
+
+            # Trường hợp 3 (Hiếm): Ảnh nằm sâu trong bài được quote (ít khi cần lấy cái này làm thumbnail chính)
+        rkey = post.uri.split("/")[-1]
+        post_url = f"https://bsky.app/profile/{post.author.handle}/post/{rkey}"
+
+        return {
+            "type": "search_result",
+            "author": post.author.handle,
+            "content": post.record.text,
+            "images": images,  # List các link ảnh tìm được
+            "created_at": post.record.created_at,
+            "like_count": like_count,
+            "repost_count": repost_count,
+            "reply_count": reply_count,
+            "uri": post.uri,
+            "cid": post.cid,
+            "post_url": post_url,  # <--- THÊM TRƯỜNG NÀY
+        }
 
     def get_posts_by_author(self, author_handle, limit=10):
         """
@@ -1,5 +1,6 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from drf_spectacular.utils import (
     extend_schema,
@@ -10,7 +11,17 @@ from drf_spectacular.utils import (
 
 from .models import PersonalFeed, FeedItem
 from .serializers import PersonalFeedSerializer, FeedItemSerializer
-from .tasks import update_feed_task
+from .tasks import rank_feed_task
+from .utils.scheduling import enqueue_ranking, enqueue_refresh
+
+
+class RankedFeedPagination(CursorPagination):
+    """Phân trang theo con trỏ trên FeedItem.rank (index (feed, rank)): mỗi trang tốn như nhau"""
+
+    ordering = "rank"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
 
 
 class BaseFeedViewSet(viewsets.ModelViewSet):
@@ -23,9 +34,19 @@ class BaseFeedViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        old_style = serializer.instance.ranking_style
+        feed = serializer.save()
+        # Đổi ranking_style: tính lại thứ hạng đã lưu
+        if feed.ranking_style != old_style:
+            rank_feed_task.delay(feed.id)
+
     @extend_schema(
         summary="Kích hoạt Crawl (Refresh)",
-        description="API này sẽ đẩy một task vào RabbitMQ để worker chạy ngầm. Trả về Task ID ngay lập tức.",
+        description=(
+            "API này sẽ đẩy một task vào RabbitMQ để worker chạy ngầm. Trả về Task ID ngay lập tức. "
+            "Nếu feed đã có refresh đang chờ / đang chạy, yêu cầu được gộp vào đó (task_id = null)."
+        ),
         request=None,  # Báo cho Swagger biết không cần gửi body
         responses={
             202: OpenApiResponse(description="Task đã được queued thành công"),
@@ -35,11 +56,11 @@ class BaseFeedViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"])
     def refresh(self, request, pk=None):
         feed = self.get_object()
-        task = update_feed_task.delay(feed.id)
+        task = enqueue_refresh(feed)
         return Response(
             {
-                "status": "queued",
-                "task_id": task.id,
+                "status": "queued" if task else "already_queued",
+                "task_id": task.id if task else None,
                 "message": f"Đang crawl dữ liệu cho {feed.title}...",
             },
             status=status.HTTP_202_ACCEPTED,
@@ -61,6 +82,34 @@ class BaseFeedViewSet(viewsets.ModelViewSet):
         serializer = FeedItemSerializer(items, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Lấy feed đã xếp hạng (Ranked, phân trang)",
+        description=(
+            "Các bài viết theo thứ hạng BonsaiRanker (ranking_style của feed), "
+            "được tính sẵn sau mỗi lần refresh. Phân trang bằng cursor (`next` / `previous`). "
+            "Bài chưa được xếp hạng sẽ xuất hiện sau khi worker xếp hạng xong."
+        ),
+        parameters=[
+            OpenApiParameter("cursor", str, description="Con trỏ trang (lấy từ `next` / `previous`)"),
+            OpenApiParameter("page_size", int, description="Số bài mỗi trang (mặc định 20, tối đa 100)"),
+        ],
+        responses={200: FeedItemSerializer(many=True)},
+    )
+    @action(detail=True, methods=["get"])
+    def ranked(self, request, pk=None):
+        feed = self.get_object()
+        items = FeedItem.objects.filter(feed=feed)
+
+        # Còn bài chưa có rank (feed cũ): xếp hạng ở worker, không ghi trong request đọc.
+        # Trang hiện tại dùng rank đã lưu (NULL xếp cuối), để cursor không bị lệch giữa các trang
+        if items.filter(rank__isnull=True).exists():
+            enqueue_ranking(feed)
+
+        paginator = RankedFeedPagination()
+        page = paginator.paginate_queryset(items.select_related("post"), request, view=self)
+        serializer = FeedItemSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 
 # --- API RIÊNG CHO BLUESKY (POSTS) ---
 @extend_schema(tags=["Bluesky Posts"])  # Gom nhóm trong Swagger
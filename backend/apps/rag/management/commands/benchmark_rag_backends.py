@@ -0,0 +1,157 @@
+"""
+Management command to compare RAG storage backends (Milvus vs local NumPy).
+
+Both backends receive the same synthetic per-user corpus and queries; the
+benchmark measures insert time and filtered search latency through the
+`VectorStore` interface used by `query_items`.
+"""
+
+import tempfile
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.agents.rag.filters import user_items_filter
+from apps.agents.rag.stores import LocalStore, MilvusStore
+
+DIM = 384
+PLATFORMS = ["tiktok", "bluesky", "facebook"]
+
+
+class Command(BaseCommand):
+    """Benchmark insert and search latency of the RAG backends"""
+
+    help = "Compare the Milvus and local RAG vector store backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            choices=['milvus', 'local'],
+            default=['milvus', 'local'],
+            help='Backends to benchmark (default: both)'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=20,
+            help='Number of synthetic users (default: 20)'
+        )
+        parser.add_argument(
+            '--items-per-user',
+            type=int,
+            default=500,
+            help='Saved items per user (default: 500)'
+        )
+        parser.add_argument(
+            '--num-queries',
+            type=int,
+            default=200,
+            help='Number of searches (default: 200)'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=5,
+            help='Results per search (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark"""
+        rng = np.random.default_rng(7)
+        rows = self._synthetic_rows(rng, options['users'], options['items_per_user'])
+        queries = [
+            (str(rng.integers(options['users'])), rng.normal(size=DIM).tolist(),
+             PLATFORMS[rng.integers(len(PLATFORMS))] if rng.random() < 0.5 else None)
+            for _ in range(options['num_queries'])
+        ]
+
+        self.stdout.write(
+            f"📐 {options['users']} users x {options['items_per_user']} items, "
+            f"{len(queries)} queries, k={options['top_k']}"
+        )
+        self.stdout.write(f"{'backend':<10}{'insert s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        self.stdout.write("-" * 50)
+
+        for backend in options['backends']:
+            try:
+                with self._store(backend) as store:
+                    self._bench(backend, store, rows, queries, options['top_k'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {backend} failed: {e}"))
+
+    def _bench(self, backend, store, rows, queries, top_k):
+        started = time.perf_counter()
+        for start in range(0, len(rows), 2000):
+            store.insert(rows[start:start + 2000])
+        insert_seconds = time.perf_counter() - started
+
+        # Warm-up: loads the collection / memory-maps the matrix
+        user_id, vector, _ = queries[0]
+        store.search(vector, user_items_filter(user_id), top_k)
+
+        latencies = []
+        for user_id, vector, platform in queries:
+            filters = user_items_filter(user_id, platform=platform)
+            t0 = time.perf_counter()
+            store.search(vector, filters, top_k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        self.stdout.write(
+            f"{backend:<10}{insert_seconds:>10.2f}{np.percentile(latencies, 50):>10.3f}"
+            f"{np.percentile(latencies, 95):>10.3f}{np.percentile(latencies, 99):>10.3f}"
+        )
+
+    def _store(self, backend):
+        if backend == 'local':
+            return _LocalBenchStore()
+        return _MilvusBenchStore()
+
+    def _synthetic_rows(self, rng, users, items_per_user):
+        now = int(time.time())
+        rows = []
+        for user in range(users):
+            vectors = rng.normal(size=(items_per_user, DIM)).astype(np.float32)
+            for i, vector in enumerate(vectors):
+                rows.append({
+                    "content_id": f"bench_{user}_{i}",
+                    "user_id": str(user),
+                    "platform": PLATFORMS[i % len(PLATFORMS)],
+                    "summary": f"benchmark item {i} of user {user}",
+                    "timestamp": now - i * 3600,
+                    "chunk_index": 0,
+                    "embedding": vector.tolist(),
+                })
+        return rows
+
+
+class _LocalBenchStore:
+    """LocalStore in a temporary directory"""
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix="rag_bench_")
+        return LocalStore(self._tmp.name)
+
+    def __exit__(self, *exc):
+        self._tmp.cleanup()
+
+
+class _MilvusBenchStore:
+    """MilvusStore on a throw-away collection with the production schema"""
+
+    name = "rag_bench_backend"
+
+    def __enter__(self):
+        from pymilvus import utility
+        from apps.agents.rag import milvus_setup
+
+        if self.name in utility.list_collections():
+            utility.drop_collection(self.name)
+        collection = milvus_setup.create_collection(self.name)
+        collection.load()
+        return MilvusStore(collection)
+
+    def __exit__(self, *exc):
+        from pymilvus import utility
+
+        utility.drop_collection(self.name)
@@ -0,0 +1,194 @@
+"""
+Management command to benchmark Milvus index profiles (recall@k vs latency).
+
+Each profile is built on a throw-away collection over the same corpus and
+compared against exact (brute-force) cosine neighbours computed with NumPy.
+"""
+
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.agents.rag.config import INDEX_PROFILES, SEARCH_KNOBS
+
+DIM = 384
+
+
+class Command(BaseCommand):
+    """Benchmark recall@k and search latency of the RAG index profiles"""
+
+    help = "Offline recall@k vs latency benchmark for RAG index profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            default=['hnsw', 'ivf_flat', 'ivf_sq8'],
+            help=f"Profiles to benchmark (available: {', '.join(INDEX_PROFILES.keys())})"
+        )
+        parser.add_argument(
+            '--corpus',
+            choices=['synthetic', 'export'],
+            default='synthetic',
+            help='Use a clustered synthetic corpus or vectors exported from COLLECTION_NAME'
+        )
+        parser.add_argument(
+            '--num-vectors',
+            type=int,
+            default=20000,
+            help='Corpus size (default: 20000)'
+        )
+        parser.add_argument(
+            '--num-queries',
+            type=int,
+            default=200,
+            help='Number of queries (default: 200)'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='k for recall@k (default: 10)'
+        )
+        parser.add_argument(
+            '--sweep',
+            nargs='+',
+            type=int,
+            help="Values for the profile's search knob (ef / nprobe / search_list)"
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the benchmark collections instead of dropping them'
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark"""
+        from apps.agents.rag import milvus_setup  # noqa: F401 - opens the Milvus connection
+
+        top_k = options['top_k']
+        rng = np.random.default_rng(42)
+
+        if options['corpus'] == 'export':
+            corpus = self._export_corpus(options['num_vectors'])
+            if corpus is None:
+                return
+        else:
+            corpus = self._synthetic_corpus(rng, options['num_vectors'])
+
+        queries = corpus[rng.choice(len(corpus), size=options['num_queries'])]
+        queries = _normalize(queries + rng.normal(scale=0.05, size=queries.shape))
+
+        self.stdout.write(f"📐 Corpus: {len(corpus)} vectors, {len(queries)} queries, k={top_k}")
+        truth = _exact_top_k(corpus, queries, top_k)
+
+        self.stdout.write(f"{'profile':<12}{'param':<18}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}")
+        self.stdout.write("-" * 70)
+        for profile_name in options['profiles']:
+            if profile_name not in INDEX_PROFILES:
+                self.stdout.write(self.style.ERROR(f"❌ Unknown profile: {profile_name}"))
+                continue
+            try:
+                self._bench_profile(profile_name, corpus, queries, truth, top_k,
+                                    options.get('sweep'), options['keep'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {profile_name} failed: {e}"))
+
+    def _bench_profile(self, profile_name, corpus, queries, truth, top_k, sweep, keep):
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+        profile = INDEX_PROFILES[profile_name]
+        name = f"rag_bench_{profile_name}"
+        if name in utility.list_collections():
+            utility.drop_collection(name)
+
+        schema = CollectionSchema([
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=DIM),
+        ])
+        collection = Collection(name, schema)
+        try:
+            started = time.perf_counter()
+            for start in range(0, len(corpus), 5000):
+                batch = corpus[start:start + 5000]
+                collection.insert([list(range(start, start + len(batch))), batch.tolist()])
+            collection.flush()
+            collection.create_index(field_name="embedding", index_params=profile["index_params"])
+            collection.load()
+            build_seconds = time.perf_counter() - started
+
+            base_params = profile["search_params"]
+            knob = SEARCH_KNOBS.get(profile["index_params"]["index_type"])
+            variants = [base_params["params"]]
+            if sweep and knob:
+                variants = [{**base_params["params"], knob: value} for value in sweep]
+
+            for params in variants:
+                search_params = {"metric_type": base_params["metric_type"], "params": params}
+                # Warm-up so the first timed query does not pay the load cost
+                collection.search(data=[queries[0].tolist()], anns_field="embedding",
+                                  param=search_params, limit=top_k)
+
+                latencies, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    t0 = time.perf_counter()
+                    results = collection.search(data=[query.tolist()], anns_field="embedding",
+                                                param=search_params, limit=top_k)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    found = {hit.id for hit in results[0]}
+                    recalls.append(len(found & set(expected.tolist())) / top_k)
+
+                label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+                self.stdout.write(
+                    f"{profile_name:<12}{label:<18}{np.mean(recalls):>10.3f}"
+                    f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}"
+                    f"{build_seconds:>10.1f}"
+                )
+        finally:
+            if not keep:
+                utility.drop_collection(name)
+
+    def _synthetic_corpus(self, rng, num_vectors):
+        """Clustered Gaussian vectors, closer to real embeddings than uniform noise"""
+        centers = rng.normal(size=(max(num_vectors // 200, 8), DIM))
+        labels = rng.integers(len(centers), size=num_vectors)
+        vectors = centers[labels] + rng.normal(scale=0.6, size=(num_vectors, DIM))
+        return _normalize(vectors).astype(np.float32)
+
+    def _export_corpus(self, num_vectors):
+        """Embeddings exported from the live RAG collection"""
+        from apps.agents.rag.utils import get_collection
+
+        collection = get_collection()
+        if collection is None:
+            self.stdout.write(self.style.ERROR("❌ Milvus collection is not available"))
+            return None
+
+        vectors = []
+        iterator = collection.query_iterator(batch_size=1000, limit=num_vectors,
+                                             output_fields=["embedding"])
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                vectors.extend(row["embedding"] for row in batch)
+        finally:
+            iterator.close()
+
+        if not vectors:
+            self.stdout.write(self.style.ERROR("❌ Collection is empty, nothing to export"))
+            return None
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def _normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _exact_top_k(corpus, queries, k):
+    """Ground-truth neighbour ids by brute-force cosine similarity"""
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
@@ -0,0 +1,129 @@
+"""
+Management command to remove duplicate and stale rows from the RAG collection.
+
+Before inserts became upserts, re-saving a post appended another copy of its
+vectors. Rows are grouped by (user_id, content_id, chunk_index) and only the
+newest row of each group is kept (highest timestamp, then highest id).
+With --prune-unsaved, items whose UserSavedItem no longer exists are removed too.
+"""
+
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+
+from apps.agents.rag.cache import invalidate_user
+from apps.agents.rag.filters import MilvusFilter
+
+SCAN_FIELDS = ["id", "user_id", "content_id", "chunk_index", "timestamp"]
+
+
+class Command(BaseCommand):
+    """Delete duplicate (user_id, content_id, chunk_index) rows in bulk"""
+
+    help = "Compact the Milvus RAG collection by removing duplicate and unsaved items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collection',
+            type=str,
+            help='Collection to compact (default: COLLECTION_NAME)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows scanned / deleted per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--prune-unsaved',
+            action='store_true',
+            help='Also delete items that are no longer in any user\'s saved items'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted'
+        )
+
+    def handle(self, *args, **options):
+        """Run the compaction"""
+        from pymilvus import Collection, utility
+        from apps.agents.rag import milvus_setup
+
+        name = options.get('collection') or milvus_setup.COLLECTION_NAME
+        batch_size = options['batch_size']
+
+        if name not in utility.list_collections():
+            self.stdout.write(self.style.ERROR(f"❌ Collection '{name}' does not exist"))
+            return
+
+        collection = Collection(name)
+        collection.load()
+        started = time.time()
+
+        # (user_id, content_id, chunk_index) -> [(timestamp, id), ...]
+        groups = defaultdict(list)
+        scanned = 0
+        output_fields = [f for f in SCAN_FIELDS if milvus_setup.has_field(collection, f)]
+        iterator = collection.query_iterator(batch_size=batch_size, output_fields=output_fields)
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    key = (row["user_id"], row["content_id"], row.get("chunk_index") or 0)
+                    groups[key].append((row.get("timestamp") or 0, row["id"]))
+                scanned += len(batch)
+        finally:
+            iterator.close()
+
+        self.stdout.write(f"🔎 Scanned {scanned} rows, {len(groups)} distinct passages")
+
+        to_delete = []
+        affected_users = set()
+        for (user_id, _, _), rows in groups.items():
+            if len(rows) > 1:
+                rows.sort(reverse=True)
+                to_delete.extend(row_id for _, row_id in rows[1:])
+                affected_users.add(user_id)
+        duplicates = len(to_delete)
+
+        unsaved = 0
+        if options['prune_unsaved']:
+            saved = self._saved_keys()
+            for (user_id, content_id, _), rows in groups.items():
+                if (user_id, content_id) not in saved:
+                    # the newest row is the only one not already scheduled above
+                    to_delete.append(max(rows)[1])
+                    affected_users.add(user_id)
+                    unsaved += 1
+
+        self.stdout.write(
+            f"🧹 {duplicates} duplicate rows, {unsaved} unsaved passages "
+            f"across {len(affected_users)} users"
+        )
+        if options['dry_run'] or not to_delete:
+            return
+
+        for start in range(0, len(to_delete), batch_size):
+            ids = to_delete[start:start + batch_size]
+            collection.delete(expr=MilvusFilter().in_("id", ids).render())
+            self.stdout.write(f"   ✅ Deleted {start + len(ids)}/{len(to_delete)} rows")
+        collection.flush()
+
+        for user_id in affected_users:
+            invalidate_user(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Removed {len(to_delete)} rows in {time.time() - started:.1f}s"
+        ))
+
+    def _saved_keys(self):
+        """(user_id, content_id) pairs of every saved item, as stored in Milvus"""
+        from apps.saved_items.models import UserSavedItem
+
+        return {
+            (str(user_id), str(post_id))
+            for user_id, post_id in UserSavedItem.objects.values_list("user_id", "post_id")
+        }
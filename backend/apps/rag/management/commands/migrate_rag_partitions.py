@@ -0,0 +1,140 @@
+"""
+Management command to re-ingest the RAG collection into the current schema
+(`user_id` as Milvus partition key, BM25 sparse field on `summary`).
+"""
+
+import time
+from django.core.management.base import BaseCommand
+
+
+OUTPUT_FIELDS = ["content_id", "user_id", "platform", "summary", "timestamp", "chunk_index", "embedding"]
+
+
+class Command(BaseCommand):
+    """Copy every vector from a flat collection into a partition-key collection"""
+
+    help = "Re-ingest the Milvus RAG collection into a collection partitioned by user_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Collection to migrate (default: COLLECTION_NAME)'
+        )
+        parser.add_argument(
+            '--target',
+            type=str,
+            help='Name of the new partitioned collection (default: <source>_pk)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows copied per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--reembed',
+            action='store_true',
+            help='Recompute embeddings from summaries instead of copying stored vectors'
+        )
+        parser.add_argument(
+            '--swap',
+            action='store_true',
+            help='After copying, rename source to <source>_backup_<ts> and target to source'
+        )
+
+    def handle(self, *args, **options):
+        """Run the migration"""
+        from pymilvus import Collection, utility
+        from apps.agents.rag import milvus_setup
+
+        source_name = options.get('source') or milvus_setup.COLLECTION_NAME
+        target_name = options.get('target') or f"{source_name}_pk"
+        batch_size = options['batch_size']
+        reembed = options['reembed']
+
+        if source_name not in utility.list_collections():
+            self.stdout.write(self.style.ERROR(f"❌ Collection '{source_name}' does not exist"))
+            return
+
+        source = Collection(source_name)
+        if milvus_setup.is_current_schema(source):
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ '{source_name}' already uses the current schema, nothing to migrate"
+            ))
+            return
+        source.load()
+
+        if target_name in utility.list_collections():
+            target = Collection(target_name)
+            if not milvus_setup.is_current_schema(target):
+                self.stdout.write(self.style.ERROR(
+                    f"❌ Target '{target_name}' exists but does not use the current schema"
+                ))
+                return
+            self.stdout.write(f"📁 Appending into existing collection: {target_name}")
+        else:
+            target = milvus_setup.create_collection(target_name)
+
+        model = None
+        if reembed:
+            from apps.agents.rag.utils import get_model
+
+            model = get_model()
+            if model is None:
+                self.stdout.write(self.style.ERROR("❌ Embedding model is not available"))
+                return
+
+        self.stdout.write(f"🔁 Migrating '{source_name}' -> '{target_name}' (batch size {batch_size})")
+        started = time.time()
+        copied = 0
+
+        output_fields = [name for name in OUTPUT_FIELDS if milvus_setup.has_field(source, name)]
+        iterator = source.query_iterator(batch_size=batch_size, output_fields=output_fields)
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+
+                if model is not None:
+                    vectors = model.encode([row["summary"] for row in batch]).tolist()
+                else:
+                    vectors = [row["embedding"] for row in batch]
+
+                target.insert([
+                    {
+                        "content_id": row["content_id"],
+                        "user_id": row["user_id"],
+                        "platform": row["platform"],
+                        "summary": row["summary"],
+                        "timestamp": row.get("timestamp"),
+                        "chunk_index": row.get("chunk_index") or 0,
+                        "embedding": vector,
+                    }
+                    for row, vector in zip(batch, vectors)
+                ])
+                copied += len(batch)
+                self.stdout.write(f"   ✅ Copied {copied} rows")
+        finally:
+            iterator.close()
+
+        target.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Migrated {copied} rows in {time.time() - started:.1f}s"
+        ))
+
+        if options['swap']:
+            backup_name = f"{source_name}_backup_{int(time.time())}"
+            source.release()
+            utility.rename_collection(source_name, backup_name)
+            utility.rename_collection(target_name, source_name)
+            Collection(source_name).load()
+            self.stdout.write(self.style.SUCCESS(
+                f"🔀 '{target_name}' is now '{source_name}' (old data kept as '{backup_name}'). "
+                f"Restart web and worker processes to pick up the new collection."
+            ))
+        else:
+            self.stdout.write(
+                f"ℹ️ Set COLLECTION_NAME={target_name} or re-run with --swap to start using it"
+            )
@@ -0,0 +1,20 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+SERVICE_TOKEN_HEADER = "X-RAG-Service-Token"
+
+
+def is_rag_service(request) -> bool:
+    """Whether the request carries the internal RAG_SERVICE_TOKEN (Celery tasks calling the RAG API)."""
+    expected = getattr(settings, "RAG_SERVICE_TOKEN", "")
+    provided = request.headers.get(SERVICE_TOKEN_HEADER, "")
+    return bool(expected) and hmac.compare_digest(provided.encode(), expected.encode())
+
+
+class IsRagService(BasePermission):
+    """Allows internal services that send the shared RAG service token."""
+
+    def has_permission(self, request, view):
+        return is_rag_service(request)
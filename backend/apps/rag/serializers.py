@@ -3,7 +3,8 @@ from rest_framework import serializers
 
 class ItemDataSerializer(serializers.Serializer):
     content_id = serializers.CharField(max_length=64)
-    user_id = serializers.CharField(max_length=64)
+    # Only read from internal service calls; authenticated users add to their own items
+    user_id = serializers.CharField(max_length=64, required=False)
     platform = serializers.CharField(max_length=20)
     summary = serializers.CharField()
     timestamp = serializers.IntegerField(
@@ -11,9 +12,18 @@ class ItemDataSerializer(serializers.Serializer):
     )  # Optional nếu muốn giữ
 
 
+class DeleteItemSerializer(serializers.Serializer):
+    # Only read from internal service calls; authenticated users delete their own items
+    user_id = serializers.CharField(max_length=64, required=False)
+    content_id = serializers.CharField(max_length=64)
+
+
 class QueryRequestSerializer(serializers.Serializer):
     user_id = serializers.CharField(max_length=64)
     query = serializers.CharField()
     top_k = serializers.IntegerField(default=5, required=False)
     from_timestamp = serializers.IntegerField(required=False, allow_null=True)
     platform = serializers.CharField(max_length=20, required=False, allow_null=True)
+    mode = serializers.ChoiceField(
+        choices=["dense", "hybrid"], required=False, allow_null=True
+    )
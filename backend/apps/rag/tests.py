@@ -0,0 +1,328 @@
+"""
+Tests for the RAG retrieval helpers that do not need Milvus.
+"""
+
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.agents.rag import cache as rag_cache
+from apps.agents.rag.chunking import aggregate_passages, split_passages
+from apps.agents.rag.rerank import HeuristicReranker, count_tokens, fit_to_budget
+from apps.agents.rag.filters import MilvusFilter, user_items_filter
+from apps.agents.rag.stores import LocalStore
+from apps.agents.rag.utils import reciprocal_rank_fusion
+
+
+class ReciprocalRankFusionTestCase(SimpleTestCase):
+    """Test weighted reciprocal rank fusion of dense and BM25 hits"""
+
+    def test_item_in_both_legs_ranks_first(self):
+        dense = [{"id": 1, "content_id": "a"}, {"id": 2, "content_id": "b"}]
+        sparse = [{"id": 3, "content_id": "c"}, {"id": 2, "content_id": "b"}]
+
+        fused = reciprocal_rank_fusion([dense, sparse], [1.0, 1.0], k=60)
+
+        self.assertEqual([h["id"] for h in fused], [2, 1, 3])
+        self.assertAlmostEqual(fused[0]["score"], 1 / 62 + 1 / 62)
+
+    def test_weights_favour_a_leg(self):
+        dense = [{"id": 1}]
+        sparse = [{"id": 2}]
+
+        fused = reciprocal_rank_fusion([dense, sparse], [0.2, 1.0], k=60)
+
+        self.assertEqual(fused[0]["id"], 2)
+
+    def test_empty_legs(self):
+        self.assertEqual(reciprocal_rank_fusion([[], []], [1.0, 1.0]), [])
+
+
+@override_settings(RAG_QUERY_CACHE_TTL=60)
+class QueryCacheTestCase(SimpleTestCase):
+    """Test the per-user versioned query_items cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.is_shared_cache = rag_cache.is_shared_cache
+        patcher = mock.patch.object(rag_cache, "is_shared_cache", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalized_query_hits(self):
+        version = rag_cache.get_user_version("7")
+        rag_cache.set_cached_result("7", version, "Cooking videos?", "expr", {"results": [1]}, top_k=5)
+
+        cached = rag_cache.get_cached_result("7", version, "  cooking   VIDEOS ", "expr", top_k=5)
+
+        self.assertEqual(cached, {"results": [1]})
+
+    def test_insert_invalidates_only_that_user(self):
+        rag_cache.set_cached_result("7", rag_cache.get_user_version("7"), "q", "expr", {"results": []})
+        rag_cache.set_cached_result("8", rag_cache.get_user_version("8"), "q", "expr", {"results": []})
+
+        rag_cache.invalidate_user("7")
+
+        self.assertIsNone(rag_cache.get_cached_result("7", rag_cache.get_user_version("7"), "q", "expr"))
+        self.assertIsNotNone(rag_cache.get_cached_result("8", rag_cache.get_user_version("8"), "q", "expr"))
+
+    def test_invalidate_twice_keeps_counting(self):
+        rag_cache.invalidate_user("7")
+        rag_cache.invalidate_user("7")
+
+        self.assertEqual(rag_cache.get_user_version("7"), 2)
+
+    def test_invalidate_survives_cache_outage(self):
+        with mock.patch.object(rag_cache, "_cache", side_effect=ConnectionError("down")):
+            rag_cache.invalidate_user("7")
+
+    def test_process_local_cache_disables_query_cache(self):
+        rag_cache.is_shared_cache.return_value = False
+
+        rag_cache.set_cached_result("7", 0, "q", "expr", {"results": []})
+
+        self.assertEqual(rag_cache.get_ttl(), 0)
+        self.assertIsNone(rag_cache.get_cached_result("7", 0, "q", "expr"))
+
+    def test_backend_detection(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.assertFalse(self.is_shared_cache())
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}):
+            self.assertTrue(self.is_shared_cache())
+
+
+class MilvusFilterTestCase(SimpleTestCase):
+    """Test the parameterized Milvus filter builder"""
+
+    def test_build_uses_placeholders(self):
+        f = user_items_filter("42", from_timestamp=1700000000, platform=["tiktok", "bluesky"])
+
+        expr, params = f.build()
+
+        self.assertEqual(
+            expr,
+            "user_id == {user_id_eq_0} && timestamp >= {timestamp_gte_1} && platform in {platform_in_2}",
+        )
+        self.assertEqual(params["user_id_eq_0"], "42")
+        self.assertEqual(params["platform_in_2"], ["tiktok", "bluesky"])
+
+    def test_render_escapes_strings(self):
+        f = MilvusFilter().eq("user_id", "x' || user_id != '")
+
+        self.assertEqual(f.render(), 'user_id == "x\' || user_id != \'"')
+
+    def test_single_platform_is_equality(self):
+        expr, _ = user_items_filter("1", platform="tiktok").build()
+
+        self.assertIn("platform == {platform_eq_1}", expr)
+
+    def test_rejects_unknown_fields_and_wrong_types(self):
+        with self.assertRaises(ValueError):
+            MilvusFilter().eq("summary", "x")
+        with self.assertRaises(ValueError):
+            MilvusFilter().gte("timestamp", "1700000000")
+
+
+class LocalStoreTestCase(SimpleTestCase):
+    """Test the in-process NumPy vector store"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalStore(self.tmp.name)
+        self.store.insert([
+            {"content_id": "a", "user_id": "1", "platform": "tiktok", "summary": "a",
+             "timestamp": 100, "embedding": [1.0, 0.0, 0.0]},
+            {"content_id": "b", "user_id": "1", "platform": "bluesky", "summary": "b",
+             "timestamp": 200, "embedding": [0.8, 0.6, 0.0]},
+            {"content_id": "c", "user_id": "2", "platform": "tiktok", "summary": "c",
+             "timestamp": 300, "embedding": [1.0, 0.0, 0.0]},
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_search_is_scoped_to_user_and_ordered(self):
+        hits = self.store.search([1.0, 0.0, 0.0], user_items_filter("1"), limit=5)
+
+        self.assertEqual([h["content_id"] for h in hits], ["a", "b"])
+        self.assertAlmostEqual(hits[0]["score"], 1.0, places=5)
+
+    def test_platform_and_timestamp_filters(self):
+        hits = self.store.search([1.0, 0.0, 0.0], user_items_filter("1", platform="bluesky"), limit=5)
+        self.assertEqual([h["content_id"] for h in hits], ["b"])
+
+        hits = self.store.search([1.0, 0.0, 0.0], user_items_filter("1", from_timestamp=150), limit=5)
+        self.assertEqual([h["content_id"] for h in hits], ["b"])
+
+    def test_appends_persist_across_instances(self):
+        self.store.insert([
+            {"content_id": "d", "user_id": "1", "platform": "tiktok", "summary": "d",
+             "timestamp": 400, "embedding": [0.0, 1.0, 0.0]},
+        ])
+
+        hits = LocalStore(self.tmp.name).search([0.0, 1.0, 0.0], user_items_filter("1"), limit=1)
+
+        self.assertEqual(hits[0]["content_id"], "d")
+
+    def test_writers_in_other_processes_are_not_lost(self):
+        other = LocalStore(self.tmp.name)
+        # Both instances have the current files cached before writing
+        self.store.search([1.0, 0.0, 0.0], user_items_filter("1"), limit=5)
+        other.search([1.0, 0.0, 0.0], user_items_filter("1"), limit=5)
+
+        other.insert([{"content_id": "d", "user_id": "1", "platform": "tiktok", "summary": "d",
+                       "timestamp": 400, "embedding": [0.0, 1.0, 0.0]}])
+        self.store.insert([{"content_id": "e", "user_id": "1", "platform": "tiktok", "summary": "e",
+                            "timestamp": 500, "embedding": [0.0, 0.0, 1.0]}])
+
+        hits = LocalStore(self.tmp.name).search([1.0, 1.0, 1.0], user_items_filter("1"), limit=10)
+        self.assertEqual(sorted(h["content_id"] for h in hits), ["a", "b", "d", "e"])
+
+    def test_delete_by_content_id_is_scoped_to_user(self):
+        deleted = self.store.delete(user_items_filter("1").in_("content_id", ["a", "c"]))
+
+        self.assertEqual(deleted, 1)
+        hits = self.store.search([1.0, 0.0, 0.0], user_items_filter("1"), limit=5)
+        self.assertEqual([h["content_id"] for h in hits], ["b"])
+        hits = self.store.search([1.0, 0.0, 0.0], user_items_filter("2"), limit=5)
+        self.assertEqual([h["content_id"] for h in hits], ["c"])
+
+
+class ChunkingTestCase(SimpleTestCase):
+    """Test passage splitting and parent aggregation"""
+
+    def test_short_text_is_one_passage(self):
+        self.assertEqual(split_passages("a short summary", chunk_words=10), ["a short summary"])
+
+    def test_passages_overlap_and_cover_text(self):
+        words = [f"w{i}" for i in range(25)]
+
+        passages = split_passages(" ".join(words), chunk_words=10, overlap_words=2)
+
+        self.assertEqual(passages[0].split(), words[0:10])
+        self.assertEqual(passages[1].split()[:2], words[8:10])
+        self.assertEqual(passages[-1].split()[-1], "w24")
+
+    def test_aggregate_max_and_sum(self):
+        hits = [
+            {"content_id": "a", "chunk_index": 1, "summary": "a1", "score": 0.9},
+            {"content_id": "b", "chunk_index": 0, "summary": "b0", "score": 0.8},
+            {"content_id": "b", "chunk_index": 1, "summary": "b1", "score": 0.7},
+            {"content_id": "a", "chunk_index": 0, "summary": "a0", "score": 0.1},
+        ]
+
+        by_max = aggregate_passages(hits, top_k=2, method="max")
+        by_sum = aggregate_passages(hits, top_k=2, method="sum")
+
+        self.assertEqual([h["content_id"] for h in by_max], ["a", "b"])
+        self.assertEqual(by_max[0]["summary"], "a0 … a1")
+        self.assertEqual([h["content_id"] for h in by_sum], ["b", "a"])
+        self.assertEqual(by_sum[0]["matched_passages"], 2)
+
+
+class RerankTestCase(SimpleTestCase):
+    """Test the heuristic reranker and the context token budget"""
+
+    def test_heuristic_prefers_term_overlap_and_applies_cutoff(self):
+        hits = [
+            {"content_id": "a", "summary": "cooking pasta at home", "score": 0.80},
+            {"content_id": "b", "summary": "python asyncio tutorial", "score": 0.78},
+            {"content_id": "c", "summary": "unrelated travel vlog", "score": 0.20},
+        ]
+
+        reranked = HeuristicReranker().rerank("python asyncio", hits, top_k=5, min_score=0.5)
+
+        self.assertEqual([h["content_id"] for h in reranked], ["b", "a"])
+        self.assertIn("rerank_score", reranked[0])
+
+    def test_fit_to_budget_keeps_leading_pieces(self):
+        pieces = ["alpha beta gamma " * 40, "delta epsilon " * 40, "zeta eta theta " * 40]
+        budget = count_tokens(pieces[0]) + count_tokens(pieces[1])
+
+        self.assertEqual(fit_to_budget(pieces, max_tokens=budget), pieces[:2])
+        self.assertEqual(fit_to_budget(pieces, max_tokens=1), pieces[:1])
+
+
+@override_settings(RAG_SERVICE_TOKEN="secret")
+@mock.patch("apps.rag.views.utils.delete_items", return_value={"status": "success", "deleted": 1})
+class DeleteItemPermissionTestCase(SimpleTestCase):
+    """Test who may delete vectors through DELETE /api/rag/delete-item"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("rag_delete_item")
+        self.payload = {"user_id": "7", "content_id": "abc"}
+
+    def test_anonymous_caller_is_rejected(self, delete_items):
+        response = self.client.delete(self.url, self.payload, format="json")
+
+        self.assertIn(response.status_code, (401, 403))
+        delete_items.assert_not_called()
+
+    def test_user_only_deletes_own_items(self, delete_items):
+        self.client.force_authenticate(user=User(id=42, username="owner"))
+
+        response = self.client.delete(self.url, self.payload, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        delete_items.assert_called_once_with("42", ["abc"])
+
+    def test_service_token_chooses_user(self, delete_items):
+        response = self.client.delete(
+            self.url, self.payload, format="json", HTTP_X_RAG_SERVICE_TOKEN="secret"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        delete_items.assert_called_once_with("7", ["abc"])
+
+    def test_wrong_service_token_is_rejected(self, delete_items):
+        response = self.client.delete(
+            self.url, self.payload, format="json", HTTP_X_RAG_SERVICE_TOKEN="guess"
+        )
+
+        self.assertIn(response.status_code, (401, 403))
+        delete_items.assert_not_called()
+
+
+@override_settings(RAG_SERVICE_TOKEN="secret")
+@mock.patch("apps.rag.views.utils.insert_item", return_value={"status": "success", "content_id": "abc"})
+class AddItemPermissionTestCase(SimpleTestCase):
+    """Test who may write vectors through PUT /api/rag/add-item"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("rag_add_item")
+        self.payload = {"user_id": "7", "content_id": "abc", "platform": "tiktok", "summary": "text"}
+
+    def test_anonymous_caller_is_rejected(self, insert_item):
+        response = self.client.put(self.url, self.payload, format="json")
+
+        self.assertIn(response.status_code, (401, 403))
+        insert_item.assert_not_called()
+
+    def test_user_only_writes_own_items(self, insert_item):
+        self.client.force_authenticate(user=User(id=42, username="owner"))
+
+        response = self.client.put(self.url, self.payload, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(insert_item.call_args.kwargs["user_id"], "42")
+
+    def test_service_token_chooses_user(self, insert_item):
+        response = self.client.put(self.url, self.payload, format="json", HTTP_X_RAG_SERVICE_TOKEN="secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(insert_item.call_args.kwargs["user_id"], "7")
+
+    def test_service_call_requires_user_id(self, insert_item):
+        payload = {k: v for k, v in self.payload.items() if k != "user_id"}
+
+        response = self.client.put(self.url, payload, format="json", HTTP_X_RAG_SERVICE_TOKEN="secret")
+
+        self.assertEqual(response.status_code, 400)
+        insert_item.assert_not_called()
@@ -1,10 +1,11 @@
 from rest_framework.decorators import api_view, permission_classes
 
-# from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-from .serializers import ItemDataSerializer, QueryRequestSerializer
+from .permissions import IsRagService, is_rag_service
+from .serializers import DeleteItemSerializer, ItemDataSerializer, QueryRequestSerializer
 from apps.agents.rag import utils
 
 from drf_spectacular.utils import extend_schema, OpenApiExample
@@ -23,6 +24,15 @@ ADD_ITEM_EXAMPLE = OpenApiExample(
     request_only=True,
 )
 
+DELETE_ITEM_EXAMPLE = OpenApiExample(
+    "DeleteItemExample",
+    value={
+        "content_id": "6952571625178975493",
+        "user_id": "strongtherapy",
+    },
+    request_only=True,
+)
+
 QUERY_ITEMS_EXAMPLE = OpenApiExample(
     "QueryItemsExample",
     value={
@@ -36,6 +46,23 @@ QUERY_ITEMS_EXAMPLE = OpenApiExample(
 )
 
 
+def _target_user_id(request, validated_data):
+    """
+    (user_id, None) whose items the request may write, or (None, 400 response).
+    Internal services choose the user_id; users only ever touch their own items.
+    """
+    if is_rag_service(request):
+        user_id = validated_data.get("user_id")
+        if not user_id:
+            return None, Response(
+                {"error": "Invalid data", "details": {"user_id": ["This field is required."]}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return user_id, None
+    # Never trust a user_id from the body
+    return str(request.user.id), None
+
+
 @extend_schema(
     request=ItemDataSerializer,
     responses={
@@ -59,15 +86,20 @@ QUERY_ITEMS_EXAMPLE = OpenApiExample(
         },
     },
     examples=[ADD_ITEM_EXAMPLE],
-    description="Add an item to RAG system. Timestamp is optional - if not provided, current timestamp will be used.",
+    description=(
+        "Add an item to RAG system. Timestamp is optional - if not provided, current timestamp will be used. "
+        "Authenticated users add to their own items; internal services send "
+        "the X-RAG-Service-Token header and choose the user_id."
+    ),
 )
 @api_view(["PUT"])
-# @permission_classes([IsAuthenticated])
+@permission_classes([IsRagService | IsAuthenticated])
 def add_item_view(request):
     """
     Add a single item to the RAG system.
 
     The summary will be embedded using all-MiniLM-L6-v2 and stored in Milvus.
+    Re-adding an existing (user_id, content_id) replaces the stored item.
     Timestamp is optional - defaults to None if not provided.
     """
     s = ItemDataSerializer(data=request.data)
@@ -76,9 +108,68 @@ def add_item_view(request):
             {"error": "Invalid data", "details": s.errors},
             status=status.HTTP_400_BAD_REQUEST,
         )
+    user_id, error = _target_user_id(request, s.validated_data)
+    if error:
+        return error
+
     try:
         # insert_item will handle optional timestamp
-        res = utils.insert_item(**s.validated_data)
+        res = utils.insert_item(**{**s.validated_data, "user_id": user_id})
+        return Response(res, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@extend_schema(
+    request=DeleteItemSerializer,
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "status": {"type": "string", "example": "success"},
+                "deleted": {"type": "integer", "example": 1},
+            },
+        },
+        400: {
+            "type": "object",
+            "properties": {
+                "error": {"type": "string"},
+                "details": {"type": "object"},
+            },
+        },
+        500: {
+            "type": "object",
+            "properties": {"error": {"type": "string"}},
+        },
+    },
+    examples=[DELETE_ITEM_EXAMPLE],
+    description=(
+        "Remove an item (every stored passage of it) from the RAG system. "
+        "Authenticated users delete from their own items; internal services send "
+        "the X-RAG-Service-Token header and choose the user_id."
+    ),
+)
+@api_view(["DELETE"])
+@permission_classes([IsRagService | IsAuthenticated])
+def delete_item_view(request):
+    """
+    Delete a user's item from the RAG system by content_id.
+
+    Deleting an item that is not indexed is not an error (deleted = 0).
+    """
+    s = DeleteItemSerializer(data=request.data)
+    if not s.is_valid():
+        return Response(
+            {"error": "Invalid data", "details": s.errors},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user_id, error = _target_user_id(request, s.validated_data)
+    if error:
+        return error
+
+    try:
+        res = utils.delete_items(user_id, [s.validated_data["content_id"]])
         return Response(res, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -93,7 +184,7 @@ def add_item_view(request):
                 "query": {"type": "string", "example": "mental healthcare"},
                 "filter": {
                     "type": "string",
-                    "example": "user_id == 'strongtherapy' && timestamp >= 1600000000 && platform == 'tiktok'",
+                    "example": 'user_id == "strongtherapy" && timestamp >= 1600000000 && platform == "tiktok"',
                 },
                 "results": {
                     "type": "array",
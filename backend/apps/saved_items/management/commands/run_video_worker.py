@@ -13,6 +13,8 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from supabase import create_client
 
+from apps.rag.permissions import SERVICE_TOKEN_HEADER
+
 
 class Command(BaseCommand):
     """Management command to run the video processing worker"""
@@ -349,6 +351,7 @@ class Command(BaseCommand):
             response = requests.put(
                 rag_url,
                 json=payload,
+                headers={SERVICE_TOKEN_HEADER: settings.RAG_SERVICE_TOKEN},
                 timeout=30,
             )
             
@@ -5,6 +5,8 @@ from celery import shared_task
 from django.conf import settings
 from .models import UserSavedItem
 
+from apps.rag.permissions import SERVICE_TOKEN_HEADER
+
 # Import model FeedItem để lấy dữ liệu AI Summary
 from apps.feed.models import FeedItem
 
@@ -67,10 +69,14 @@ def push_to_rag_task(saved_item_id):
         if not rag_api_url:
             logger.error("❌ RAG_API_URL not configured in settings")
             return
+        if not settings.RAG_SERVICE_TOKEN:
+            logger.error("❌ RAG_SERVICE_TOKEN not configured in settings")
+            return
 
         logger.info(f"📤 Sending to RAG: {rag_api_url}")
 
-        response = requests.put(rag_api_url, json=rag_payload, timeout=30)
+        headers = {SERVICE_TOKEN_HEADER: settings.RAG_SERVICE_TOKEN}
+        response = requests.put(rag_api_url, json=rag_payload, headers=headers, timeout=30)
 
         # 5. Xử lý kết quả
         if response.status_code < 400:
@@ -86,3 +92,33 @@ def push_to_rag_task(saved_item_id):
         logger.error(f"❌ Network error calling RAG: {e}")
     except Exception as e:
         logger.exception(f"❌ Unexpected error in push_to_rag_task: {e}")
+
+
+@shared_task(name="remove_from_rag_task")
+def remove_from_rag_task(user_id, content_id):
+    """
+    Task xóa vector của item khỏi RAG khi user bỏ lưu bài viết.
+    Gọi API delete-item của RAG với khóa (user_id, content_id).
+    """
+    rag_delete_url = settings.SERVICE_URLS.get("RAG_DELETE_API_URL")
+    if not rag_delete_url:
+        logger.error("❌ RAG_DELETE_API_URL not configured in settings")
+        return
+    if not settings.RAG_SERVICE_TOKEN:
+        logger.error("❌ RAG_SERVICE_TOKEN not configured in settings")
+        return
+
+    payload = {"user_id": str(user_id), "content_id": str(content_id)}
+    headers = {SERVICE_TOKEN_HEADER: settings.RAG_SERVICE_TOKEN}
+    try:
+        logger.info(f"🗑️ Removing from RAG: {payload}")
+        response = requests.delete(rag_delete_url, json=payload, headers=headers, timeout=30)
+
+        if response.status_code < 400:
+            logger.info(f"✅ Removed from RAG. ID: {content_id} ({response.json().get('deleted', 0)} rows)")
+        else:
+            logger.error(f"❌ RAG delete failed: {response.status_code} - {response.text}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Network error calling RAG: {e}")
+    except Exception as e:
+        logger.exception(f"❌ Unexpected error in remove_from_rag_task: {e}")
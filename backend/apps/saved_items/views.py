@@ -7,7 +7,7 @@ from drf_spectacular.utils import extend_schema
 from apps.feed.models import SocialPost  # Import từ feeds
 from .models import UserSavedItem
 from .serializers import SaveItemRequestSerializer, SaveItemResponseSerializer
-from .tasks import push_to_rag_task
+from .tasks import push_to_rag_task, remove_from_rag_task
 from .serializers import SavedItemSerializer
 
 import logging
@@ -108,7 +108,11 @@ def delete_saved_item(request, item_id):
     """
     try:
         item = UserSavedItem.objects.get(id=item_id, user=request.user)
+        post_id = item.post_id
         item.delete()
+
+        # Xóa vector tương ứng khỏi RAG (content_id = id của SocialPost)
+        remove_from_rag_task.delay(request.user.id, post_id)
         
         return Response(
             {"success": True, "message": "Item deleted successfully"},
@@ -1,3 +1,51 @@
-from django.test import TestCase
+"""
+Tests for the auth views that do not need the database.
+"""
 
-# Create your tests here.
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.feed.utils.scheduling import refresh_priority
+
+
+class SignInActivityTestCase(SimpleTestCase):
+    """Test that signing in records the activity used by the feed scheduler"""
+
+    def setUp(self):
+        self.user = User(id=1, username="alice")
+        self.now = timezone.now()
+
+    def _feed(self):
+        return SimpleNamespace(
+            user=self.user, last_refreshed_at=self.now - timedelta(hours=10),
+            created_at=self.now - timedelta(days=30), last_refresh_yield=0,
+        )
+
+    @mock.patch("apps.users.views.RefreshToken")
+    @mock.patch.object(User, "save")
+    def test_sign_in_updates_last_login_and_refresh_priority(self, save, refresh_token):
+        before = refresh_priority(self._feed(), self.now)
+
+        with mock.patch("apps.users.views.authenticate", return_value=self.user):
+            response = APIClient().post(reverse("signin"), {"username": "alice", "password": "x"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(self.user.last_login)
+        save.assert_called_once_with(update_fields=["last_login"])
+        self.assertGreater(refresh_priority(self._feed(), self.user.last_login), before)
+
+    @mock.patch.object(User, "save")
+    def test_failed_sign_in_does_not_count_as_activity(self, save):
+        with mock.patch("apps.users.views.authenticate", return_value=None):
+            response = APIClient().post(reverse("signin"), {"username": "alice", "password": "x"}, format="json")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIsNone(self.user.last_login)
+        save.assert_not_called()
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
@@ -158,6 +159,9 @@ class SignInView(APIView):
 
         user = authenticate(request, username=username, password=password)
         if user is not None:
+            # JWT sign-in does not go through django.contrib.auth.login(): record it here
+            # (feed refresh priority uses last_login as the owner's activity)
+            update_last_login(None, user)
             refresh = RefreshToken.for_user(user)
             return Response(
                 {"access": str(refresh.access_token), "refresh": str(refresh), "message": "Log in successfully!"},
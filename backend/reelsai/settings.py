@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     "apps.chatbot",
     "apps.saved_items",
     "apps.feed",
+    "apps.rag",
     "django_celery_results",
 ]
 
@@ -159,6 +160,7 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "UPDATE_LAST_LOGIN": True,  # TokenObtainPairView sign-ins also set User.last_login
 }
 CORS_ALLOW_CREDENTIALS = True
 
@@ -235,6 +237,77 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ZILLIZ_URI = os.getenv("ZILLIZ_URI")
 ZILLIZ_TOKEN = os.getenv("ZILLIZ_TOKEN")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "user_saved_items_embeddings")
+# Vector store backend: "milvus" (Zilliz Cloud) or "local" (per-user NumPy files on disk)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "milvus")
+RAG_LOCAL_PATH = os.getenv("RAG_LOCAL_PATH", str(BASE_DIR / "data" / "rag"))
+# ANN index profile for new collections: hnsw, ivf_flat, ivf_sq8, diskann, autoindex
+RAG_INDEX_PROFILE = os.getenv("RAG_INDEX_PROFILE", "ivf_flat")
+# "dense" (vector only) or "hybrid" (BM25 over summary + vector, merged with RRF)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "dense")
+RAG_HYBRID_DENSE_K = int(os.getenv("RAG_HYBRID_DENSE_K", "20"))
+RAG_HYBRID_SPARSE_K = int(os.getenv("RAG_HYBRID_SPARSE_K", "20"))
+RAG_HYBRID_DENSE_WEIGHT = float(os.getenv("RAG_HYBRID_DENSE_WEIGHT", "1.0"))
+RAG_HYBRID_SPARSE_WEIGHT = float(os.getenv("RAG_HYBRID_SPARSE_WEIGHT", "1.0"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Chunked ingestion: store long summaries as overlapping passages and aggregate
+# passage hits back to their parent item ("max" or "sum" scoring)
+RAG_CHUNKING = os.getenv("RAG_CHUNKING", "False").lower() == "true"
+RAG_CHUNK_WORDS = int(os.getenv("RAG_CHUNK_WORDS", "150"))
+RAG_CHUNK_OVERLAP_WORDS = int(os.getenv("RAG_CHUNK_OVERLAP_WORDS", "30"))
+RAG_CHUNK_OVERFETCH = int(os.getenv("RAG_CHUNK_OVERFETCH", "4"))
+RAG_CHUNK_AGGREGATION = os.getenv("RAG_CHUNK_AGGREGATION", "max")
+# Reranking of retrieve_and_answer candidates: "none", "heuristic" or "cross_encoder"
+RAG_RERANKER = os.getenv("RAG_RERANKER", "none")
+RAG_RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RAG_RERANK_OVERFETCH = int(os.getenv("RAG_RERANK_OVERFETCH", "3"))
+# Relevance cutoff on the reranker score (empty = reranker default)
+RAG_RERANK_MIN_SCORE = os.getenv("RAG_RERANK_MIN_SCORE") or None
+# Max tokens of retrieved content sent in the RAG prompt
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+# Bind filter values as Milvus expression template params (needs Milvus >= 2.5)
+RAG_FILTER_TEMPLATES = os.getenv("RAG_FILTER_TEMPLATES", "True").lower() == "true"
+# Seconds a query_items result stays cached (0 disables the cache)
+RAG_QUERY_CACHE_TTL = int(os.getenv("RAG_QUERY_CACHE_TTL", "120"))
+
+# Max PostgreSQL connections per process for the chatbot's LangGraph checkpointer
+CHATBOT_CHECKPOINT_POOL_SIZE = int(os.getenv("CHATBOT_CHECKPOINT_POOL_SIZE", "5"))
+# After the checkpointer fails to connect, chats use MemorySaver for this many seconds before retrying
+CHATBOT_CHECKPOINT_RETRY_SECONDS = int(os.getenv("CHATBOT_CHECKPOINT_RETRY_SECONDS", "60"))
+
+# Chatbot context window: recent turns kept verbatim, older ones folded into a
+# rolling summary once the session exceeds CHATBOT_SUMMARIZE_AFTER_TURNS turns
+CHATBOT_KEEP_TURNS = int(os.getenv("CHATBOT_KEEP_TURNS", "6"))
+CHATBOT_SUMMARIZE_AFTER_TURNS = int(os.getenv("CHATBOT_SUMMARIZE_AFTER_TURNS", "10"))
+# Max prompt tokens (system prompt + summary + history) sent to the chat model
+CHATBOT_CONTEXT_MAX_TOKENS = int(os.getenv("CHATBOT_CONTEXT_MAX_TOKENS", "3000"))
+
+# Local intent router: send messages straight to retrieval or to chat without an
+# LLM tool-selection call (embedding thresholds apply when no keyword matches)
+CHATBOT_ROUTER = os.getenv("CHATBOT_ROUTER", "True").lower() == "true"
+CHATBOT_ROUTER_MIN_SIMILARITY = float(os.getenv("CHATBOT_ROUTER_MIN_SIMILARITY", "0.45"))
+CHATBOT_ROUTER_MIN_MARGIN = float(os.getenv("CHATBOT_ROUTER_MIN_MARGIN", "0.05"))
+
+# Threads running the RAG tool's blocking work (embedding, Milvus) for async chats
+CHATBOT_RAG_WORKERS = int(os.getenv("CHATBOT_RAG_WORKERS", "8"))
+
+# Semantic answer cache: a RAG answer is reused for a similar question from the
+# same user (cosine >= threshold) until the user's items change or the TTL expires
+CHATBOT_ANSWER_CACHE_TTL = int(os.getenv("CHATBOT_ANSWER_CACHE_TTL", "3600"))
+CHATBOT_ANSWER_CACHE_THRESHOLD = float(os.getenv("CHATBOT_ANSWER_CACHE_THRESHOLD", "0.92"))
+CHATBOT_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("CHATBOT_ANSWER_CACHE_MAX_ENTRIES", "50"))
+
+# Feed pre-filter: posts below FEED_PREFILTER_LOW cosine similarity to the feed's
+# include criteria are dropped, posts above FEED_PREFILTER_HIGH are scored without
+# the LLM curator; only the band in between is sent to the curator.
+# Off by default: KEEP gives a final 7-10 score from cosine similarity alone, so
+# enable it only after calibrating both thresholds on real feeds
+FEED_PREFILTER = os.getenv("FEED_PREFILTER", "False").lower() == "true"
+FEED_PREFILTER_LOW = float(os.getenv("FEED_PREFILTER_LOW", "0.15"))
+FEED_PREFILTER_HIGH = float(os.getenv("FEED_PREFILTER_HIGH", "0.6"))
+
+# Materialized feed ranking: "score" fuses time decay, log engagement and engagement
+# velocity; "borda" is the original weighted Borda count over ordinal ranks
+FEED_RANKING_MODE = os.getenv("FEED_RANKING_MODE", "score")
 
 # Supabase configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -263,12 +336,53 @@ CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 50  # Prevent memory leaks
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Periodic feed refresh (Celery beat): every FEED_SCHEDULER_INTERVAL_SECONDS the
+# scheduler queues up to FEED_REFRESH_BATCH feeds not refreshed for FEED_REFRESH_MIN_HOURS,
+# highest priority first (staleness x owner activity x past yield), each delayed by a
+# random 0..FEED_REFRESH_JITTER_SECONDS
+FEED_SCHEDULER_INTERVAL_SECONDS = int(os.getenv("FEED_SCHEDULER_INTERVAL_SECONDS", "300"))
+FEED_REFRESH_MIN_HOURS = float(os.getenv("FEED_REFRESH_MIN_HOURS", "1"))
+FEED_REFRESH_BATCH = int(os.getenv("FEED_REFRESH_BATCH", "20"))
+FEED_REFRESH_JITTER_SECONDS = int(os.getenv("FEED_REFRESH_JITTER_SECONDS", "240"))
+# Global call budgets shared by all workers: {service: (calls, per seconds)}
+FEED_RATE_BUDGETS = {
+    "bluesky": (int(os.getenv("FEED_BUDGET_BLUESKY_PER_HOUR", "1000")), 3600),
+    "openai": (int(os.getenv("FEED_BUDGET_OPENAI_PER_HOUR", "3000")), 3600),
+    "apify": (int(os.getenv("FEED_BUDGET_APIFY_PER_HOUR", "20")), 3600),
+    "gemini": (int(os.getenv("FEED_BUDGET_GEMINI_PER_HOUR", "100")), 3600),
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "schedule-feed-refreshes": {
+        "task": "schedule_feed_refreshes",
+        "schedule": FEED_SCHEDULER_INTERVAL_SECONDS,
+    },
+}
+
+# Shared cache (RAG query results, ...)
+# Redis when REDIS_URL is set so every web/worker process sees the same entries,
+# otherwise a per-process in-memory cache for local development
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if os.getenv("REDIS_URL")
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
 # Service API URLs
 SERVICE_URLS = {
     "VIDEO_UNDERSTANDING_API_URL": os.getenv("VIDEO_UNDERSTANDING_API_URL"),
     "RAG_API_URL": os.getenv("RAG_API_URL"),
+    "RAG_DELETE_API_URL": os.getenv("RAG_DELETE_API_URL"),
 }
 
+# Shared secret sent by internal callers of the RAG delete-item API (X-RAG-Service-Token)
+RAG_SERVICE_TOKEN = os.getenv("RAG_SERVICE_TOKEN", "")
+
 DJANGO_SUPERUSER_USERNAME = os.getenv("DJANGO_SUPERUSER_USERNAME", "admin")
 DJANGO_SUPERUSER_EMAIL = os.getenv("DJANGO_SUPERUSER_EMAIL", "admin@example.com")
 DJANGO_SUPERUSER_PASSWORD = os.getenv("DJANGO_SUPERUSER_PASSWORD", "adminpass")
\ No newline at end of file